@@ -17,13 +17,16 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
 from monitoring.traffic_capture import TrafficCapture
 from detection.anomaly_detector import AnomalyDetector
+from detection.features import extract_features
+from detection.retrain import RetrainScheduler
 from visualization.dashboard import (
     create_protocol_pie_chart,
     create_traffic_timeline,
     create_anomaly_scatter,
     create_port_heatmap,
     create_network_graph,
-    create_risk_gauge
+    create_risk_gauge,
+    to_local_time
 )
 
 # Page configuration
@@ -95,20 +98,74 @@ config = load_config()
 if 'capture' not in st.session_state:
     st.session_state.capture = TrafficCapture(
         interface=config['network']['interface'],
-        packet_count=config['network']['packet_count']
+        packet_count=config['network']['packet_count'],
+        buffer_size=config['network'].get('buffer_size', 10000),
+        pcap_file=config['network'].get('pcap_file') or None,
+        replay_speed=config['network'].get('replay_speed', 0),
+        backend=config['network'].get('capture_backend', 'scapy'),
+        capture_filter=config['network'].get('capture_filter'),
+        flow_active_timeout=config['network'].get('flow_active_timeout', 120),
+        flow_idle_timeout=config['network'].get('flow_idle_timeout', 15),
+        shards=config['network'].get('capture_shards', 1),
+        overload_mode=config['network'].get('overload_mode'),
+        overload_rate=config['network'].get('overload_rate', 10),
+        overload_reservoir=config['network'].get('overload_reservoir', 1000),
+        overload_lag=config['network'].get('overload_lag', 0.5),
+        pcap_ring_dir=config['network'].get('pcap_ring_dir') or None,
+        pcap_ring_segment_size=config['network'].get('pcap_ring_segment_mb', 64) * 1024 * 1024,
+        pcap_ring_budget=config['network'].get('pcap_ring_budget_mb', 1024) * 1024 * 1024
     )
 
 if 'detector' not in st.session_state:
-    st.session_state.detector = AnomalyDetector(
-        model_type=config['detection']['model'],
-        contamination=config['detection']['contamination']
+    if config['detection']['model'] == 'ensemble':
+        # Worker pools and shared memory are only set up for the ensemble
+        from detection.ensemble import EnsembleDetector
+        st.session_state.detector = EnsembleDetector(
+            members=config['detection'].get('ensemble_members', ['isolation_forest', 'ocsvm', 'lof']),
+            contamination=config['detection']['contamination'],
+            threshold=config['detection'].get('threshold'),
+            fusion=config['detection'].get('ensemble_fusion', 'rank'),
+            latency_budget=config['detection'].get('ensemble_budget', 0.5)
+        )
+    else:
+        st.session_state.detector = AnomalyDetector(
+            model_type=config['detection']['model'],
+            contamination=config['detection']['contamination'],
+            threshold=config['detection'].get('threshold'),
+            model_params=config['detection'].get('model_params')
+        )
+
+def load_detection_df(capture, limit=None):
+    """Traffic to train and score on: packets or aggregated flows"""
+    if config['detection'].get('granularity') == 'flow':
+        return capture.get_flows_df(limit)
+    return capture.get_packets_df(limit)
+
+# Newest packets (or flows) the views and retrains work on; the buffer may hold far more
+window = config['detection'].get('retrain_window', 10000)
+
+def get_detection_df():
+    return load_detection_df(st.session_state.capture, window)
+
+if 'retrainer' not in st.session_state:
+    # The worker thread has no Streamlit context, so bind the capture directly
+    capture = st.session_state.capture
+    st.session_state.retrainer = RetrainScheduler(
+        st.session_state.detector,
+        lambda: load_detection_df(capture, window),
+        interval=config['detection'].get('retrain_interval', 3600),
+        min_new_fraction=config['detection'].get('retrain_min_new', 0.1),
+        threads=config['detection'].get('retrain_threads', 1),
+        drift_gate=config['detection'].get('retrain_on_drift', True),
+        drift_poll=config['detection'].get('drift_poll', 60)
     )
+    st.session_state.retrainer.start()
 
 if 'is_monitoring' not in st.session_state:
     st.session_state.is_monitoring = False
 
-if 'model_trained' not in st.session_state:
-    st.session_state.model_trained = False
+# Background retrains replace the detector; always score with the current one
+st.session_state.model_trained = st.session_state.retrainer.detector.is_trained
 
 if 'anomaly_count' not in st.session_state:
     st.session_state.anomaly_count = 0
@@ -116,6 +173,10 @@ if 'anomaly_count' not in st.session_state:
 if 'total_analyzed' not in st.session_state:
     st.session_state.total_analyzed = 0
 
+if 'learned_until' not in st.session_state:
+    st.session_state.learned_until = 0
+    st.session_state.flows_learned = 0  # flow_records position in flow granularity
+
 # Header
 st.markdown('<div class="main-header">🛡️ GuardELNS</div>', unsafe_allow_html=True)
 st.markdown('<div class="sub-header">Guard for Enterprise-Level Network Security</div>', unsafe_allow_html=True)
@@ -149,6 +210,7 @@ with st.sidebar:
         st.session_state.capture.clear_packets()
         st.session_state.anomaly_count = 0
         st.session_state.total_analyzed = 0
+        st.session_state.learned_until = 0
         st.success("Data cleared!")
         st.rerun()
     
@@ -157,23 +219,29 @@ with st.sidebar:
     # Model controls
     st.subheader("🤖 ML Model")
     
-    if st.button("🎓 Train Model", use_container_width=True):
-        with st.spinner("Training model..."):
-            df = st.session_state.capture.get_packets_df()
-            if len(df) >= 100:
-                success = st.session_state.detector.train(df)
-                if success:
-                    st.session_state.model_trained = True
-                    st.success("Model trained successfully!")
-                else:
-                    st.error("Training failed!")
-            else:
-                st.warning(f"Need at least 100 packets. Current: {len(df)}")
-        st.rerun()
+    if st.button("🎓 Train Model", use_container_width=True,
+                 disabled=st.session_state.retrainer.training):
+        df = get_detection_df()
+        if len(df) >= 100:
+            # Trains in the background; the new model is swapped in when ready
+            st.session_state.retrainer.trigger()
+            st.success("Training started in the background")
+        else:
+            st.warning(f"Need at least 100 packets. Current: {len(df)}")
     
-    model_status = "✅ Trained" if st.session_state.model_trained else "❌ Not Trained"
+    if st.session_state.retrainer.training:
+        model_status = "⏳ Training..."
+    else:
+        model_status = "✅ Trained" if st.session_state.model_trained else "❌ Not Trained"
     st.info(f"Status: {model_status}")
     
+    drift = getattr(st.session_state.retrainer.detector, 'drift', None)
+    if drift is not None and drift.ready:
+        drift_stats = drift.stats()
+        st.caption(f"Feature drift: PSI {drift_stats['drift_psi']:.2f} "
+                   f"({drift_stats['drift_feature']})"
+                   + (" - retraining" if drift_stats['drifted'] else ""))
+    
     st.markdown("---")
     
     # Settings
@@ -265,6 +333,7 @@ with tab1:
     st.subheader("📋 Recent Network Activity")
     if not df.empty:
         display_df = df[['timestamp', 'src_ip', 'dst_ip', 'protocol', 'src_port', 'dst_port', 'length']].tail(20)
+        display_df = display_df.assign(timestamp=to_local_time(display_df['timestamp']))
         st.dataframe(display_df, use_container_width=True, height=300)
     else:
         st.info("No packets captured yet. Start monitoring to see network activity.")
@@ -275,17 +344,40 @@ with tab2:
     if not st.session_state.model_trained:
         st.warning("⚠️ Model not trained yet. Capture at least 100 packets and train the model from the sidebar.")
     else:
-        df = st.session_state.capture.get_packets_df()
+        df = get_detection_df()
         
         if not df.empty and len(df) >= 10:
             # Detect anomalies
-            predictions = st.session_state.detector.predict(df)
-            scores = st.session_state.detector.get_anomaly_scores(df)
+            detector = st.session_state.retrainer.detector
+            features, _ = extract_features(df)
+            predictions, _, scores = detector.score_features(features)
             
             # Update counts
             st.session_state.anomaly_count = int(predictions.sum())
             st.session_state.total_analyzed = len(predictions)
             
+            # Every rerun rescores the whole window; only traffic not seen
+            # before feeds drift monitoring and online learning
+            trained_until = st.session_state.retrainer.trained_until
+            if config['detection'].get('granularity') == 'flow':
+                # Open flows still grow, so learn each flow once, when it finishes;
+                # flows that ended before the last retrain window closed were trained on
+                new_df, st.session_state.flows_learned = st.session_state.capture.read_flows_since(
+                    st.session_state.flows_learned)
+                new_df = new_df[new_df['end_time'] > trained_until]
+                new_features, _ = extract_features(new_df)
+            else:
+                learned_until = max(st.session_state.learned_until, trained_until)
+                new_rows = (df['timestamp'] > learned_until).to_numpy()
+                new_df, new_features = df[new_rows], features[new_rows]
+                if new_rows.any():
+                    st.session_state.learned_until = int(df['timestamp'].max())
+            if len(new_df):
+                if detector.drift is not None:
+                    detector.drift.update(new_features)
+                if detector.online:
+                    detector.partial_fit(new_df)
+            
             # Anomaly scatter plot
             st.plotly_chart(
                 create_anomaly_scatter(df, predictions, scores),
@@ -299,6 +391,7 @@ with tab2:
                 anomaly_df = df[predictions == 1].copy()
                 anomaly_df['anomaly_score'] = scores[predictions == 1]
                 anomaly_df = anomaly_df.sort_values('anomaly_score', ascending=False)
+                anomaly_df['timestamp'] = to_local_time(anomaly_df['timestamp'])
                 
                 st.subheader("🚨 Detected Anomalies")
                 st.dataframe(
@@ -313,7 +406,7 @@ with tab2:
 with tab3:
     st.header("📈 Network Analytics")
     
-    df = st.session_state.capture.get_packets_df()
+    df = st.session_state.capture.get_packets_df(limit=window)
     
     if not df.empty:
         # Port heatmap
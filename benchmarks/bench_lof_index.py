@@ -0,0 +1,70 @@
+"""
+LOF Neighbour Index Benchmark
+Query time and neighbour recall of the IndexedLOF index types
+"""
+
+import sys
+import os
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import numpy as np
+from sklearn.neighbors import LocalOutlierFactor
+
+from detection.neighbors import IndexedLOF, build_index
+
+
+CONFIGS = (
+    ('kd_tree', {'leaf_size': 40}),
+    ('kd_tree', {'leaf_size': 16}),
+    ('ball_tree', {'leaf_size': 40}),
+    ('brute', {}),
+    ('random_projection', {'n_trees': 4, 'leaf_size': 32}),
+    ('random_projection', {'n_trees': 8, 'leaf_size': 32}),
+    ('random_projection', {'n_trees': 16, 'leaf_size': 64}),
+)
+
+
+def make_features(rows, dims, rng):
+    """Clustered traffic-like features with a few scattered outliers"""
+    centers = rng.normal(scale=4, size=(8, dims))
+    X = centers[rng.integers(0, 8, rows)] + rng.normal(size=(rows, dims))
+    outliers = rng.random(rows) < 0.02
+    X[outliers] = rng.uniform(-12, 12, size=(outliers.sum(), dims))
+    return X
+
+
+def main(train_rows=50_000, query_rows=10_000, dims=14, k=20):
+    rng = np.random.default_rng(0)
+    X = make_features(train_rows, dims, rng)
+    Q = make_features(query_rows, dims, rng)
+    print(f"{train_rows:,} training rows, {query_rows:,} queries, {dims} features, k={k}")
+
+    _, truth = build_index(X, 'brute').query(Q, k)
+    start = time.perf_counter()
+    reference = LocalOutlierFactor(n_neighbors=k, novelty=True).fit(X)
+    fit_time = time.perf_counter() - start
+    start = time.perf_counter()
+    expected = reference.predict(Q)
+    query_time = time.perf_counter() - start
+    print(f"\n{'index':<18} {'params':<34} {'fit':>8} {'query':>9} {'recall':>7} {'labels':>7}")
+    print(f"{'sklearn LOF':<18} {'':<34} {fit_time:>7.2f}s {query_time * 1000:>7.0f}ms "
+          f"{1.0:>7.3f} {1.0:>7.3f}")
+
+    for index, params in CONFIGS:
+        start = time.perf_counter()
+        model = IndexedLOF(n_neighbors=k, index=index, **params).fit(X)
+        fit_time = time.perf_counter() - start
+        start = time.perf_counter()
+        labels = model.predict(Q)
+        query_time = time.perf_counter() - start
+
+        _, found = model.index_.query(Q, k)
+        recall = np.mean([len(np.intersect1d(a, b)) / k for a, b in zip(found, truth)])
+        agreement = np.mean(labels == expected)
+        print(f"{index:<18} {str(params):<34} {fit_time:>7.2f}s {query_time * 1000:>7.0f}ms "
+              f"{recall:>7.3f} {agreement:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+One-Class SVM Scaling Benchmark
+Fit time and AUC of the exact RBF OneClassSVM against the Nystroem + SGD variant
+"""
+
+import sys
+import os
+import random
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import roc_auc_score
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import OneClassSVM
+
+from simulation.iot_simulator import IoTSimulator
+from detection.features import extract_features
+from detection.sgd_ocsvm import ApproximateOneClassSVM
+
+
+TRAIN_SIZES = (5_000, 20_000, 50_000, 200_000, 1_000_000)
+EXACT_LIMIT = 50_000   # The exact model takes minutes beyond this
+DAY_NS = 86400 * 10**9
+
+
+def simulate(simulator, devices, rows, malicious_fraction):
+    """Simulator traffic without the real-time loop; returns (DataFrame, labels)"""
+    traffic = []
+    for _ in range(rows):
+        packet = random.choice(devices).generate_traffic()
+        if random.random() < malicious_fraction:
+            packet = simulator._add_malicious_behavior(packet)
+            packet['malicious'] = True
+        traffic.append(packet)
+    df = pd.DataFrame(traffic)
+    # Spread packets over one simulated day so train and test share time-of-day features
+    day = time.time_ns() // DAY_NS * DAY_NS
+    df['timestamp'] = day + np.array([random.randrange(DAY_NS) for _ in range(rows)])
+    return df, df.pop('malicious').to_numpy()
+
+
+def main():
+    random.seed(0)
+    simulator = IoTSimulator(num_devices=20, malicious_ratio=0)
+    devices = simulator.devices
+    test_df, labels = simulate(simulator, devices, 10_000, 0.1)
+
+    print(f"\n{'train rows':>10} {'model':>10} {'fit':>10} {'AUC':>7}")
+    for rows in TRAIN_SIZES:
+        train_df, _ = simulate(simulator, devices, rows, 0.02)
+        scaler = StandardScaler().fit(extract_features(train_df)[0])
+        X_train = scaler.transform(extract_features(train_df)[0])
+        X_test = scaler.transform(extract_features(test_df)[0])
+
+        models = [('sgd', ApproximateOneClassSVM(nu=0.1))]
+        if rows <= EXACT_LIMIT:
+            models.insert(0, ('exact', OneClassSVM(nu=0.1, kernel='rbf', gamma='auto')))
+        for name, model in models:
+            start = time.perf_counter()
+            model.fit(X_train)
+            elapsed = time.perf_counter() - start
+            auc = roc_auc_score(labels, -model.decision_function(X_test))
+            print(f"{rows:>10,} {name:>10} {elapsed:>9.2f}s {auc:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Risk Engine Benchmark
+Compares the original per-row, per-object RiskEngine with the batched columnar one
+"""
+
+import sys
+import os
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import numpy as np
+import pandas as pd
+
+from profiling.risk_engine import RiskEngine
+
+
+def make_traffic(rows, hosts=200, seed=0):
+    """Synthetic traffic DataFrame with detector predictions"""
+    rng = np.random.default_rng(seed)
+    addresses = np.array([f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}' for i in range(hosts)],
+                         dtype=object)
+    df = pd.DataFrame({
+        'src_ip': addresses[rng.integers(0, hosts, rows)],
+        'dst_ip': addresses[rng.integers(0, hosts, rows)],
+        'protocol': rng.choice(['TCP', 'UDP', 'ICMP', 'OTHER'], rows, p=[0.6, 0.3, 0.05, 0.05]),
+        'dst_port': rng.choice([22, 53, 80, 443, 1883, 8080], rows),
+        'length': rng.integers(60, 1500, rows),
+    })
+    return df, (rng.random(rows) < 0.1).astype(int)
+
+
+class LegacyProfile:
+    """RiskProfile as it was before the columnar store"""
+
+    def __init__(self, entity_id, entity_type='device'):
+        self.entity_id = entity_id
+        self.entity_type = entity_type
+        self.risk_score = 0.0
+        self.anomaly_count = 0
+        self.total_events = 0
+        self.first_seen = datetime.now()
+        self.last_seen = datetime.now()
+        self.behaviors = defaultdict(int)
+        self.risk_factors = {}
+
+    def update(self, event_data, is_anomaly=False):
+        self.total_events += 1
+        self.last_seen = datetime.now()
+        if is_anomaly:
+            self.anomaly_count += 1
+        if 'protocol' in event_data:
+            self.behaviors[f"protocol_{event_data['protocol']}"] += 1
+        if 'dst_port' in event_data:
+            self.behaviors[f"port_{event_data['dst_port']}"] += 1
+        anomaly_rate = self.anomaly_count / max(self.total_events, 1)
+        behavior_penalty = 10 if len(self.behaviors) > 10 else 0
+        activity_factor = min(self.total_events / 1000, 1.0) * 10
+        self.risk_score = min(anomaly_rate * 100 + behavior_penalty + activity_factor, 100)
+        self.risk_factors = {
+            'anomaly_rate': round(anomaly_rate * 100, 2),
+            'behavior_diversity': len(self.behaviors),
+            'activity_level': self.total_events,
+            'days_active': (self.last_seen - self.first_seen).days
+        }
+
+
+def legacy_update(profiles, df, predictions):
+    """update_from_traffic as it was before batching"""
+    for idx, row in df.iterrows():
+        for column in ('src_ip', 'dst_ip'):
+            if pd.notna(row.get(column)):
+                profile = profiles.setdefault(row[column], LegacyProfile(row[column]))
+                is_anomaly = predictions[idx] == 1 if idx < len(predictions) else False
+                profile.update(row.to_dict(), is_anomaly)
+    return profiles
+
+
+def batched_update(df, predictions):
+    engine = RiskEngine()
+    engine.update_from_traffic(df, predictions)
+    return engine
+
+
+def main(rows=100_000):
+    df, predictions = make_traffic(rows)
+    print(f"update_from_traffic over {rows:,} packets, {df['src_ip'].nunique()} hosts")
+
+    legacy = {}
+    start = time.perf_counter()
+    legacy_update(legacy, df, predictions)
+    before = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine = batched_update(df, predictions)
+    after = time.perf_counter() - start
+
+    print(f"   per-row loop     {before * 1000:9.1f} ms")
+    print(f"   batched store    {after * 1000:9.1f} ms")
+    print(f"   speedup: {before / after:.1f}x")
+
+    for entity, profile in legacy.items():
+        assert engine.profiles[entity].risk_score == profile.risk_score, entity
+        assert engine.profiles[entity].risk_factors == profile.risk_factors, entity
+    print("\nScores match the original implementation")
+
+    # Memory per profile with many distinct hosts, each seen a few times
+    hosts = 50_000
+    df, predictions = make_traffic(hosts * 4, hosts=hosts, seed=1)
+    df['src_ip'] = df['src_ip'].astype(str)  # Same id strings for both, owned by the DataFrame
+    df['dst_ip'] = df['dst_ip'].astype(str)
+    print("\nMemory per profile")
+    for label, build in (("profile objects", lambda: legacy_update({}, df, predictions)),
+                         ("columnar store", lambda: batched_update(df, predictions).profiles)):
+        tracemalloc.start()
+        profiles = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"   {label:16} {size / len(profiles):9.0f} bytes   ({len(profiles):,} profiles)")
+
+    # Statistics cost once the store is large and batches are small
+    hosts = 1_000_000
+    engine = batched_update(*make_traffic(hosts, hosts=hosts, seed=2))
+    small, small_predictions = make_traffic(1000, hosts=hosts, seed=3)
+    print(f"\nStatistics with {len(engine.profiles):,} profiles")
+    for label, func in (
+            ("1k-packet update", lambda: engine.update_from_traffic(small, small_predictions)),
+            ("get_statistics", engine.get_statistics),
+            ("full column scan", lambda: full_scan(engine.profiles)),
+            ("top_k(10)", lambda: engine.top_k(10)),
+            ("full sort top 10", lambda: [engine.profiles.to_dict(row)
+                                          for row in full_sort(engine.profiles)[:10]]),
+            ("rows above 90", lambda: engine.profiles.scores.ranked(90)),
+            ("full sort >= 90", lambda: full_sort(engine.profiles, 90))):
+        start = time.perf_counter()
+        for _ in range(10):
+            func()
+        print(f"   {label:16} {(time.perf_counter() - start) * 100:9.2f} ms")
+    print(f"   ({len(full_sort(engine.profiles, 90)):,} profiles at or above 90)")
+
+
+    # Lazy decay: every profile's stored score is ten half-lives old
+    engine.profiles.half_life = 3600
+    engine.profiles.column('decayed_at')[:] -= 10 * 3600 * 10**9
+    print(f"\nDecay with every stored score ten half-lives stale")
+    for label, func in (
+            ("first top_k(10)", lambda: engine.top_k(10)),
+            ("next top_k(10)", lambda: engine.top_k(10)),
+            ("full refresh", lambda: engine.profiles.refresh(np.arange(len(engine.profiles))))):
+        start = time.perf_counter()
+        func()
+        print(f"   {label:16} {(time.perf_counter() - start) * 1000:9.2f} ms")
+
+
+def full_scan(profiles):
+    """Statistics by scanning every row, as each snapshot did before"""
+    scores = profiles.column('risk_score')
+    levels = np.bincount(profiles.column('level'), minlength=3)
+    return levels, scores.mean(), scores.max(), scores.min()
+
+
+
+def full_sort(profiles, threshold=0):
+    """Ranked rows by filtering and sorting every score, as before the index"""
+    scores = profiles.column('risk_score')
+    rows = np.flatnonzero(scores >= threshold)
+    return rows[np.argsort(-scores[rows], kind='stable')]
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
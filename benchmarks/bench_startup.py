@@ -0,0 +1,55 @@
+"""
+Startup Import Benchmark
+Import time of the dashboard's modules, measured with python -X importtime
+"""
+
+import sys
+import os
+import subprocess
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+MODULES = (
+    'detection.anomaly_detector',
+    'detection.retrain',
+    'monitoring.traffic_capture',
+    'visualization.dashboard',
+)
+
+
+def import_profile(module):
+    """(cumulative seconds, {imported module: cumulative seconds}) for a fresh import"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=SRC, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise ImportError(result.stderr.strip().splitlines()[-1])
+    modules = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():
+                modules[name.strip()] = int(cumulative) / 1e6
+    return modules[module], modules
+
+
+def main(top=5):
+    print(f"{'module':<30} {'import':>9}   heaviest dependencies")
+    for module in MODULES:
+        try:
+            total, modules = import_profile(module)
+        except ImportError as e:
+            print(f"{module:<30} {'-':>9}   {e}")
+            continue
+        # Top-level packages only, so nested imports are not counted twice
+        packages = {}
+        for name, seconds in modules.items():
+            root = name.split('.')[0]
+            if root != module.split('.')[0]:
+                packages[root] = max(packages.get(root, 0), seconds)
+        heaviest = sorted(packages.items(), key=lambda item: -item[1])[:top]
+        print(f"{module:<30} {total * 1000:>7.0f}ms   "
+              + ', '.join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in heaviest))
+
+
+if __name__ == "__main__":
+    main()
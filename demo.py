@@ -12,6 +12,7 @@ from detection.anomaly_detector import AnomalyDetector
 from simulation.iot_simulator import IoTSimulator
 from profiling.risk_engine import RiskEngine
 from alerts.notification import AlertManager
+from visualization.dashboard import to_local_time
 from database.db_manager import DatabaseManager
 import time
 import pandas as pd
@@ -55,7 +56,9 @@ def demo_traffic_monitoring():
     
     if not df.empty:
         print("\n📋 Sample packets:")
-        print(df[['timestamp', 'src_ip', 'dst_ip', 'protocol', 'length']].head(5).to_string(index=False))
+        sample = df[['timestamp', 'src_ip', 'dst_ip', 'protocol', 'length']].head(5)
+        sample = sample.assign(timestamp=to_local_time(sample['timestamp']))
+        print(sample.to_string(index=False))
     else:
         print("\n⚠️  No packets captured yet (simulation starting up...)")
     
@@ -81,8 +84,7 @@ def demo_anomaly_detection(df):
         print("✅ Model trained successfully!")
         
         print("\n🔍 Detecting anomalies...")
-        predictions = detector.predict(df)
-        scores = detector.get_anomaly_scores(df)
+        predictions, _, scores = detector.score_batch(df)
         
         anomaly_count = predictions.sum()
         anomaly_rate = (anomaly_count / len(predictions)) * 100
@@ -34,6 +34,7 @@ setup(
         "pandas>=2.1.4",
         "numpy>=1.26.3",
         "scikit-learn>=1.4.0",
+        "threadpoolctl>=3.2.0",
         "pyod>=1.1.3",
         "scapy>=2.5.0",
         "plotly>=5.18.0",
@@ -31,7 +31,7 @@ class DatabaseManager:
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS traffic_logs (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp DATETIME,
+                timestamp INTEGER,  -- epoch nanoseconds
                 src_ip TEXT,
                 dst_ip TEXT,
                 src_port INTEGER,
@@ -108,6 +108,10 @@ class DatabaseManager:
         
         conn = sqlite3.connect(self.db_path)
         
+        # Traffic timestamps are stored as epoch nanoseconds
+        if 'timestamp' in df.columns and pd.api.types.is_datetime64_any_dtype(df['timestamp']):
+            df['timestamp'] = df['timestamp'].astype('datetime64[ns]').astype('int64')
+        
         # Add anomaly information if available
         if predictions is not None:
             df['is_anomaly'] = predictions
@@ -297,7 +301,12 @@ class DatabaseManager:
         
         cutoff_date = datetime.now() - pd.Timedelta(days=days)
         
-        cursor.execute("DELETE FROM traffic_logs WHERE timestamp < ?", (cutoff_date,))
+        cutoff_ns = int(cutoff_date.timestamp() * 1_000_000_000)
+        # Rows logged before the switch to epoch nanoseconds hold datetime text
+        cursor.execute(
+            "DELETE FROM traffic_logs WHERE timestamp < ? OR (typeof(timestamp) = 'text' AND timestamp < ?)",
+            (cutoff_ns, cutoff_date)
+        )
         cursor.execute("DELETE FROM anomaly_records WHERE timestamp < ?", (cutoff_date,))
         cursor.execute("DELETE FROM alerts WHERE timestamp < ?", (cutoff_date,))
         cursor.execute("DELETE FROM system_logs WHERE timestamp < ?", (cutoff_date,))
@@ -5,91 +5,117 @@ Uses ML algorithms to detect network anomalies
 
 import numpy as np
 import pandas as pd
-from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
-from sklearn.svm import OneClassSVM
-from sklearn.neighbors import LocalOutlierFactor
-from pyod.models.auto_encoder import AutoEncoder
+from threadpoolctl import threadpool_limits
 import pickle
 import os
 
+from .features import extract_features
+from .drift import DriftMonitor
+
+
+SKLEARN_MODELS = ['isolation_forest', 'ocsvm', 'ocsvm_sgd', 'lof', 'lof_indexed', 'hst']
+CALIBRATION_QUANTILES = np.linspace(0, 1, 1001)
+# Newest scaled rows an online model recalibrates on after each partial_fit
+CALIBRATION_WINDOW = 10000
+# Above this batch size scikit-learn's Cython traversal is faster than the compiled forest
+COMPILED_BATCH_LIMIT = 8192
+
+
+# Model backends, imported only when their model type is selected
+def _isolation_forest(contamination, **params):
+    from sklearn.ensemble import IsolationForest
+    return IsolationForest(contamination=contamination, random_state=42, n_estimators=100,
+                           **params)
+
+
+def _ocsvm(contamination, **params):
+    from sklearn.svm import OneClassSVM
+    return OneClassSVM(nu=contamination, kernel='rbf', gamma='auto', **params)
+
+
+def _ocsvm_sgd(contamination, **params):
+    from .sgd_ocsvm import ApproximateOneClassSVM
+    return ApproximateOneClassSVM(nu=contamination, gamma='auto', random_state=42, **params)
+
+
+def _lof(contamination, **params):
+    from sklearn.neighbors import LocalOutlierFactor
+    return LocalOutlierFactor(contamination=contamination, novelty=True, **params)
+
+
+def _lof_indexed(contamination, **params):
+    from .neighbors import IndexedLOF
+    return IndexedLOF(contamination=contamination, **params)
+
+
+def _hst(contamination, **params):
+    from .streaming import HalfSpaceTrees
+    return HalfSpaceTrees(contamination=contamination, random_state=42, **params)
+
+
+def _autoencoder(contamination, **params):
+    # Pulls in a deep-learning framework, so only when actually configured
+    from pyod.models.auto_encoder import AutoEncoder
+    return AutoEncoder(contamination=contamination, hidden_neurons=[64, 32, 32, 64], **params)
+
+
+MODEL_BACKENDS = {
+    'isolation_forest': _isolation_forest,
+    'ocsvm': _ocsvm,
+    'ocsvm_sgd': _ocsvm_sgd,
+    'lof': _lof,
+    'lof_indexed': _lof_indexed,
+    'hst': _hst,
+    'autoencoder': _autoencoder
+}
+
 
 class AnomalyDetector:
-    def __init__(self, model_type='isolation_forest', contamination=0.1):
+    def __init__(self, model_type='isolation_forest', contamination=0.1, threshold=None,
+                 model_params=None):
         self.model_type = model_type
         self.contamination = contamination
+        self.threshold = threshold  # Calibrated score cutoff; None = the model's own decision
+        self.model_params = dict(model_params or {})  # Extra backend constructor arguments
         self.model = None
         self.scaler = StandardScaler()
+        self.calibration = None  # Training anomaly-score quantiles
+        self.calibration_rows = None  # Recent scaled traffic online models recalibrate on
+        self.compiled = None  # Flat-array IsolationForest for small-batch scoring
+        self.drift = None  # Training snapshot; callers feed it traffic not seen before
         self.is_trained = False
         self._initialize_model()
     
     def _initialize_model(self):
         """Initialize the selected ML model"""
-        if self.model_type == 'isolation_forest':
-            self.model = IsolationForest(
-                contamination=self.contamination,
-                random_state=42,
-                n_estimators=100
-            )
-        elif self.model_type == 'ocsvm':
-            self.model = OneClassSVM(
-                nu=self.contamination,
-                kernel='rbf',
-                gamma='auto'
-            )
-        elif self.model_type == 'lof':
-            self.model = LocalOutlierFactor(
-                contamination=self.contamination,
-                novelty=True
-            )
-        elif self.model_type == 'autoencoder':
-            self.model = AutoEncoder(
-                contamination=self.contamination,
-                hidden_neurons=[64, 32, 32, 64]
-            )
-        else:
+        if self.model_type not in MODEL_BACKENDS:
             raise ValueError(f"Unknown model type: {self.model_type}")
+        self.model = MODEL_BACKENDS[self.model_type](self.contamination, **self.model_params)
     
     def preprocess_data(self, df):
         """Extract features from packet data"""
         if df.empty:
             return pd.DataFrame()
-        
-        features = pd.DataFrame()
-        
-        # Numeric features
-        features['length'] = df['length']
-        features['src_port'] = df['src_port'].fillna(0)
-        features['dst_port'] = df['dst_port'].fillna(0)
-        
-        # Protocol encoding
-        protocol_map = {'TCP': 0, 'UDP': 1, 'ICMP': 2, 'OTHER': 3}
-        features['protocol'] = df['protocol'].map(protocol_map).fillna(3)
-        
-        # Time-based features
-        if 'timestamp' in df.columns:
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            features['hour'] = df['timestamp'].dt.hour
-            features['minute'] = df['timestamp'].dt.minute
-            features['second'] = df['timestamp'].dt.second
-        
-        # IP-based features (simplified)
-        if 'src_ip' in df.columns:
-            features['src_ip_last_octet'] = df['src_ip'].apply(
-                lambda x: int(str(x).split('.')[-1]) if pd.notna(x) else 0
-            )
-        if 'dst_ip' in df.columns:
-            features['dst_ip_last_octet'] = df['dst_ip'].apply(
-                lambda x: int(str(x).split('.')[-1]) if pd.notna(x) else 0
-            )
-        
-        return features.fillna(0)
+        matrix, names = extract_features(df)
+        return pd.DataFrame(matrix, columns=names, copy=False)
     
-    def train(self, df):
-        """Train the anomaly detection model"""
-        features = self.preprocess_data(df)
+    def train(self, df, threads=None):
+        """Train the anomaly detection model
         
-        if features.empty or len(features) < 10:
+        threads limits native math libraries while fitting; the limit is
+        process-wide, so scoring in this process is limited meanwhile too.
+        """
+        features, names = extract_features(df)
+        with threadpool_limits(limits=threads):
+            if not self.fit_features(features):
+                return False
+        self.drift = DriftMonitor().fit(features, names)
+        return True
+    
+    def fit_features(self, features):
+        """Train on an already extracted feature matrix"""
+        if len(features) < 10:
             print("Insufficient data for training")
             return False
         
@@ -99,6 +125,10 @@ class AnomalyDetector:
         # Train model
         try:
             self.model.fit(X_scaled)
+            self.compile()
+            self.calibrate(self._decision_scores(X_scaled))
+            if self.online:
+                self.calibration_rows = X_scaled[-CALIBRATION_WINDOW:]
             self.is_trained = True
             print(f"Model trained on {len(features)} samples")
             return True
@@ -106,57 +136,136 @@ class AnomalyDetector:
             print(f"Training error: {e}")
             return False
     
-    def predict(self, df):
-        """Predict anomalies in new data"""
-        if not self.is_trained:
-            return np.array([])
+    def compile(self):
+        """Export a trained IsolationForest to the flat-array inference engine"""
+        self.compiled = None
+        if self.model_type == 'isolation_forest':
+            try:
+                from .compiled_forest import CompiledIsolationForest
+                self.compiled = CompiledIsolationForest.from_sklearn(self.model)
+            except (ValueError, AttributeError, ImportError) as e:
+                # from_sklearn reads private scikit-learn internals that a release may rename
+                print(f"Using scikit-learn inference: {e}")
+    
+    def _decision_scores(self, X_scaled):
+        """The model's decision_function, or negated score_samples"""
+        if self.compiled is not None and len(X_scaled) <= COMPILED_BATCH_LIMIT:
+            return self.compiled.decision_function(X_scaled)
+        if hasattr(self.model, 'decision_function'):
+            return self.model.decision_function(X_scaled)
+        return -self.model.score_samples(X_scaled)
+    
+    def _anomaly_direction(self):
+        # scikit-learn convention: lower decision values are more anomalous
+        return -1.0 if self.model_type in SKLEARN_MODELS else 1.0
+    
+    def calibrate(self, raw_scores):
+        """Store the quantiles of training decision scores for calibrated scoring"""
+        anomaly = self._anomaly_direction() * np.asarray(raw_scores, dtype=np.float64)
+        # Monotone so interpolation stays well defined with tied scores
+        self.calibration = np.maximum.accumulate(np.quantile(anomaly, CALIBRATION_QUANTILES))
+    
+    def calibrated_scores(self, raw_scores):
+        """Fraction of training traffic less anomalous than each score (0-1)
         
-        features = self.preprocess_data(df)
+        Depends only on the sample itself, so a packet scores the same alone
+        or in any batch.
+        """
+        anomaly = self._anomaly_direction() * np.asarray(raw_scores, dtype=np.float64)
+        return np.interp(anomaly, self.calibration, CALIBRATION_QUANTILES)
+    
+    def clone(self):
+        """Untrained detector with the same settings"""
+        return AnomalyDetector(self.model_type, self.contamination, self.threshold,
+                               self.model_params)
+    
+    @property
+    def online(self):
+        """Whether the model can learn incrementally with partial_fit"""
+        return hasattr(self.model, 'partial_fit')
+    
+    def partial_fit(self, df):
+        """Update an online model with newly arrived traffic
         
-        if features.empty:
-            return np.array([])
+        The first call trains the model and fits the scaler; later calls
+        reuse that scaling so the model's feature space stays fixed. The
+        decision function moves with every update, so the quantile table is
+        rebuilt on the newest CALIBRATION_WINDOW rows learned and calibrated
+        scores stay percentiles of recent traffic.
+        """
+        if not self.online:
+            return False
+        if not self.is_trained:
+            return self.train(df)
+        
+        features, _ = extract_features(df)
+        if len(features) == 0:
+            return False
         
         try:
             X_scaled = self.scaler.transform(features)
-            predictions = self.model.predict(X_scaled)
-            
-            # Convert to binary (1 = anomaly, 0 = normal)
-            # Isolation Forest: -1 = anomaly, 1 = normal
-            if self.model_type in ['isolation_forest', 'ocsvm', 'lof']:
-                predictions = np.where(predictions == -1, 1, 0)
-            
-            return predictions
+            self.model.partial_fit(X_scaled)
+            if self.calibration_rows is not None:
+                X_scaled = np.concatenate([self.calibration_rows, X_scaled])[-CALIBRATION_WINDOW:]
+            self.calibration_rows = X_scaled
+            self.calibrate(self._decision_scores(X_scaled))
+            return True
         except Exception as e:
-            print(f"Prediction error: {e}")
-            return np.array([0] * len(features))
+            print(f"Online update error: {e}")
+            return False
     
-    def get_anomaly_scores(self, df):
-        """Get anomaly scores for each sample"""
+    def score_batch(self, df):
+        """Predict labels and scores with one feature extraction and model pass
+
+        Returns (predictions, raw_scores, scores): 1 = anomaly / 0 = normal,
+        the model's decision_function values, and calibrated 0-1 scores
+        (the training percentile of each sample's anomaly score). With a
+        threshold set, predictions are scores at or above it. Models saved
+        before calibration existed fall back to per-batch min-max scores.
+        """
         if not self.is_trained:
-            return np.array([])
+            return np.array([]), np.array([]), np.array([])
         
-        features = self.preprocess_data(df)
-        
-        if features.empty:
-            return np.array([])
+        features, _ = extract_features(df)
+        return self.score_features(features)
+    
+    def score_features(self, features):
+        """score_batch for an already extracted feature matrix"""
+        if not self.is_trained or len(features) == 0:
+            return np.array([]), np.array([]), np.array([])
         
         try:
             X_scaled = self.scaler.transform(features)
             
-            if hasattr(self.model, 'decision_function'):
-                scores = self.model.decision_function(X_scaled)
-                # Normalize scores to 0-1 range
-                scores = (scores - scores.min()) / (scores.max() - scores.min() + 1e-10)
-            elif hasattr(self.model, 'score_samples'):
-                scores = -self.model.score_samples(X_scaled)
-                scores = (scores - scores.min()) / (scores.max() - scores.min() + 1e-10)
+            raw_scores = self._decision_scores(X_scaled)
+            if not hasattr(self.model, 'decision_function'):
+                predictions = self.model.predict(X_scaled)
+            elif self.model_type in SKLEARN_MODELS:
+                # scikit-learn convention: negative decision values are outliers
+                predictions = (raw_scores < 0).astype(int)
             else:
-                scores = np.zeros(len(features))
+                predictions = (raw_scores > self.model.threshold_).astype(int)
             
-            return scores
+            if self.calibration is not None:
+                scores = self.calibrated_scores(raw_scores)
+                if self.threshold is not None:
+                    predictions = (scores >= self.threshold).astype(int)
+            else:
+                # Normalize scores to 0-1 range
+                scores = (raw_scores - raw_scores.min()) / (raw_scores.max() - raw_scores.min() + 1e-10)
+            return predictions, raw_scores, scores
         except Exception as e:
             print(f"Scoring error: {e}")
-            return np.array([0.0] * len(features))
+            zeros = np.zeros(len(features))
+            return zeros.astype(int), zeros, zeros
+    
+    def predict(self, df):
+        """Predict anomalies in new data"""
+        return self.score_batch(df)[0]
+    
+    def get_anomaly_scores(self, df):
+        """Get anomaly scores for each sample"""
+        return self.score_batch(df)[2]
     
     def save_model(self, filepath):
         """Save trained model to disk"""
@@ -171,7 +280,11 @@ class AnomalyDetector:
                     'model': self.model,
                     'scaler': self.scaler,
                     'model_type': self.model_type,
-                    'contamination': self.contamination
+                    'contamination': self.contamination,
+                    'model_params': self.model_params,
+                    'calibration': self.calibration,
+                    'calibration_rows': self.calibration_rows,
+                    'drift': self.drift
                 }, f)
             print(f"Model saved to {filepath}")
             return True
@@ -188,6 +301,11 @@ class AnomalyDetector:
                 self.scaler = data['scaler']
                 self.model_type = data['model_type']
                 self.contamination = data['contamination']
+                self.model_params = data.get('model_params', {})
+                self.calibration = data.get('calibration')
+                self.calibration_rows = data.get('calibration_rows')
+                self.drift = data.get('drift')
+                self.compile()
                 self.is_trained = True
             print(f"Model loaded from {filepath}")
             return True
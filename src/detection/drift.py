@@ -0,0 +1,110 @@
+"""
+Feature Drift Monitoring
+Compares live feature distributions with the training snapshot (PSI / KS)
+"""
+
+import numpy as np
+
+from .features import TIME_FEATURES
+
+
+class DriftMonitor:
+    """Streaming histograms of each feature against the training distribution
+
+    fit stores per-feature bin edges at the training quantiles and the
+    training histogram; update adds new traffic to a second histogram.
+    Memory is fixed at n_features x n_bins counts: once more than window
+    rows are held, the counts are scaled back to window so older traffic
+    fades out and a change in traffic dominates after about window rows.
+
+    Drift is the largest per-feature population stability index (PSI) or
+    binned Kolmogorov-Smirnov distance. Clock features are ignored by
+    default, since time of day always moves on from the training window.
+    """
+
+    def __init__(self, n_bins=10, psi_threshold=0.2, ks_threshold=0.2, min_samples=500,
+                 window=5000, ignore=TIME_FEATURES):
+        self.n_bins = n_bins
+        self.psi_threshold = psi_threshold
+        self.ks_threshold = ks_threshold
+        self.min_samples = min_samples
+        self.window = window
+        self.ignore = tuple(ignore)
+        self.names = []
+        self.columns = []
+        self.edges = None
+        self.baseline = None
+        self.counts = None
+
+    def _histograms(self, features):
+        features = np.asarray(features)
+        counts = np.empty((len(self.columns), self.n_bins))
+        for row, (column, edges) in enumerate(zip(self.columns, self.edges)):
+            bins = np.searchsorted(edges, features[:, column], side='right')
+            counts[row] = np.bincount(bins, minlength=self.n_bins)
+        return counts
+
+    def fit(self, features, names=None):
+        """Snapshot the training distribution and reset the live histogram"""
+        features = np.asarray(features)
+        self.names = list(names) if names is not None else [str(i) for i in range(features.shape[1])]
+        self.columns = [i for i, name in enumerate(self.names) if name not in self.ignore]
+        # Tied quantiles (ports, protocol) leave some bins empty on both sides
+        quantiles = np.linspace(0, 1, self.n_bins + 1)[1:-1]
+        self.edges = [np.quantile(features[:, column], quantiles) for column in self.columns]
+        baseline = self._histograms(features)
+        self.baseline = baseline / max(len(features), 1)
+        self.counts = np.zeros_like(baseline)
+        return self
+
+    def update(self, features):
+        """Add newly arrived traffic to the live histogram; pass each row once"""
+        if self.edges is None or len(features) == 0:
+            return
+        self.counts += self._histograms(features)
+        total = self.samples
+        if total > self.window:
+            self.counts *= self.window / total
+
+    @property
+    def samples(self):
+        """Rows (after fading) in the live histogram"""
+        return float(self.counts[0].sum()) if self.counts is not None and len(self.counts) else 0.0
+
+    @property
+    def ready(self):
+        """Whether enough traffic has been seen to judge drift"""
+        return self.samples >= self.min_samples
+
+    def _current(self):
+        return self.counts / max(self.samples, 1.0)
+
+    def psi(self):
+        """Population stability index per monitored feature"""
+        expected = np.maximum(self.baseline, 1e-4)
+        actual = np.maximum(self._current(), 1e-4)
+        return ((actual - expected) * np.log(actual / expected)).sum(axis=1)
+
+    def ks(self):
+        """Largest gap between the binned training and live CDFs per feature"""
+        return np.abs(np.cumsum(self.baseline, axis=1) - np.cumsum(self._current(), axis=1)).max(axis=1)
+
+    @property
+    def drifted(self):
+        """Whether live traffic has moved away from the training distribution"""
+        if not self.ready or not self.columns:
+            return False
+        return bool(self.psi().max() >= self.psi_threshold or self.ks().max() >= self.ks_threshold)
+
+    def stats(self):
+        """Largest drift scores and the feature they come from"""
+        if not self.ready or not self.columns:
+            return {'drift_samples': int(self.samples), 'drifted': False}
+        psi, ks = self.psi(), self.ks()
+        return {
+            'drift_samples': int(self.samples),
+            'drift_psi': round(float(psi.max()), 4),
+            'drift_ks': round(float(ks.max()), 4),
+            'drift_feature': self.names[self.columns[int(np.argmax(psi))]],
+            'drifted': self.drifted
+        }
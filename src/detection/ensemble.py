@@ -0,0 +1,295 @@
+"""
+Ensemble Detection
+Runs several detectors in parallel worker processes and fuses their scores
+"""
+
+import itertools
+import multiprocessing as mp
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+from threadpoolctl import threadpool_limits
+
+from .anomaly_detector import AnomalyDetector, CALIBRATION_QUANTILES
+from .features import extract_features
+from .drift import DriftMonitor
+
+
+FUSION_METHODS = ('rank', 'max')
+CALIBRATION_SAMPLE = 10000
+
+_generations = itertools.count()
+
+# Worker process state: (generation, model_type) -> trained AnomalyDetector
+_members = {}
+
+
+def _load_shared(name, shape):
+    """Copy a feature matrix out of shared memory"""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return np.array(np.ndarray(shape, dtype=np.float32, buffer=shm.buf, order='F'))
+    finally:
+        shm.close()
+
+
+def _calibration_rows(n):
+    return np.linspace(0, n - 1, min(n, CALIBRATION_SAMPLE)).astype(np.intp)
+
+
+def _ready():
+    return True
+
+
+def _train_member(generation, model_type, contamination, name, shape, threads=None):
+    """Worker: train one member; returns its scores on a sample of the training rows"""
+    features = _load_shared(name, shape)
+    detector = AnomalyDetector(model_type, contamination)
+    # The limit only affects this worker process, not the members still scoring
+    with threadpool_limits(limits=threads):
+        if not detector.fit_features(features):
+            return None
+    scores = detector.score_features(features[_calibration_rows(len(features))])[2]
+    # Keep the previous generation for batches still being scored against it
+    for key in [key for key in _members if key[1] == model_type and key[0] < generation - 1]:
+        del _members[key]
+    _members[(generation, model_type)] = detector
+    return scores
+
+
+def _score_member(generation, model_type, name, shape):
+    """Worker: calibrated scores of one member for a shared feature matrix"""
+    start = time.perf_counter()
+    scores = _members[(generation, model_type)].score_features(_load_shared(name, shape))[2]
+    return scores, time.perf_counter() - start
+
+
+def _share(features):
+    """Place a feature matrix in a new shared memory block"""
+    shm = shared_memory.SharedMemory(create=True, size=max(features.nbytes, 1))
+    np.ndarray(features.shape, dtype=np.float32, buffer=shm.buf, order='F')[:] = features
+    return shm
+
+
+class EnsembleDetector:
+    """Anomaly detector that combines several AnomalyDetector models
+
+    Each member lives in its own worker process. Features are extracted
+    once per batch and handed to all members through shared memory, so the
+    members score concurrently and wall-clock latency is that of the
+    slowest member still within budget, not the sum.
+
+    Member scores are calibrated training percentiles, so they are fused by
+    averaging (rank) or taking the maximum (max), and the fused value is
+    calibrated again against the training sample. A member that misses its
+    latency budget is left out of that batch; after max_overruns misses in
+    a row it is dropped until the next train. The last active member is
+    never dropped, and when every member is late the first to finish is
+    used (without counting it as a miss). The interface matches
+    AnomalyDetector, so the dashboard and RetrainScheduler can use either.
+    """
+
+    model_type = 'ensemble'
+    online = False
+
+    def __init__(self, members=('isolation_forest', 'ocsvm', 'lof'), contamination=0.1,
+                 threshold=None, fusion='rank', latency_budget=0.5, max_overruns=3, pools=None):
+        if fusion not in FUSION_METHODS:
+            raise ValueError(f"Unknown fusion method: {fusion}")
+        self.members = list(members)
+        self.contamination = contamination
+        self.threshold = threshold
+        self.fusion = fusion
+        self.latency_budget = latency_budget  # Seconds, or {member: seconds}
+        self.max_overruns = max_overruns
+        self.pools = pools if pools is not None else {}
+        for member in self.members:
+            self._pool(member)
+        self.generation = next(_generations)
+        self.is_trained = False
+        self.drift = None
+
+        self.active = []
+        self.overruns = {member: 0 for member in self.members}
+        self.latency = {}
+        self._train_scores = {}
+        self._calibrations = {}
+
+    def clone(self):
+        """Untrained ensemble with the same settings, sharing the worker processes"""
+        return EnsembleDetector(self.members, self.contamination, self.threshold, self.fusion,
+                                self.latency_budget, self.max_overruns, self.pools)
+
+    def _pool(self, member):
+        if member not in self.pools:
+            # Spawn rather than fork: the dashboard process is multi-threaded
+            self.pools[member] = ProcessPoolExecutor(max_workers=1,
+                                                     mp_context=mp.get_context('spawn'))
+            # The worker starts with the first task and inherits the submitting
+            # thread's priority, so start it here rather than from a niced retrain
+            self.pools[member].submit(_ready)
+        return self.pools[member]
+
+    def _budget(self, member):
+        if isinstance(self.latency_budget, dict):
+            return self.latency_budget.get(member, 0.5)
+        return self.latency_budget
+
+    def train(self, df, threads=None):
+        """Train every member in parallel, each limited to threads native math threads"""
+        features, names = extract_features(df)
+        if len(features) < 10:
+            print("Insufficient data for training")
+            return False
+
+        shm = _share(features)
+        try:
+            futures = {
+                member: self._pool(member).submit(
+                    _train_member, self.generation, member, self.contamination,
+                    shm.name, features.shape, threads)
+                for member in self.members
+            }
+            wait(futures.values())
+        finally:
+            shm.close()
+            shm.unlink()
+
+        self._train_scores = {}
+        for member, future in futures.items():
+            try:
+                scores = future.result()
+            except Exception as e:
+                print(f"Ensemble member {member} failed: {e}")
+                continue
+            if scores is not None:
+                self._train_scores[member] = scores
+        self.active = [member for member in self.members if member in self._train_scores]
+        self.overruns = {member: 0 for member in self.members}
+        self._calibrations = {}
+        self.is_trained = bool(self.active)
+        if self.is_trained:
+            self.drift = DriftMonitor().fit(features, names)
+            print(f"Ensemble trained on {len(features)} samples: {', '.join(self.active)}")
+        return self.is_trained
+
+    def _fuse(self, scores):
+        """Combine per-member calibrated scores (rows = samples)"""
+        if self.fusion == 'max':
+            return scores.max(axis=1)
+        return scores.mean(axis=1)
+
+    def _calibration(self, members):
+        """Quantiles of the fused training score for a subset of members"""
+        key = tuple(members)
+        if key not in self._calibrations:
+            fused = self._fuse(np.column_stack([self._train_scores[m] for m in members]))
+            self._calibrations[key] = np.maximum.accumulate(
+                np.quantile(fused, CALIBRATION_QUANTILES))
+        return self._calibrations[key]
+
+    def _overrun(self, member):
+        self.overruns[member] += 1
+        # The last member is kept: a slow answer beats none
+        if (self.overruns[member] >= self.max_overruns and member in self.active
+                and len(self.active) > 1):
+            self.active.remove(member)
+            print(f"Ensemble member {member} dropped after {self.overruns[member]} "
+                  f"overruns of its {self._budget(member)}s budget")
+
+    def score_batch(self, df):
+        """Predict labels and scores; see AnomalyDetector.score_batch
+
+        raw_scores are the fused member scores before calibration.
+        """
+        if not self.is_trained:
+            return np.array([]), np.array([]), np.array([])
+        features, _ = extract_features(df)
+        return self.score_features(features)
+
+    def score_features(self, features):
+        """score_batch for an already extracted feature matrix"""
+        if not self.is_trained or len(features) == 0:
+            return np.array([]), np.array([]), np.array([])
+
+        shm = _share(features)
+        try:
+            start = time.perf_counter()
+            pending = {
+                self._pool(member).submit(_score_member, self.generation, member,
+                                          shm.name, features.shape): member
+                for member in self.active
+            }
+            deadlines = {member: start + self._budget(member) for member in pending.values()}
+            results, late = {}, {}
+            while pending:
+                remaining = min(deadlines[m] for m in pending.values()) - time.perf_counter()
+                done, _ = wait(pending, timeout=max(remaining, 0), return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[pending.pop(future)] = future
+                now = time.perf_counter()
+                for future, member in list(pending.items()):
+                    if now >= deadlines[member]:
+                        late[future] = pending.pop(future)
+            if not results and late:
+                # Nobody made the budget: take whoever finishes first rather than nothing
+                done, _ = wait(late, return_when=FIRST_COMPLETED)
+                results = {late[future]: future for future in done}
+            for future, member in late.items():
+                future.cancel()
+                if member not in results:
+                    self._overrun(member)
+        finally:
+            shm.close()
+            shm.unlink()
+
+        answered, columns = [], []
+        for member in self.members:
+            if member not in results:
+                continue
+            try:
+                scores, elapsed = results[member].result()
+            except Exception as e:
+                print(f"Ensemble member {member} scoring error: {e}")
+                continue
+            if member in self.active and member not in late.values():
+                self.overruns[member] = 0
+            self.latency[member] = elapsed
+            answered.append(member)
+            columns.append(scores)
+
+        if not answered:
+            # Every member failed; report untrained so the dashboard asks for a retrain
+            print("No ensemble member could score; marking the ensemble untrained")
+            self.is_trained = False
+            zeros = np.zeros(len(features))
+            return zeros.astype(int), zeros, zeros
+        raw_scores = self._fuse(np.column_stack(columns))
+        scores = np.interp(raw_scores, self._calibration(answered), CALIBRATION_QUANTILES)
+        threshold = 1 - self.contamination if self.threshold is None else self.threshold
+        predictions = (scores >= threshold).astype(int)
+        return predictions, raw_scores, scores
+
+    def predict(self, df):
+        """Predict anomalies in new data"""
+        return self.score_batch(df)[0]
+
+    def get_anomaly_scores(self, df):
+        """Get anomaly scores for each sample"""
+        return self.score_batch(df)[2]
+
+    def stats(self):
+        """Active members, overrun counts and last scoring latency per member"""
+        return {
+            'ensemble_active': list(self.active),
+            'ensemble_overruns': dict(self.overruns),
+            'ensemble_latency': {m: round(t, 4) for m, t in self.latency.items()}
+        }
+
+    def close(self):
+        """Shut down the worker processes"""
+        for pool in self.pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        self.pools.clear()
@@ -0,0 +1,128 @@
+"""
+Feature Extraction
+Vectorized conversion of packet and flow DataFrames into model input
+"""
+
+import os
+from datetime import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import numpy as np
+import pandas as pd
+
+
+PROTOCOL_MAP = {'TCP': 0, 'UDP': 1, 'ICMP': 2, 'OTHER': 3}
+TIME_FEATURES = ('hour', 'minute', 'second')
+FLOW_FEATURES = ('packets', 'bytes', 'duration', 'iat_mean', 'iat_std')
+
+
+def feature_names(df):
+    """Feature columns produced for a DataFrame, in matrix order"""
+    names = ['length', 'src_port', 'dst_port', 'protocol']
+    if 'timestamp' in df.columns:
+        names.extend(TIME_FEATURES)
+    if 'src_ip' in df.columns:
+        names.append('src_ip_last_octet')
+    if 'dst_ip' in df.columns:
+        names.append('dst_ip_last_octet')
+    names.extend(column for column in FLOW_FEATURES if column in df.columns)
+    return names
+
+
+def _numeric(values):
+    """Column as float32 with missing values as 0"""
+    return values.to_numpy(dtype=np.float32, na_value=0)
+
+
+def _codes_and_uniques(values):
+    """Integer codes into distinct values, reusing categorical codes when present"""
+    # A small slice of a large categorical is cheaper to factorize than its categories
+    if isinstance(values.dtype, pd.CategoricalDtype) and len(values.cat.categories) <= len(values):
+        return values.cat.codes.to_numpy(), values.cat.categories
+    return pd.factorize(values)
+
+
+def _lookup(codes, table):
+    """Map codes through a per-unique table; missing (-1) codes map to 0"""
+    return np.append(table, 0).astype(np.float32)[codes]
+
+
+def _protocol_codes(values):
+    codes, uniques = _codes_and_uniques(values)
+    table = [PROTOCOL_MAP.get(name, 3) for name in uniques]
+    return _lookup(codes, np.asarray(table, dtype=np.float32))
+
+
+def _last_octet(values):
+    """Last IPv4 octet, computed once per distinct address"""
+    if pd.api.types.is_integer_dtype(values):
+        return (values.to_numpy(dtype=np.int64, na_value=0) & 0xFF).astype(np.float32)
+    codes, uniques = _codes_and_uniques(values)
+    octets = pd.Series(np.asarray(uniques, dtype=str)).str.rpartition('.')[2]
+    table = pd.to_numeric(octets, errors='coerce').fillna(0).to_numpy(dtype=np.float32)
+    return _lookup(codes, table)
+
+
+@lru_cache(maxsize=None)
+def local_timezone():
+    """The system time zone by IANA name, so each timestamp gets its own DST offset
+
+    Taken from TZ or the /etc/localtime link; falls back to the current
+    fixed UTC offset when neither names a zone.
+    """
+    names = [os.environ.get('TZ', '').lstrip(':'),
+             os.path.realpath('/etc/localtime').partition('zoneinfo/')[2]]
+    for name in filter(None, names):
+        try:
+            return ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError, OSError):
+            continue
+    return datetime.now().astimezone().tzinfo
+
+
+def _seconds_of_day(values):
+    """Local seconds since midnight for epoch-nanosecond or datetime timestamps"""
+    if pd.api.types.is_numeric_dtype(values):
+        values = pd.to_datetime(values, unit='ns', utc=True).dt.tz_convert(local_timezone())
+    else:
+        values = pd.to_datetime(values)
+    return (values.dt.hour * 3600 + values.dt.minute * 60 + values.dt.second).to_numpy()
+
+
+def extract_features(df, out=None):
+    """Build the float32 feature matrix for a packet or flow DataFrame
+
+    Returns (matrix, names). Columns are written straight into one
+    preallocated array (out, if given and large enough) and per-address or
+    per-protocol work runs once per distinct value. The input is not modified.
+    """
+    names = feature_names(df)
+    n = len(df)
+    if out is not None and out.shape[0] >= n and out.shape[1] == len(names):
+        matrix = out[:n]
+    else:
+        # Column-major so each feature is written contiguously
+        matrix = np.empty((n, len(names)), dtype=np.float32, order='F')
+    if n == 0:
+        return matrix, names
+
+    column = {name: i for i, name in enumerate(names)}
+    matrix[:, column['length']] = _numeric(df['length'])
+    matrix[:, column['src_port']] = _numeric(df['src_port'])
+    matrix[:, column['dst_port']] = _numeric(df['dst_port'])
+    matrix[:, column['protocol']] = _protocol_codes(df['protocol'])
+
+    if 'hour' in column:
+        seconds = _seconds_of_day(df['timestamp'])
+        matrix[:, column['hour']] = seconds // 3600
+        matrix[:, column['minute']] = seconds // 60 % 60
+        matrix[:, column['second']] = seconds % 60
+    if 'src_ip_last_octet' in column:
+        matrix[:, column['src_ip_last_octet']] = _last_octet(df['src_ip'])
+    if 'dst_ip_last_octet' in column:
+        matrix[:, column['dst_ip_last_octet']] = _last_octet(df['dst_ip'])
+    for name in FLOW_FEATURES:
+        if name in column:
+            matrix[:, column[name]] = _numeric(df[name])
+    return matrix, names
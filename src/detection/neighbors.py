@@ -0,0 +1,199 @@
+"""
+Neighbour Indexes
+Exact and approximate k-nearest-neighbour search for density-based detectors
+"""
+
+import numpy as np
+from sklearn.neighbors import KDTree, BallTree
+
+
+INDEX_TYPES = ('kd_tree', 'ball_tree', 'brute', 'random_projection')
+
+
+class TreeIndex:
+    """Exact search with a scikit-learn KD-tree or ball tree"""
+
+    def __init__(self, X, kind='kd_tree', leaf_size=40):
+        tree = KDTree if kind == 'kd_tree' else BallTree
+        self.tree = tree(X, leaf_size=leaf_size)
+
+    def query(self, X, k):
+        return self.tree.query(X, k=k)
+
+
+class BruteIndex:
+    """Exact search by chunked pairwise distances"""
+
+    def __init__(self, X, chunk_size=1024):
+        self.data = np.asarray(X, dtype=np.float64)
+        self.norms = (self.data ** 2).sum(axis=1)
+        self.chunk_size = chunk_size
+
+    def query(self, X, k):
+        X = np.asarray(X, dtype=np.float64)
+        distances = np.empty((len(X), k))
+        indices = np.empty((len(X), k), dtype=np.intp)
+        for start in range(0, len(X), self.chunk_size):
+            chunk = X[start:start + self.chunk_size]
+            squared = (chunk ** 2).sum(axis=1)[:, None] + self.norms - 2 * chunk @ self.data.T
+            nearest = np.argpartition(squared, k - 1, axis=1)[:, :k]
+            nearest_sq = np.take_along_axis(squared, nearest, axis=1)
+            order = np.argsort(nearest_sq, axis=1)
+            indices[start:start + len(chunk)] = np.take_along_axis(nearest, order, axis=1)
+            distances[start:start + len(chunk)] = np.sqrt(np.maximum(
+                np.take_along_axis(nearest_sq, order, axis=1), 0))
+        return distances, indices
+
+
+class ProjectionForest:
+    """Approximate search with a forest of random projection trees
+
+    Each tree splits its points at the median of their projection onto a
+    random direction, level by level, until leaves hold at most leaf_size
+    points, so every tree is a perfect binary tree stored in level order.
+    A query collects the leaf it falls into in every tree and re-ranks
+    those candidates by exact distance. More trees or larger leaves raise
+    recall at the cost of query time. Leaves can hold as few as half of
+    leaf_size points and trees often return the same points, so a query
+    left with fewer than k distinct candidates is answered exactly.
+    """
+
+    def __init__(self, X, n_trees=8, leaf_size=32, random_state=42):
+        self.n_trees = n_trees
+        self.leaf_size = leaf_size
+        self.data = np.asarray(X, dtype=np.float64)
+        n, dims = self.data.shape
+        rng = np.random.default_rng(random_state)
+        self.depth = max(int(np.ceil(np.log2(max(n, 1) / leaf_size))), 0)
+        internal, leaves = 2 ** self.depth - 1, 2 ** self.depth
+
+        self.directions = rng.normal(size=(n_trees, max(internal, 1), dims))
+        self.thresholds = np.zeros((n_trees, max(internal, 1)))
+        width = -(-n // leaves)
+        self.leaves = np.full((n_trees, leaves, width), -1, dtype=np.intp)
+        for t in range(n_trees):
+            segments = [np.arange(n)]
+            for level in range(self.depth):
+                children = []
+                for offset, points in enumerate(segments):
+                    node = 2 ** level - 1 + offset
+                    projection = self.data[points] @ self.directions[t, node]
+                    half = len(points) // 2
+                    order = np.argpartition(projection, half) if len(points) > 1 else [0]
+                    self.thresholds[t, node] = projection[order[half - 1]] if half else np.inf
+                    children.extend((points[order[:half]], points[order[half:]]))
+                segments = children
+            for leaf, points in enumerate(segments):
+                self.leaves[t, leaf, :len(points)] = points
+
+    def query(self, X, k):
+        X = np.asarray(X, dtype=np.float64)
+        rows = np.arange(len(X))
+        candidates = []
+        for t in range(len(self.leaves)):
+            node = np.zeros(len(X), dtype=np.intp)
+            for _ in range(self.depth):
+                projection = np.einsum('ij,ij->i', X, self.directions[t, node])
+                node = 2 * node + 1 + (projection > self.thresholds[t, node])
+            candidates.append(self.leaves[t, node - (2 ** self.depth - 1)])
+        # Drop padding and points found by several trees before ranking
+        candidates = np.sort(np.concatenate(candidates, axis=1), axis=1)
+        invalid = candidates < 0
+        invalid[:, 1:] |= candidates[:, 1:] == candidates[:, :-1]
+        exact = np.sqrt(((self.data[candidates] - X[:, None, :]) ** 2).sum(axis=2))
+        exact[invalid] = np.inf
+        if exact.shape[1] < k:
+            missing = k - exact.shape[1]
+            exact = np.pad(exact, ((0, 0), (0, missing)), constant_values=np.inf)
+            candidates = np.pad(candidates, ((0, 0), (0, missing)), constant_values=-1)
+        order = np.argsort(exact, axis=1)[:, :k]
+        distances, indices = exact[rows[:, None], order], candidates[rows[:, None], order]
+        short = np.isinf(distances[:, -1])
+        if short.any():
+            distances[short], indices[short] = BruteIndex(self.data).query(X[short], k)
+        return distances, indices
+
+
+def build_index(X, index='kd_tree', **params):
+    """Neighbour index of the given type over the rows of X"""
+    if index in ('kd_tree', 'ball_tree'):
+        return TreeIndex(X, index, **params)
+    if index == 'brute':
+        return BruteIndex(X, **params)
+    if index == 'random_projection':
+        return ProjectionForest(X, **params)
+    raise ValueError(f"Unknown neighbour index: {index}")
+
+
+class IndexedLOF:
+    """Local Outlier Factor novelty detection over a persistent neighbour index
+
+    fit builds the index once and stores each training point's k-distance
+    and local reachability density, so scoring a batch is a single
+    k-neighbour query plus array arithmetic. The index is part of the
+    fitted object and is pickled with it, so a loaded model scores without
+    rebuilding it. Scores follow LocalOutlierFactor(novelty=True).
+    """
+
+    def __init__(self, n_neighbors=20, contamination=0.1, index='kd_tree', chunk_size=8192,
+                 **index_params):
+        if index not in INDEX_TYPES:
+            raise ValueError(f"Unknown neighbour index: {index}")
+        self.n_neighbors = n_neighbors
+        self.contamination = contamination
+        self.index = index
+        self.index_params = index_params
+        self.chunk_size = chunk_size
+        self.index_ = None
+
+    def _neighbors(self, X, k, exclude_self=False):
+        distances, indices = [], []
+        for start in range(0, len(X), self.chunk_size):
+            chunk = X[start:start + self.chunk_size]
+            if not exclude_self:
+                d, i = self.index_.query(chunk, k)
+            else:
+                # Query one extra neighbour and drop the point itself (or the farthest)
+                d, i = self.index_.query(chunk, k + 1)
+                own = i == np.arange(start, start + len(chunk))[:, None]
+                own[~own.any(axis=1), -1] = True
+                own &= np.cumsum(own, axis=1) == 1
+                d, i = d[~own].reshape(len(chunk), k), i[~own].reshape(len(chunk), k)
+            distances.append(d)
+            indices.append(i)
+        return np.concatenate(distances), np.concatenate(indices)
+
+    def _reachability_density(self, distances, indices):
+        reach = np.maximum(distances, self.k_distance_[indices])
+        return 1.0 / (reach.mean(axis=1) + 1e-10)
+
+    def fit(self, X):
+        """Build the index and the training densities"""
+        X = np.asarray(X, dtype=np.float64)
+        self.n_neighbors_ = max(1, min(self.n_neighbors, len(X) - 1))
+        self.index_ = build_index(X, self.index, **self.index_params)
+        if (isinstance(self.index_, ProjectionForest)
+                and self.index_.n_trees * self.index_.leaf_size < self.n_neighbors_ + 1):
+            raise ValueError(f"n_trees * leaf_size must be at least n_neighbors + 1 "
+                             f"({self.n_neighbors_ + 1}) for the random_projection index")
+        distances, indices = self._neighbors(X, self.n_neighbors_, exclude_self=True)
+        self.k_distance_ = distances[:, -1]
+        self.lrd_ = self._reachability_density(distances, indices)
+        self.negative_outlier_factor_ = -(self.lrd_[indices] / self.lrd_[:, None]).mean(axis=1)
+        self.offset_ = np.percentile(self.negative_outlier_factor_, 100.0 * self.contamination)
+        return self
+
+    def score_samples(self, X):
+        """Opposite of the local outlier factor; lower is more abnormal"""
+        X = np.asarray(X, dtype=np.float64)
+        distances, indices = self._neighbors(X, self.n_neighbors_)
+        lrd = self._reachability_density(distances, indices)
+        return -(self.lrd_[indices] / lrd[:, None]).mean(axis=1)
+
+    def decision_function(self, X):
+        """Score shifted by the contamination offset; negative values are outliers"""
+        return self.score_samples(X) - self.offset_
+
+    def predict(self, X):
+        """-1 for outliers, 1 for inliers"""
+        return np.where(self.decision_function(X) < 0, -1, 1)
@@ -0,0 +1,169 @@
+"""
+Background Retraining
+Periodically refits a fresh detector and hot-swaps it in
+"""
+
+import os
+import threading
+import time
+
+
+class RetrainScheduler:
+    """Retrains the anomaly detector on a recent traffic window in the background
+
+    source is a callable returning the training DataFrame (for example the
+    newest packets of a TrafficCapture, or DatabaseManager.get_traffic_logs).
+    Every interval seconds a clone() of the detector is trained on it
+    and, if training succeeds, replaces self.detector in a single reference
+    assignment. Scorers read self.detector once per batch, so they never
+    wait for training and never see a model paired with the wrong scaler.
+
+    Retraining is skipped when fewer than min_new_fraction of the window's
+    rows arrived since the last fit. With drift_gate, a detector that has a
+    DriftMonitor is retrained when its features drift instead of on the
+    timer: the worker checks every drift_poll seconds and skips scheduled
+    retrains while traffic matches the training snapshot.
+
+    The worker thread runs at a lower scheduling priority (nice) and passes
+    threads to train() as the native math thread limit. An in-process
+    detector can only apply that limit process-wide, so scoring is limited
+    too while it trains; the ensemble applies it inside its member
+    processes, whose priority is unaffected.
+    """
+
+    def __init__(self, detector, source, interval=3600, min_samples=100,
+                 min_new_fraction=0.1, threads=1, nice=10, drift_gate=True, drift_poll=60):
+        self.detector = detector
+        self.source = source
+        self.interval = interval
+        self.min_samples = min_samples
+        self.min_new_fraction = min_new_fraction
+        self.threads = threads
+        self.nice = nice
+        self.drift_gate = drift_gate
+        self.drift_poll = drift_poll
+
+        self.retrains = 0
+        self.skipped = 0
+        self.stable_skips = 0  # Scheduled retrains saved because nothing drifted
+        self.failures = 0
+        self.last_duration = 0.0
+        self.last_retrain = None
+        self.trained_until = 0  # Newest timestamp in the last training window
+
+        self._wake = threading.Event()
+        self._force = False
+        self._last_scheduled = time.monotonic()
+        self._stopping = False
+        self._busy = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Start the background worker"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Stop the worker; a retrain in progress finishes first"""
+        self._stopping = True
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def trigger(self, force=True):
+        """Ask the worker to retrain now instead of at the next interval"""
+        self._force = force
+        self._wake.set()
+
+    @property
+    def training(self):
+        """Whether a retrain is running right now"""
+        return self._busy.locked()
+
+    def _lower_priority(self):
+        # On Linux a thread id is a valid PRIO_PROCESS target and only affects this thread
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), self.nice)
+        except (AttributeError, OSError):
+            pass
+
+    def _drift(self):
+        drift = getattr(self.detector, 'drift', None) if self.drift_gate else None
+        return drift if drift is not None and drift.ready else None
+
+    def _due(self):
+        """Whether a scheduled (not triggered) retrain should run now"""
+        now = time.monotonic()
+        elapsed = now - self._last_scheduled >= self.interval
+        drift = self._drift()
+        if drift is not None and drift.drifted:
+            self._last_scheduled = now
+            return True
+        if elapsed:
+            self._last_scheduled = now
+            if drift is not None:
+                self.stable_skips += 1
+                return False
+        return elapsed
+
+    def _run(self):
+        self._lower_priority()
+        while True:
+            poll = min(self.interval, self.drift_poll) if self.drift_gate else self.interval
+            triggered = self._wake.wait(poll)
+            self._wake.clear()
+            if self._stopping:
+                break
+            if triggered:
+                self._last_scheduled = time.monotonic()
+            elif not self._due():
+                continue
+            force, self._force = self._force, False
+            try:
+                self.retrain_now(force)
+            except Exception as e:
+                self.failures += 1
+                print(f"Retraining error: {e}")
+
+    def retrain_now(self, force=False):
+        """Train a replacement detector and swap it in; returns True if swapped"""
+        with self._busy:
+            df = self.source()
+            if len(df) < self.min_samples:
+                self.skipped += 1
+                return False
+
+            newest = int(df['timestamp'].max())
+            new_rows = int((df['timestamp'] > self.trained_until).sum())
+            if not force and new_rows < self.min_new_fraction * len(df):
+                self.skipped += 1
+                return False
+
+            candidate = self.detector.clone()
+            start = time.perf_counter()
+            trained = candidate.train(df, threads=self.threads)
+            self.last_duration = time.perf_counter() - start
+            if not trained:
+                self.failures += 1
+                return False
+
+            self.detector = candidate
+            self.trained_until = newest
+            self.retrains += 1
+            self.last_retrain = time.time()
+            return True
+
+    def stats(self):
+        """Retraining counters"""
+        return {
+            'retrains': self.retrains,
+            'retrains_skipped': self.skipped,
+            'retrain_failures': self.failures,
+            'retrains_skipped_stable': self.stable_skips,
+            'last_retrain_seconds': round(self.last_duration, 3),
+            'retraining': self.training
+        }
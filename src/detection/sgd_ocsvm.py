@@ -0,0 +1,72 @@
+"""
+Large-Scale One-Class SVM
+Nystroem RBF approximation with a linear SGD one-class SVM
+"""
+
+import numpy as np
+from sklearn.kernel_approximation import Nystroem
+from sklearn.linear_model import SGDOneClassSVM
+
+
+class ApproximateOneClassSVM:
+    """One-class SVM that scales linearly with the number of packets
+
+    The RBF kernel is approximated by a Nystroem feature map fitted on
+    n_components sampled rows, and a linear SGDOneClassSVM is trained on
+    the mapped features chunk by chunk. Fit cost grows linearly with the
+    training set and memory is bounded by chunk_size, unlike the exact
+    OneClassSVM whose cost grows superlinearly. partial_fit continues
+    training on new traffic with the same feature map.
+    """
+
+    def __init__(self, nu=0.1, gamma='auto', n_components=300, n_epochs=3, chunk_size=10000,
+                 random_state=42):
+        self.nu = nu
+        self.gamma = gamma
+        self.n_components = n_components
+        self.n_epochs = n_epochs
+        self.chunk_size = chunk_size
+        self.random_state = random_state
+        self.feature_map_ = None
+        self.svm_ = None
+
+    def _update(self, X, order):
+        for start in range(0, len(order), self.chunk_size):
+            rows = order[start:start + self.chunk_size]
+            self.svm_.partial_fit(self.feature_map_.transform(X[rows]))
+
+    def fit(self, X):
+        """Fit the feature map on a sample, then the SVM over shuffled chunks"""
+        X = np.asarray(X)
+        rng = np.random.default_rng(self.random_state)
+        n = len(X)
+        components = min(self.n_components, n)
+        gamma = 1.0 / X.shape[1] if self.gamma == 'auto' else self.gamma
+
+        sample = X[rng.choice(n, components, replace=False)]
+        self.feature_map_ = Nystroem(gamma=gamma, n_components=components,
+                                     random_state=self.random_state).fit(sample)
+        self.svm_ = SGDOneClassSVM(nu=self.nu, random_state=self.random_state)
+        for _ in range(self.n_epochs):
+            self._update(X, rng.permutation(n))
+        return self
+
+    def partial_fit(self, X):
+        """One SGD pass over new rows"""
+        X = np.asarray(X)
+        if self.svm_ is None:
+            return self.fit(X)
+        self._update(X, np.arange(len(X)))
+        return self
+
+    def decision_function(self, X):
+        """Signed distance to the separating hyperplane; negative values are outliers"""
+        return self.svm_.decision_function(self.feature_map_.transform(X))
+
+    def score_samples(self, X):
+        """Raw scoring function; lower is more abnormal"""
+        return self.svm_.score_samples(self.feature_map_.transform(X))
+
+    def predict(self, X):
+        """-1 for outliers, 1 for inliers"""
+        return np.where(self.decision_function(X) < 0, -1, 1)
@@ -0,0 +1,167 @@
+"""
+Streaming Anomaly Detection
+Half-Space Trees that learn from traffic in constant memory
+"""
+
+import numpy as np
+
+
+class HalfSpaceTrees:
+    """Online anomaly detector built from random half-space trees
+
+    Each tree recursively halves a randomly perturbed work space of the
+    feature ranges seen at fit time. Every node counts the samples that pass
+    through it in two windows: the reference mass of the last full window,
+    used for scoring, and the latest mass being filled by partial_fit. When
+    window_size samples have arrived the latest profile becomes the
+    reference, so the model follows drifting traffic while memory stays
+    fixed at n_trees * 2 ** (depth + 1) nodes.
+
+    Scores follow the scikit-learn convention: score_samples is higher for
+    normal points, decision_function is negative for outliers.
+    """
+
+    def __init__(self, n_trees=25, depth=10, window_size=256, size_limit=None,
+                 contamination=0.1, random_state=42, chunk_size=8192):
+        self.n_trees = n_trees
+        self.depth = depth
+        self.window_size = window_size
+        self.size_limit = 0.1 * window_size if size_limit is None else size_limit
+        self.contamination = contamination
+        self.random_state = random_state
+        self.chunk_size = chunk_size
+
+        self.split_dim_ = None
+        self.split_value_ = None
+        self.reference_ = None
+        self.latest_ = None
+        self.threshold_ = 0.0
+        self.samples_seen_ = 0
+        self._window = None
+        self._window_count = 0
+
+    @property
+    def n_nodes(self):
+        return 2 ** (self.depth + 1) - 1
+
+    def _build(self, X):
+        """Draw the random work spaces and split every internal node at its midpoint"""
+        rng = np.random.default_rng(self.random_state)
+        n_features = X.shape[1]
+        low, high = X.min(axis=0), X.max(axis=0)
+        pivot = rng.uniform(low, high, size=(self.n_trees, n_features))
+        spread = 2 * np.maximum(pivot - low, high - pivot)
+        spread[spread == 0] = 1.0
+
+        n_internal = 2 ** self.depth - 1
+        self.split_dim_ = np.empty((self.n_trees, n_internal), dtype=np.intp)
+        self.split_value_ = np.empty((self.n_trees, n_internal))
+        node_low = (pivot - spread)[:, None, :]
+        node_high = (pivot + spread)[:, None, :]
+        trees = np.arange(self.n_trees)[:, None]
+        for level in range(self.depth):
+            first, count = 2 ** level - 1, 2 ** level
+            dims = rng.integers(0, n_features, size=(self.n_trees, count))
+            nodes = np.arange(count)[None, :]
+            mid = (node_low[trees, nodes, dims] + node_high[trees, nodes, dims]) / 2
+            self.split_dim_[:, first:first + count] = dims
+            self.split_value_[:, first:first + count] = mid
+
+            # Children in level order: left then right of each node
+            child_low = np.repeat(node_low, 2, axis=1)
+            child_high = np.repeat(node_high, 2, axis=1)
+            child_high[trees, 2 * nodes, dims] = mid
+            child_low[trees, 2 * nodes + 1, dims] = mid
+            node_low, node_high = child_low, child_high
+
+    def _paths(self, X):
+        """Node index at every level for each tree and sample: (depth + 1, n_trees, n)"""
+        n = len(X)
+        rows = np.arange(n)[None, :]
+        trees = np.arange(self.n_trees)[:, None]
+        node = np.zeros((self.n_trees, n), dtype=np.intp)
+        paths = np.empty((self.depth + 1, self.n_trees, n), dtype=np.intp)
+        paths[0] = node
+        for level in range(self.depth):
+            dims = self.split_dim_[trees, node]
+            right = X[rows, dims] > self.split_value_[trees, node]
+            node = 2 * node + 1 + right
+            paths[level + 1] = node
+        return paths
+
+    def _add_mass(self, mass, paths, weight=1.0):
+        offsets = (np.arange(self.n_trees) * self.n_nodes)[None, :, None]
+        counts = np.bincount((paths + offsets).ravel(), minlength=mass.size)
+        mass += weight * counts.reshape(mass.shape)
+
+    def _score(self, paths):
+        """Reference mass times 2^level at the first node below size_limit (or the leaf)"""
+        trees = np.arange(self.n_trees)[:, None]
+        score = np.zeros(paths.shape[2])
+        done = np.zeros(paths.shape[1:], dtype=bool)
+        for level in range(self.depth + 1):
+            mass = self.reference_[trees, paths[level]]
+            stop = ~done & ((mass < self.size_limit) | (level == self.depth))
+            score += np.where(stop, mass * 2.0 ** level, 0).sum(axis=0)
+            done |= stop
+        return score
+
+    def _chunks(self, X):
+        for start in range(0, len(X), self.chunk_size):
+            yield X[start:start + self.chunk_size]
+
+    def fit(self, X):
+        """Build the trees and take X as the first reference window"""
+        X = np.asarray(X, dtype=np.float64)
+        self._build(X)
+        self.reference_ = np.zeros((self.n_trees, self.n_nodes))
+        self.latest_ = np.zeros_like(self.reference_)
+        # Scale the profile to one window so scores do not depend on len(X)
+        weight = self.window_size / len(X)
+        for chunk in self._chunks(X):
+            self._add_mass(self.reference_, self._paths(chunk), weight)
+        self._window = np.empty((self.window_size, X.shape[1]))
+        self._window_count = 0
+        self.samples_seen_ = len(X)
+        self._set_threshold(X)
+        return self
+
+    def _set_threshold(self, X):
+        if len(X):
+            self.threshold_ = float(np.quantile(self.score_samples(X), self.contamination))
+
+    def partial_fit(self, X):
+        """Count a micro-batch into the latest window, rotating full windows in"""
+        X = np.asarray(X, dtype=np.float64)
+        if self.reference_ is None:
+            return self.fit(X)
+        start = 0
+        while start < len(X):
+            take = min(self.window_size - self._window_count, len(X) - start)
+            batch = X[start:start + take]
+            self._add_mass(self.latest_, self._paths(batch))
+            self._window[self._window_count:self._window_count + take] = batch
+            self._window_count += take
+            start += take
+            if self._window_count == self.window_size:
+                self.reference_, self.latest_ = self.latest_, self.reference_
+                self.latest_.fill(0)
+                self._window_count = 0
+                self._set_threshold(self._window)
+        self.samples_seen_ += len(X)
+        return self
+
+    def score_samples(self, X):
+        """Mass score of each sample; lower is more anomalous"""
+        X = np.asarray(X, dtype=np.float64)
+        if len(X) == 0:
+            return np.zeros(0)
+        return np.concatenate([self._score(self._paths(chunk)) for chunk in self._chunks(X)])
+
+    def decision_function(self, X):
+        """Score shifted by the contamination threshold; negative values are outliers"""
+        return self.score_samples(X) - self.threshold_
+
+    def predict(self, X):
+        """-1 for outliers, 1 for inliers"""
+        return np.where(self.decision_function(X) < 0, -1, 1)
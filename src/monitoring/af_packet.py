@@ -0,0 +1,71 @@
+"""
+Linux AF_PACKET Capture Backend
+Raw frame capture without Scapy dissection
+"""
+
+import socket
+import struct
+import time
+
+from .capture_filter import attach_bpf
+
+
+ETH_P_ALL = 0x0003
+AF_PACKET_AVAILABLE = hasattr(socket, 'AF_PACKET')
+
+SOL_PACKET = 263
+PACKET_FANOUT = 18
+PACKET_FANOUT_HASH = 0
+PACKET_FANOUT_FLAG_DEFRAG = 0x8000
+
+SO_TIMESTAMPNS = 35
+_TIMESPEC = struct.Struct('qq')
+TIMESTAMP_CMSG_SPACE = socket.CMSG_SPACE(_TIMESPEC.size) if hasattr(socket, 'CMSG_SPACE') else 0
+
+
+def open_packet_socket(interface, timeout=0.5, bpf_program=None):
+    """Open a raw AF_PACKET socket bound to an interface"""
+    if not AF_PACKET_AVAILABLE:
+        raise OSError("AF_PACKET sockets are only available on Linux")
+    # Protocol 0 receives nothing until bind, so no unfiltered frames queue up
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+    try:
+        if bpf_program:
+            attach_bpf(sock, bpf_program)
+        sock.bind((interface, ETH_P_ALL))  # CPython converts to network order
+        enable_timestamps(sock)
+        sock.settimeout(timeout)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def join_fanout(sock, group_id, mode=PACKET_FANOUT_HASH | PACKET_FANOUT_FLAG_DEFRAG):
+    """Join a PACKET_FANOUT group so the kernel spreads frames across its sockets
+
+    In hash mode the kernel picks the socket from a symmetric flow hash, so
+    both directions of a connection land on the same socket. The defrag
+    flag reassembles fragments first so they hash with their flow.
+    """
+    # Packed by hand: the defrag flag sets the top bit, past a C int
+    sock.setsockopt(SOL_PACKET, PACKET_FANOUT, struct.pack('I', (group_id & 0xFFFF) | (mode << 16)))
+
+
+def enable_timestamps(sock):
+    """Ask the kernel to attach a nanosecond receive timestamp to each datagram"""
+    sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+
+
+def receive_frame(sock, buf):
+    """Receive one datagram into buf; returns (length, epoch nanosecond timestamp)
+
+    The timestamp is the kernel's receive time when the socket has
+    timestamps enabled, otherwise the current time.
+    """
+    length, ancdata, _, _ = sock.recvmsg_into([buf], TIMESTAMP_CMSG_SPACE)
+    for level, kind, data in ancdata:
+        if level == socket.SOL_SOCKET and kind == SO_TIMESTAMPNS:
+            seconds, nanoseconds = _TIMESPEC.unpack_from(data)
+            return length, seconds * 1_000_000_000 + nanoseconds
+    return length, time.time_ns()
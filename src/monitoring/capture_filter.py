@@ -0,0 +1,319 @@
+"""
+Capture Filter Compiler
+Compiles pcap-style filter expressions to classic BPF for kernel-side
+filtering, and evaluates the same expressions on decoded packet records
+"""
+
+import ctypes
+import re
+import socket
+import struct
+
+import numpy as np
+
+from .packet_buffer import PROTO_TCP, PROTO_UDP, PROTO_ICMP, PROTO_NON_IP, ip_to_int
+
+
+SO_ATTACH_FILTER = 26
+SNAPLEN = 262144
+
+# Classic BPF opcodes
+BPF_LD_W_ABS = 0x20
+BPF_LD_H_ABS = 0x28
+BPF_LD_B_ABS = 0x30
+BPF_LD_H_IND = 0x48
+BPF_LDX_B_MSH = 0xB1
+BPF_ALU_AND_K = 0x54
+BPF_JEQ_K = 0x15
+BPF_JSET_K = 0x45
+BPF_RET_K = 0x06
+
+# Offsets in an untagged Ethernet frame
+_ETHERTYPE_OFFSET = 12
+_IP_PROTO_OFFSET = 23
+_IP_FRAG_OFFSET = 20
+_IP_SRC_OFFSET = 26
+_IP_DST_OFFSET = 30
+_IP_HEADER_OFFSET = 14
+
+_PROTOCOLS = {'tcp': (PROTO_TCP, 6), 'udp': (PROTO_UDP, 17), 'icmp': (PROTO_ICMP, 1)}
+_TOKEN_RE = re.compile(r'\s*(\(|\)|&&|\|\||!|[^\s()!]+)')
+
+
+class FilterSyntaxError(ValueError):
+    """Raised for filter expressions outside the supported syntax"""
+
+
+def _tokenize(expression):
+    tokens = []
+    pos = 0
+    expression = expression.strip()
+    while pos < len(expression):
+        match = _TOKEN_RE.match(expression, pos)
+        if not match:
+            raise FilterSyntaxError(f"Cannot parse filter near: {expression[pos:]!r}")
+        tokens.append(match.group(1).lower())
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive-descent parser for a subset of pcap-filter(7)
+
+    Supported primitives: ip, tcp, udp, icmp, [src|dst] host ADDR,
+    [src|dst] net ADDR/LEN, [tcp|udp] [src|dst] port N, combined with
+    and/or/not (&&, ||, !) and parentheses.
+    """
+
+    def __init__(self, expression):
+        self.tokens = _tokenize(expression)
+        self.pos = 0
+
+    def parse(self):
+        if not self.tokens:
+            raise FilterSyntaxError("Empty filter expression")
+        tree = self._expr()
+        if self.pos != len(self.tokens):
+            raise FilterSyntaxError(f"Unexpected token: {self.tokens[self.pos]!r}")
+        return tree
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _take(self):
+        token = self._peek()
+        if token is None:
+            raise FilterSyntaxError("Unexpected end of filter expression")
+        self.pos += 1
+        return token
+
+    def _expr(self):
+        node = self._term()
+        while self._peek() in ('or', '||'):
+            self._take()
+            node = ('or', node, self._term())
+        return node
+
+    def _term(self):
+        node = self._factor()
+        while self._peek() in ('and', '&&'):
+            self._take()
+            node = ('and', node, self._factor())
+        return node
+
+    def _factor(self):
+        token = self._peek()
+        if token in ('not', '!'):
+            self._take()
+            return ('not', self._factor())
+        if token == '(':
+            self._take()
+            node = self._expr()
+            if self._take() != ')':
+                raise FilterSyntaxError("Missing closing parenthesis")
+            return node
+        return self._primitive()
+
+    def _primitive(self):
+        token = self._take()
+        proto = None
+        if token in _PROTOCOLS:
+            if self._peek() not in ('port', 'src', 'dst'):
+                return ('proto', token)
+            proto = token
+            token = self._take()
+        elif token == 'ip':
+            return ('ip',)
+
+        direction = 'either'
+        if token in ('src', 'dst'):
+            direction = token
+            token = self._take()
+
+        if token == 'port':
+            return ('port', direction, self._port(self._take()), proto)
+        if proto is not None:
+            raise FilterSyntaxError(f"Expected 'port' after {proto!r}")
+        if token == 'host':
+            return ('net', direction, self._address(self._take()), 0xFFFFFFFF)
+        if token == 'net':
+            address, _, bits = self._take().partition('/')
+            bits = int(bits) if bits else 32
+            if not 0 <= bits <= 32:
+                raise FilterSyntaxError(f"Invalid prefix length: {bits}")
+            mask = (0xFFFFFFFF << (32 - bits)) & 0xFFFFFFFF
+            return ('net', direction, self._address(address) & mask, mask)
+        raise FilterSyntaxError(f"Unsupported filter primitive: {token!r}")
+
+    @staticmethod
+    def _port(token):
+        if not token.isdigit() or int(token) > 0xFFFF:
+            raise FilterSyntaxError(f"Invalid port: {token!r}")
+        return int(token)
+
+    @staticmethod
+    def _address(token):
+        try:
+            return ip_to_int(token)
+        except OSError:
+            raise FilterSyntaxError(f"Invalid IPv4 address: {token!r}")
+
+
+class _ProgramBuilder:
+    """Emits BPF instructions with symbolic forward jump labels"""
+
+    def __init__(self):
+        self.instructions = []
+        self.labels = {}
+        self._next_label = 0
+
+    def label(self):
+        self._next_label += 1
+        return self._next_label
+
+    def place(self, label):
+        self.labels[label] = len(self.instructions)
+
+    def emit(self, code, k=0, jt=None, jf=None):
+        self.instructions.append([code, jt, jf, k])
+
+    def assemble(self):
+        program = []
+        for index, (code, jt, jf, k) in enumerate(self.instructions):
+            offsets = []
+            for target in (jt, jf):
+                offset = 0 if target is None else self.labels[target] - index - 1
+                if not 0 <= offset <= 255:
+                    raise FilterSyntaxError("Filter expression too large for BPF jumps")
+                offsets.append(offset)
+            program.append((code, offsets[0], offsets[1], k & 0xFFFFFFFF))
+        return program
+
+
+def _gen(builder, node, true, false):
+    kind = node[0]
+    if kind == 'or':
+        rest = builder.label()
+        _gen(builder, node[1], true, rest)
+        builder.place(rest)
+        _gen(builder, node[2], true, false)
+    elif kind == 'and':
+        rest = builder.label()
+        _gen(builder, node[1], rest, false)
+        builder.place(rest)
+        _gen(builder, node[2], true, false)
+    elif kind == 'not':
+        _gen(builder, node[1], false, true)
+    elif kind == 'ip':
+        builder.emit(BPF_LD_H_ABS, _ETHERTYPE_OFFSET)
+        builder.emit(BPF_JEQ_K, 0x0800, true, false)
+    elif kind == 'proto':
+        builder.emit(BPF_LD_H_ABS, _ETHERTYPE_OFFSET)
+        builder.emit(BPF_JEQ_K, 0x0800, None, false)
+        builder.emit(BPF_LD_B_ABS, _IP_PROTO_OFFSET)
+        builder.emit(BPF_JEQ_K, _PROTOCOLS[node[1]][1], true, false)
+    elif kind == 'net':
+        _, direction, address, mask = node
+        builder.emit(BPF_LD_H_ABS, _ETHERTYPE_OFFSET)
+        builder.emit(BPF_JEQ_K, 0x0800, None, false)
+        offsets = {'src': [_IP_SRC_OFFSET], 'dst': [_IP_DST_OFFSET],
+                   'either': [_IP_SRC_OFFSET, _IP_DST_OFFSET]}[direction]
+        for i, offset in enumerate(offsets):
+            builder.emit(BPF_LD_W_ABS, offset)
+            if mask != 0xFFFFFFFF:
+                builder.emit(BPF_ALU_AND_K, mask)
+            builder.emit(BPF_JEQ_K, address, true, false if i == len(offsets) - 1 else None)
+    elif kind == 'port':
+        _, direction, port, proto = node
+        has_ports = builder.label()
+        builder.emit(BPF_LD_H_ABS, _ETHERTYPE_OFFSET)
+        builder.emit(BPF_JEQ_K, 0x0800, None, false)
+        builder.emit(BPF_LD_B_ABS, _IP_PROTO_OFFSET)
+        numbers = [_PROTOCOLS[proto][1]] if proto else [6, 17]
+        for i, number in enumerate(numbers):
+            builder.emit(BPF_JEQ_K, number, has_ports, false if i == len(numbers) - 1 else None)
+        builder.place(has_ports)
+        builder.emit(BPF_LD_H_ABS, _IP_FRAG_OFFSET)
+        builder.emit(BPF_JSET_K, 0x1FFF, false, None)
+        builder.emit(BPF_LDX_B_MSH, _IP_HEADER_OFFSET)
+        offsets = {'src': [14], 'dst': [16], 'either': [14, 16]}[direction]
+        for i, offset in enumerate(offsets):
+            builder.emit(BPF_LD_H_IND, offset)
+            builder.emit(BPF_JEQ_K, port, true, false if i == len(offsets) - 1 else None)
+    else:
+        raise FilterSyntaxError(f"Unknown filter node: {kind}")
+
+
+def _evaluate(node, records):
+    kind = node[0]
+    if kind == 'or':
+        return _evaluate(node[1], records) | _evaluate(node[2], records)
+    if kind == 'and':
+        return _evaluate(node[1], records) & _evaluate(node[2], records)
+    if kind == 'not':
+        return ~_evaluate(node[1], records)
+
+    protocol = records['protocol']
+    if kind == 'ip':
+        return protocol != PROTO_NON_IP
+    if kind == 'proto':
+        return protocol == _PROTOCOLS[node[1]][0]
+    if kind == 'net':
+        _, direction, address, mask = node
+        is_ip = protocol != PROTO_NON_IP
+        src = (records['src_ip'] & mask) == address
+        dst = (records['dst_ip'] & mask) == address
+        match = {'src': src, 'dst': dst, 'either': src | dst}[direction]
+        return is_ip & match
+    if kind == 'port':
+        _, direction, port, proto = node
+        if proto:
+            has_ports = protocol == _PROTOCOLS[proto][0]
+        else:
+            has_ports = (protocol == PROTO_TCP) | (protocol == PROTO_UDP)
+        src = records['src_port'] == port
+        dst = records['dst_port'] == port
+        match = {'src': src, 'dst': dst, 'either': src | dst}[direction]
+        return has_ports & match
+    raise FilterSyntaxError(f"Unknown filter node: {kind}")
+
+
+class CaptureFilter:
+    """A parsed capture filter usable in the kernel and on packet records"""
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.tree = _Parser(expression).parse()
+        self._program = None
+
+    def bpf_program(self):
+        """Classic BPF program for Ethernet frames as (code, jt, jf, k) tuples"""
+        if self._program is None:
+            builder = _ProgramBuilder()
+            accept, reject = builder.label(), builder.label()
+            _gen(builder, self.tree, accept, reject)
+            builder.place(accept)
+            builder.emit(BPF_RET_K, SNAPLEN)
+            builder.place(reject)
+            builder.emit(BPF_RET_K, 0)
+            self._program = builder.assemble()
+        return self._program
+
+    def match(self, records):
+        """Boolean mask of records accepted by the filter"""
+        return np.asarray(_evaluate(self.tree, records), dtype=bool)
+
+
+def attach_bpf(sock, program):
+    """Attach a classic BPF program to a socket (SO_ATTACH_FILTER)"""
+    instructions = b''.join(struct.pack('HBBI', *ins) for ins in program)
+    buf = ctypes.create_string_buffer(instructions, len(instructions))
+    fprog = struct.pack('HL', len(program), ctypes.addressof(buf))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+
+def compile_with_libpcap(expression, interface=None):
+    """Compile an expression with libpcap through Scapy, for syntax we don't handle"""
+    from scapy.arch.common import compile_filter
+    bpf = compile_filter(expression, iface=interface)
+    return [(ins.code, ins.jt, ins.jf, ins.k) for ins in bpf.bf_insns[:bpf.bf_len]]
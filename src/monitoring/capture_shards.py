@@ -0,0 +1,186 @@
+"""
+Sharded Packet Capture
+Spreads AF_PACKET capture across worker processes with PACKET_FANOUT
+"""
+
+import os
+import socket
+import time
+import multiprocessing as mp
+
+import numpy as np
+
+from .packet_buffer import SharedPacketRing, PACKET_DTYPE, PROTO_NON_IP
+from .packet_decoder import decode_frame
+from .af_packet import open_packet_socket, join_fanout, receive_frame
+from .pcap_ring import PcapRingWriter
+
+
+def _discard_pending(sock):
+    """Drop frames queued before the socket joined its fanout group"""
+    timeout = sock.gettimeout()
+    sock.setblocking(False)
+    try:
+        while True:
+            sock.recv(65535)
+    except (BlockingIOError, InterruptedError):
+        pass
+    finally:
+        sock.settimeout(timeout)
+
+
+def _run_shard(interface, group_id, ring_name, ring_size, bpf_program, ready, stop,
+               pcap_ring=None, batch_size=1024, flush_interval=0.05):
+    """Capture loop of one shard process: receive, decode, publish in batches"""
+    ring = SharedPacketRing(ring_size, name=ring_name)
+    writer = None
+    try:
+        if pcap_ring:
+            directory, segment_size, max_bytes = pcap_ring
+            writer = PcapRingWriter(directory, segment_size=segment_size, max_bytes=max_bytes)
+            writer.start()
+        with open_packet_socket(interface, timeout=flush_interval,
+                                bpf_program=bpf_program) as sock:
+            join_fanout(sock, group_id)
+            # Until the join every socket saw every frame; start clean
+            _discard_pending(sock)
+            ready.set()
+
+            buf = bytearray(65535)
+            view = memoryview(buf)
+            batch = np.zeros(batch_size, dtype=PACKET_DTYPE)
+            n = 0
+            deadline = 0.0
+            while not stop.is_set():
+                try:
+                    length, timestamp = receive_frame(sock, buf)
+                except socket.timeout:
+                    length = 0
+                if length:
+                    record = (timestamp, *decode_frame(view, length), min(length, 0xFFFF))
+                    batch[n] = record
+                    n += 1
+                    if writer is not None:
+                        writer.write(timestamp, bytes(view[:length]), record[1], record[2])
+                    if n == 1:
+                        deadline = time.monotonic() + flush_interval
+                if n and (n == batch_size or time.monotonic() >= deadline):
+                    ring.extend(batch[:n])
+                    n = 0
+            ring.extend(batch[:n])
+    except Exception as e:
+        print(f"Capture shard error: {e}")
+    finally:
+        if writer is not None:
+            writer.close()
+        ring.close()
+
+
+class ShardedCapture:
+    """Runs one capture process per shard and merges their output
+
+    Each shard owns an AF_PACKET socket in a shared fanout group, decodes its
+    share of the traffic and publishes records to its own shared-memory ring.
+    The parent only copies finished batches out of the rings, so decoding
+    scales with the number of shards instead of being bound to one GIL.
+    """
+
+    def __init__(self, interface, shards=4, ring_size=65536, bpf_program=None, pcap_ring=None):
+        self.interface = interface
+        self.shards = int(shards)
+        self.ring_size = int(ring_size)
+        self.bpf_program = bpf_program
+        self.pcap_ring = pcap_ring  # (directory, segment_size, max_bytes per shard) or None
+        self.rings = []
+        self.processes = []
+        self.lost = 0
+        self.depth = 0.0    # Fullest shard ring at the last drain, as a fraction
+        self._positions = []
+        self._counts = []
+        self._stop = None
+
+    def start(self, timeout=5.0):
+        """Start the shard processes; returns once every shard has joined the group"""
+        # Spawn rather than fork: the dashboard process is multi-threaded
+        ctx = mp.get_context('spawn')
+        group_id = os.getpid() & 0xFFFF
+        self._stop = ctx.Event()
+        ready = []
+        for shard in range(self.shards):
+            ring = SharedPacketRing(self.ring_size)
+            event = ctx.Event()
+            pcap_ring = None
+            if self.pcap_ring:
+                directory, segment_size, max_bytes = self.pcap_ring
+                pcap_ring = (os.path.join(directory, f"shard-{shard}"), segment_size, max_bytes)
+            process = ctx.Process(
+                target=_run_shard,
+                args=(self.interface, group_id, ring.name, self.ring_size,
+                      self.bpf_program, event, self._stop, pcap_ring),
+                daemon=True
+            )
+            process.start()
+            self.rings.append(ring)
+            self.processes.append(process)
+            self._positions.append(0)
+            self._counts.append(np.zeros(PROTO_NON_IP + 1, dtype=np.int64))
+            ready.append(event)
+
+        deadline = time.monotonic() + timeout
+        for event, process in zip(ready, self.processes):
+            while not event.wait(0.05):
+                if not process.is_alive() or time.monotonic() > deadline:
+                    self.stop()
+                    self.close()
+                    raise RuntimeError("Capture shards failed to start")
+
+    def drain(self):
+        """Collect records published since the last call
+
+        Returns (records, protocol_counts): records from all shards ordered by
+        timestamp, and per-protocol packet counts including any records the
+        parent was too slow to copy.
+        """
+        batches = []
+        counts = np.zeros(PROTO_NON_IP + 1, dtype=np.int64)
+        depth = 0.0
+        for i, ring in enumerate(self.rings):
+            depth = max(depth, (ring.total_appended - self._positions[i]) / ring.capacity)
+            records, self._positions[i], lost = ring.read_since(self._positions[i])
+            self.lost += lost
+            batches.append(records)
+            totals = ring.protocol_counts()
+            counts += totals - self._counts[i]
+            self._counts[i] = totals
+        self.depth = min(depth, 1.0)
+        if not batches:
+            return np.zeros(0, dtype=PACKET_DTYPE), counts
+        records = np.concatenate(batches)
+        return records[np.argsort(records['timestamp'], kind='stable')], counts
+
+    def shard_packets(self):
+        """Packets captured by each shard"""
+        return [ring.total_appended for ring in self.rings]
+
+    def is_alive(self):
+        """Whether any shard process is still capturing"""
+        return any(process.is_alive() for process in self.processes)
+
+    def stop(self, timeout=2.0):
+        """Signal the shard processes to stop and wait for them"""
+        if self._stop is not None:
+            self._stop.set()
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+    def close(self):
+        """Release the shared memory rings"""
+        for ring in self.rings:
+            ring.close()
+            ring.unlink()
+        self.rings = []
+        self.processes = []
+        self._positions = []
+        self._counts = []
@@ -0,0 +1,195 @@
+"""
+Flow Aggregation
+Groups captured packets into bidirectional 5-tuple flows (NetFlow-style)
+"""
+
+import numpy as np
+
+from .packet_buffer import PACKET_DTYPE, records_to_dataframe
+
+
+FLOW_DTYPE = np.dtype(PACKET_DTYPE.descr + [
+    ('end_time', np.int64),       # Epoch nanoseconds
+    ('packets', np.uint32),
+    ('bytes', np.uint64),
+    ('iat_mean', np.float32),     # Inter-arrival times in seconds
+    ('iat_std', np.float32),
+    ('iat_min', np.float32),
+    ('iat_max', np.float32),
+])
+
+# Per-flow state columns: integer fields first, then float IAT accumulators
+_FIRST, _LAST, _PACKETS, _BYTES, _FLAGS, _SRC_IP, _DST_IP, _SRC_PORT, _DST_PORT, _PROTOCOL = range(10)
+_IAT_SUM, _IAT_SQ, _IAT_MIN, _IAT_MAX = range(10, 14)
+_INT_FIELDS = 10
+
+
+def _flow_keys(records):
+    """Direction-independent 5-tuple keys packed into two uint64 arrays"""
+    src = (records['src_ip'].astype(np.uint64) << np.uint64(16)) | records['src_port']
+    dst = (records['dst_ip'].astype(np.uint64) << np.uint64(16)) | records['dst_port']
+    low = np.minimum(src, dst)
+    high = np.maximum(src, dst)
+    # 48-bit endpoints: keep the upper 16 bits of the high endpoint with the protocol
+    key_a = (low << np.uint64(16)) | (high >> np.uint64(32))
+    key_b = ((high & np.uint64(0xFFFFFFFF)) << np.uint64(8)) | records['protocol']
+    return key_a, key_b
+
+
+class FlowTable:
+    """Aggregates packet batches into flows with active and idle timeouts
+
+    Packets are segmented per flow in bulk: a batch is sorted by flow key and
+    time, split wherever the key changes or the gap exceeds idle_timeout, and
+    reduced with NumPy. Only the per-segment merge into open flows runs in
+    Python. Timeouts are measured in packet time; idle and active expiry of
+    open flows is checked at the end of each batch.
+    """
+
+    def __init__(self, active_timeout=120.0, idle_timeout=15.0):
+        self.active_timeout = active_timeout
+        self.idle_timeout = idle_timeout
+        self._active_ns = int(active_timeout * 1e9)
+        self._idle_ns = int(idle_timeout * 1e9)
+        self.active = {}
+        self.packets_seen = 0
+        self.flows_exported = 0
+
+    def __len__(self):
+        return len(self.active)
+
+    def update(self, records):
+        """Add a batch of packet records; returns flows that expired as FLOW_DTYPE"""
+        exported = []
+        if len(records):
+            self.packets_seen += len(records)
+            self._merge_segments(records, exported)
+            now = int(records['timestamp'].max())
+            self._expire(now, exported)
+        return self._to_array(exported)
+
+    def flush(self):
+        """Export all open flows"""
+        exported = list(self.active.values())
+        self.active.clear()
+        return self._to_array(exported)
+
+    def snapshot(self):
+        """Open flows as FLOW_DTYPE without expiring them"""
+        return self._to_array(list(self.active.values()), count=False)
+
+    def _merge_segments(self, records, exported):
+        key_a, key_b = _flow_keys(records)
+        ts = records['timestamp']
+        order = np.lexsort((ts, key_b, key_a))
+        key_a, key_b, ts = key_a[order], key_b[order], ts[order]
+        sorted_records = records[order]
+
+        gaps = np.diff(ts)
+        new_segment = np.ones(len(ts), dtype=bool)
+        new_segment[1:] = (key_a[1:] != key_a[:-1]) | (key_b[1:] != key_b[:-1]) | (gaps > self._idle_ns)
+        starts = np.flatnonzero(new_segment)
+        ends = np.append(starts[1:], len(ts)) - 1
+
+        # Inter-arrival times within each segment (first packet contributes nothing)
+        iat = np.zeros(len(ts))
+        iat[1:] = gaps / 1e9
+        iat[starts] = 0.0
+        iat_min = iat.copy()
+        iat_min[starts] = np.inf
+        iat_max = iat.copy()
+        iat_max[starts] = -np.inf
+
+        packets = np.diff(np.append(starts, len(ts)))
+        seg_bytes = np.add.reduceat(sorted_records['length'].astype(np.uint64), starts)
+        seg_flags = np.bitwise_or.reduceat(sorted_records['flags'], starts)
+        seg_iat_sum = np.add.reduceat(iat, starts)
+        seg_iat_sq = np.add.reduceat(iat * iat, starts)
+        seg_iat_min = np.minimum.reduceat(iat_min, starts)
+        seg_iat_max = np.maximum.reduceat(iat_max, starts)
+        firsts = sorted_records[starts]
+
+        rows = zip(key_a[starts].tolist(), key_b[starts].tolist(), ts[starts].tolist(),
+                   ts[ends].tolist(), packets.tolist(), seg_bytes.tolist(), seg_flags.tolist(),
+                   firsts['src_ip'].tolist(), firsts['dst_ip'].tolist(),
+                   firsts['src_port'].tolist(), firsts['dst_port'].tolist(),
+                   firsts['protocol'].tolist(), seg_iat_sum.tolist(), seg_iat_sq.tolist(),
+                   seg_iat_min.tolist(), seg_iat_max.tolist())
+        active = self.active
+        for (a, b, first, last, count, nbytes, flags, src_ip, dst_ip, src_port, dst_port,
+             protocol, iat_sum, iat_sq, iat_lo, iat_hi) in rows:
+            key = (a, b)
+            flow = active.get(key)
+            if flow is not None:
+                gap_ns = first - flow[_LAST]
+                if gap_ns <= self._idle_ns and last - flow[_FIRST] < self._active_ns:
+                    gap = gap_ns / 1e9
+                    flow[_LAST] = max(flow[_LAST], last)
+                    flow[_PACKETS] += count
+                    flow[_BYTES] += nbytes
+                    flow[_FLAGS] |= flags
+                    flow[_IAT_SUM] += iat_sum + gap
+                    flow[_IAT_SQ] += iat_sq + gap * gap
+                    flow[_IAT_MIN] = min(flow[_IAT_MIN], iat_lo, gap)
+                    flow[_IAT_MAX] = max(flow[_IAT_MAX], iat_hi, gap)
+                    continue
+                exported.append(flow)
+            active[key] = [first, last, count, nbytes, flags, src_ip, dst_ip, src_port, dst_port,
+                           protocol, iat_sum, iat_sq, iat_lo, iat_hi]
+
+    def _expire(self, now, exported):
+        expired = [
+            key for key, flow in self.active.items()
+            if now - flow[_LAST] > self._idle_ns or flow[_LAST] - flow[_FIRST] >= self._active_ns
+        ]
+        for key in expired:
+            exported.append(self.active.pop(key))
+
+    def _to_array(self, flows, count=True):
+        out = np.zeros(len(flows), dtype=FLOW_DTYPE)
+        if not flows:
+            return out
+        # Separate arrays so nanosecond timestamps don't pass through float64
+        columns = np.array([flow[:_INT_FIELDS] for flow in flows], dtype=np.int64).T
+        iats = np.array([flow[_INT_FIELDS:] for flow in flows], dtype=np.float64).T
+        out['timestamp'] = columns[_FIRST]
+        out['end_time'] = columns[_LAST]
+        out['packets'] = columns[_PACKETS]
+        out['bytes'] = columns[_BYTES]
+        out['flags'] = columns[_FLAGS]
+        out['src_ip'] = columns[_SRC_IP]
+        out['dst_ip'] = columns[_DST_IP]
+        out['src_port'] = columns[_SRC_PORT]
+        out['dst_port'] = columns[_DST_PORT]
+        out['protocol'] = columns[_PROTOCOL]
+        # Mean packet size stands in for the per-packet length feature
+        out['length'] = np.minimum(out['bytes'] // out['packets'], 0xFFFF)
+
+        gaps = np.maximum(out['packets'].astype(np.float64) - 1, 1)
+        iat_mean = iats[_IAT_SUM - _INT_FIELDS] / gaps
+        iat_var = np.maximum(iats[_IAT_SQ - _INT_FIELDS] / gaps - iat_mean ** 2, 0.0)
+        single = out['packets'] < 2
+        out['iat_mean'] = np.where(single, 0.0, iat_mean)
+        out['iat_std'] = np.where(single, 0.0, np.sqrt(iat_var))
+        out['iat_min'] = np.where(single, 0.0, iats[_IAT_MIN - _INT_FIELDS])
+        out['iat_max'] = np.where(single, 0.0, iats[_IAT_MAX - _INT_FIELDS])
+        if count:
+            self.flows_exported += len(flows)
+        return out
+
+
+def flows_to_dataframe(flows):
+    """Convert FLOW_DTYPE records to a DataFrame compatible with packet consumers"""
+    df = records_to_dataframe(flows[list(PACKET_DTYPE.names)])
+    if len(flows) == 0:
+        for column in ('end_time', 'packets', 'bytes', 'duration', 'iat_mean', 'iat_std',
+                       'iat_min', 'iat_max'):
+            df[column] = []
+        return df
+    df['end_time'] = flows['end_time']
+    df['packets'] = flows['packets']
+    df['bytes'] = flows['bytes']
+    df['duration'] = (flows['end_time'] - flows['timestamp']) / 1e9
+    for column in ('iat_mean', 'iat_std', 'iat_min', 'iat_max'):
+        df[column] = flows[column]
+    return df
@@ -0,0 +1,207 @@
+"""
+Capture Overload Protection
+Adaptive sampling that sheds packets when capture falls behind
+"""
+
+import random
+
+import numpy as np
+
+
+OVERLOAD_MODES = ('systematic', 'flow_hash', 'reservoir')
+
+_MASK = (1 << 64) - 1
+_MULT_LOW = 0x9E3779B97F4A7C15
+_MULT_HIGH = 0xC2B2AE3D27D4EB4F
+_MIX_1 = 0xBF58476D1CE4E5B9
+_MIX_2 = 0x94D049BB133111EB
+
+
+def flow_hash(src_ip, dst_ip, src_port, dst_port, protocol):
+    """Direction-independent 64-bit hash of a 5-tuple (Python ints)"""
+    a = (src_ip << 16) | src_port
+    b = (dst_ip << 16) | dst_port
+    low, high = (a, b) if a < b else (b, a)
+    x = (low * _MULT_LOW + high * _MULT_HIGH + protocol) & _MASK
+    x = ((x ^ (x >> 30)) * _MIX_1) & _MASK
+    x = ((x ^ (x >> 27)) * _MIX_2) & _MASK
+    return x ^ (x >> 31)
+
+
+def flow_hashes(records):
+    """flow_hash for every record of a structured packet array"""
+    a = (records['src_ip'].astype(np.uint64) << np.uint64(16)) | records['src_port']
+    b = (records['dst_ip'].astype(np.uint64) << np.uint64(16)) | records['dst_port']
+    x = (np.minimum(a, b) * np.uint64(_MULT_LOW) + np.maximum(a, b) * np.uint64(_MULT_HIGH)
+         + records['protocol'])
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(_MIX_1)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(_MIX_2)
+    return x ^ (x >> np.uint64(31))
+
+
+class LoadShedder:
+    """Samples packets while capture is overloaded
+
+    Modes:
+        systematic: keep every rate-th packet
+        flow_hash: keep whole flows whose 5-tuple hash falls in 1/rate of the space
+        reservoir: keep a uniform sample of reservoir_size packets per interval
+
+    Shedding switches on when the smoothed capture lag (receive timestamp to
+    processing) or the reader queue depth crosses its high watermark, and off
+    again once both fall below the low watermarks. Each kept packet carries
+    the weight it stands for, so counters can be re-scaled to estimates.
+    Per-packet capture calls admit() before decoding, so systematic mode
+    also sheds the decoding work.
+    """
+
+    def __init__(self, mode='systematic', rate=10, reservoir_size=1000, interval=1.0,
+                 lag_high=0.5, lag_low=0.1, depth_high=0.8, depth_low=0.3, smoothing=0.05,
+                 seed=None):
+        if mode not in OVERLOAD_MODES:
+            raise ValueError(f"Unknown overload mode: {mode}")
+        self.mode = mode
+        self.rate = max(int(rate), 1)
+        self.reservoir_size = max(int(reservoir_size), 1)
+        self.interval_ns = int(interval * 1e9)
+        self.lag_high = lag_high
+        self.lag_low = lag_low
+        self.depth_high = depth_high
+        self.depth_low = depth_low
+        self.smoothing = smoothing
+
+        self.active = False
+        self.activations = 0
+        self.lag = 0.0
+        self.depth = 0.0
+        self.seen = 0       # Packets offered while shedding
+        self.kept = 0
+
+        self._counter = 0
+        self._random = random.Random(seed)
+        self._rng = np.random.default_rng(seed)
+        self._reservoir = []
+        self._window = None
+        self._window_seen = 0
+
+    @property
+    def pending(self):
+        """Whether reservoir samples are waiting for their interval to close"""
+        return bool(self._reservoir)
+
+    def observe_lag(self, seconds):
+        """Feed one capture lag measurement"""
+        self.lag += self.smoothing * (seconds - self.lag)
+        self._update_state()
+
+    def observe_depth(self, fraction):
+        """Feed the reader queue fill level (0..1)"""
+        self.depth = fraction
+        self._update_state()
+
+    def _update_state(self):
+        if not self.active:
+            if self.lag > self.lag_high or self.depth > self.depth_high:
+                self.active = True
+                self.activations += 1
+        elif self.lag < self.lag_low and self.depth < self.depth_low:
+            self.active = False
+
+    def admit(self):
+        """Whether the next packet needs decoding at all
+
+        In systematic mode the verdict depends only on arrival order, so a
+        shed packet is counted here and the caller can skip decoding it;
+        packets admitted while shedding then go through offer(). The other
+        modes need the decoded record and always admit.
+        """
+        if not self.active or self.mode != 'systematic' or (self._counter + 1) % self.rate == 0:
+            return True
+        self._counter += 1
+        self.seen += 1
+        return False
+
+    def offer(self, record):
+        """Offer one record tuple (timestamp first); returns [(record, weight), ...] to keep"""
+        if not self.active:
+            return self.flush() + [(record, 1.0)]
+        self.seen += 1
+
+        if self.mode == 'systematic':
+            self._counter += 1
+            if self._counter % self.rate:
+                return []
+            self.kept += 1
+            return [(record, float(self.rate))]
+
+        if self.mode == 'flow_hash':
+            if (flow_hash(*record[1:6]) >> 32) % self.rate:
+                return []
+            self.kept += 1
+            return [(record, float(self.rate))]
+
+        window = record[0] // self.interval_ns
+        emitted = self.flush() if window != self._window else []
+        self._window = window
+        self._window_seen += 1
+        if len(self._reservoir) < self.reservoir_size:
+            self._reservoir.append(record)
+        else:
+            slot = self._random.randrange(self._window_seen)
+            if slot < self.reservoir_size:
+                self._reservoir[slot] = record
+        return emitted
+
+    def flush(self):
+        """Release the current reservoir with its weights"""
+        if not self._reservoir:
+            return []
+        weight = self._window_seen / len(self._reservoir)
+        emitted = [(record, weight) for record in self._reservoir]
+        self.kept += len(emitted)
+        self._reservoir = []
+        self._window_seen = 0
+        return emitted
+
+    def sample(self, records):
+        """Sample a structured packet array; returns (kept records, weights)"""
+        n = len(records)
+        if not self.active or n == 0:
+            return records, np.ones(n)
+        self.seen += n
+
+        if self.mode == 'systematic':
+            keep = (self._counter + 1 + np.arange(n)) % self.rate == 0
+            self._counter += n
+            weights = np.full(int(keep.sum()), float(self.rate))
+        elif self.mode == 'flow_hash':
+            keep = (flow_hashes(records) >> np.uint64(32)) % np.uint64(self.rate) == 0
+            weights = np.full(int(keep.sum()), float(self.rate))
+        else:
+            # Uniform sample per interval: rank packets by a random key within their window
+            windows = records['timestamp'] // self.interval_ns
+            order = np.lexsort((self._rng.random(n), windows))
+            sorted_windows = windows[order]
+            starts = np.flatnonzero(np.r_[True, sorted_windows[1:] != sorted_windows[:-1]])
+            sizes = np.diff(np.r_[starts, n])
+            rank = np.arange(n) - np.repeat(starts, sizes)
+            keep = np.zeros(n, dtype=bool)
+            keep[order[rank < self.reservoir_size]] = True
+            window_weight = sizes / np.minimum(sizes, self.reservoir_size)
+            weight_of = np.empty(n)
+            weight_of[order] = np.repeat(window_weight, sizes)
+            weights = weight_of[keep]
+
+        self.kept += len(weights)
+        return records[keep], weights
+
+    def stats(self):
+        """Shedding state and counters"""
+        return {
+            'overload_mode': self.mode,
+            'overload_active': self.active,
+            'overload_activations': self.activations,
+            'capture_lag': round(self.lag, 4),
+            'sampled_packets': self.kept,
+            'shed_packets': self.seen - self.kept - len(self._reservoir)
+        }
@@ -0,0 +1,254 @@
+"""
+Columnar Packet Ring Buffer
+Preallocated NumPy storage for captured packet summaries
+"""
+
+import socket
+import struct
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+
+# Protocol codes (match AnomalyDetector's protocol encoding)
+PROTO_TCP = 0
+PROTO_UDP = 1
+PROTO_ICMP = 2
+PROTO_OTHER = 3
+PROTO_NON_IP = 4  # Rendered as 'OTHER' without addresses
+
+PROTOCOL_NAMES = ['TCP', 'UDP', 'ICMP', 'OTHER']
+PROTOCOL_CODES = {name: code for code, name in enumerate(PROTOCOL_NAMES)}
+
+# TCP flag bits in header order, rendered the same way as Scapy's str(flags)
+TCP_FLAG_LETTERS = 'FSRPAUEC'
+TCP_FLAG_STRINGS = [
+    ''.join(letter for bit, letter in enumerate(TCP_FLAG_LETTERS) if value >> bit & 1)
+    for value in range(256)
+]
+TCP_FLAG_BITS = {letter: 1 << bit for bit, letter in enumerate(TCP_FLAG_LETTERS)}
+
+PACKET_DTYPE = np.dtype([
+    ('timestamp', np.int64),     # Epoch nanoseconds, from the capture source
+    ('src_ip', np.uint32),
+    ('dst_ip', np.uint32),
+    ('src_port', np.uint16),
+    ('dst_port', np.uint16),
+    ('protocol', np.uint8),
+    ('flags', np.uint8),         # TCP flag bits
+    ('length', np.uint16),
+])
+
+PACKET_COLUMNS = ['timestamp', 'src_ip', 'dst_ip', 'src_port', 'dst_port',
+                  'protocol', 'length', 'flags']
+
+_FLAG_CATEGORIES = pd.Index(TCP_FLAG_STRINGS, dtype=object)
+
+
+def ip_to_int(ip):
+    """Convert dotted IPv4 string to integer"""
+    return struct.unpack('!I', socket.inet_aton(ip))[0]
+
+
+def int_to_ip(value):
+    """Convert integer to dotted IPv4 string"""
+    return socket.inet_ntoa(struct.pack('!I', int(value)))
+
+
+def encode_tcp_flags(flags):
+    """Convert a flag string such as 'PA' to its bit value"""
+    value = 0
+    for letter in flags or '':
+        value |= TCP_FLAG_BITS.get(letter, 0)
+    return value
+
+
+def _ip_column(values, valid):
+    """Build categorical IP column, formatting each distinct address once"""
+    codes, uniques = pd.factorize(values, sort=False)
+    categories = [int_to_ip(v) for v in uniques]
+    codes = np.where(valid, codes, -1)
+    return pd.Categorical.from_codes(codes, categories=pd.Index(categories, dtype=object))
+
+
+def records_to_dataframe(records):
+    """Convert a structured packet array to the capture DataFrame layout"""
+    if len(records) == 0:
+        return pd.DataFrame(columns=PACKET_COLUMNS)
+
+    protocol = records['protocol']
+    is_ip = protocol != PROTO_NON_IP
+    has_ports = protocol <= PROTO_UDP
+
+    # Timestamps stay int64 epoch nanoseconds; convert to datetimes for display only
+    return pd.DataFrame({
+        'timestamp': records['timestamp'],
+        'src_ip': _ip_column(records['src_ip'], is_ip),
+        'dst_ip': _ip_column(records['dst_ip'], is_ip),
+        'src_port': pd.arrays.IntegerArray(records['src_port'].copy(), ~has_ports),
+        'dst_port': pd.arrays.IntegerArray(records['dst_port'].copy(), ~has_ports),
+        'protocol': pd.Categorical.from_codes(
+            np.minimum(protocol, PROTO_OTHER), categories=PROTOCOL_NAMES
+        ),
+        'length': records['length'],
+        'flags': pd.Categorical.from_codes(
+            np.where(protocol == PROTO_TCP, records['flags'].astype(np.int16), -1),
+            categories=_FLAG_CATEGORIES
+        ),
+    })
+
+
+class PacketRingBuffer:
+    """Fixed-capacity ring buffer of packet records stored in a structured array"""
+
+    def __init__(self, capacity=10000, dtype=PACKET_DTYPE):
+        self.capacity = int(capacity)
+        self._data = np.zeros(self.capacity, dtype=dtype)
+        self._head = 0      # Next write position
+        self._size = 0
+        self.total_appended = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def append(self, timestamp, src_ip, dst_ip, src_port, dst_port, protocol, flags, length):
+        """Append a single packet record"""
+        with self._lock:
+            self._data[self._head] = (timestamp, src_ip, dst_ip, src_port, dst_port,
+                                      protocol, flags, length)
+            self._head = (self._head + 1) % self.capacity
+            if self._size < self.capacity:
+                self._size += 1
+            self.total_appended += 1
+
+    def extend(self, records):
+        """Append a structured array of packet records"""
+        n = len(records)
+        if n == 0:
+            return
+        with self._lock:
+            if n >= self.capacity:
+                self._data[:] = records[-self.capacity:]
+                self._head = 0
+                self._size = self.capacity
+            else:
+                end = self._head + n
+                if end <= self.capacity:
+                    self._data[self._head:end] = records
+                else:
+                    split = self.capacity - self._head
+                    self._data[self._head:] = records[:split]
+                    self._data[:n - split] = records[split:]
+                self._head = end % self.capacity
+                self._size = min(self._size + n, self.capacity)
+            self.total_appended += n
+
+    def snapshot(self, limit=None):
+        """Copy the newest records (oldest first) into a new structured array"""
+        with self._lock:
+            count = self._size if not limit else min(limit, self._size)
+            start = self._head - count
+            if start >= 0:
+                return self._data[start:self._head].copy()
+            return np.concatenate((self._data[start:], self._data[:self._head]))
+
+    def read_since(self, position):
+        """Copy records appended after a total_appended position
+
+        Returns (records, new_position, lost) where lost counts records
+        overwritten before they could be read.
+        """
+        with self._lock:
+            pending = self.total_appended - position
+            count = min(pending, self._size)
+            start = self._head - count
+            if start >= 0:
+                records = self._data[start:self._head].copy()
+            else:
+                records = np.concatenate((self._data[start:], self._data[:self._head]))
+            return records, self.total_appended, pending - count
+
+    def to_dataframe(self, limit=None):
+        """Get the newest records as a DataFrame"""
+        return records_to_dataframe(self.snapshot(limit))
+
+    def clear(self):
+        """Drop all records"""
+        with self._lock:
+            self._head = 0
+            self._size = 0
+
+
+class SharedPacketRing:
+    """Single-writer packet ring in shared memory, read from another process
+
+    The writer publishes records by bumping a counter after copying them in,
+    so readers need no lock: anything the writer overwrote while a read was
+    in progress is detected from the counter and reported as lost. The
+    header also keeps per-protocol packet counts, which stay exact even when
+    the reader falls behind.
+    """
+
+    _HEADER = 8  # int64 slots: total appended, then counts per protocol code
+
+    def __init__(self, capacity=65536, name=None):
+        self.capacity = int(capacity)
+        offset = self._HEADER * 8
+        if name is None:
+            self.shm = shared_memory.SharedMemory(
+                create=True, size=offset + self.capacity * PACKET_DTYPE.itemsize)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self._header = np.ndarray(self._HEADER, dtype=np.int64, buffer=self.shm.buf)
+        self._data = np.ndarray(self.capacity, dtype=PACKET_DTYPE, buffer=self.shm.buf,
+                                offset=offset)
+        if name is None:
+            self._header[:] = 0
+
+    @property
+    def total_appended(self):
+        return int(self._header[0])
+
+    def protocol_counts(self):
+        """Packets written per protocol code, including ones since overwritten"""
+        return self._header[1:PROTO_NON_IP + 2].copy()
+
+    def extend(self, records):
+        """Append a structured array of packet records (writer side only)"""
+        n = len(records)
+        if n == 0:
+            return
+        total = self.total_appended
+        kept = records[-self.capacity:]
+        positions = np.arange(total + n - len(kept), total + n) % self.capacity
+        self._data[positions] = kept
+        self._header[1:PROTO_NON_IP + 2] += np.bincount(records['protocol'],
+                                                         minlength=PROTO_NON_IP + 1)
+        self._header[0] = total + n
+
+    def read_since(self, position):
+        """Copy records appended after a total_appended position
+
+        Returns (records, new_position, lost) like PacketRingBuffer.read_since.
+        """
+        total = self.total_appended
+        pending = total - position
+        start = total - min(pending, self.capacity)
+        records = self._data[np.arange(start, total) % self.capacity]
+        # Slots the writer reused during the copy hold newer records; drop them
+        torn = min(max(self.total_appended - self.capacity - start, 0), len(records))
+        records = records[torn:]
+        return records, total, pending - len(records)
+
+    def close(self):
+        """Detach from the shared memory block"""
+        self._header = self._data = None
+        self.shm.close()
+
+    def unlink(self):
+        """Release the shared memory block (owner side)"""
+        self.shm.unlink()
@@ -0,0 +1,167 @@
+"""
+Packet Header Decoder
+Decodes Ethernet/IPv4/TCP/UDP/ICMP headers into packet records
+"""
+
+import struct
+
+import numpy as np
+
+from .packet_buffer import (
+    PACKET_DTYPE, PROTO_TCP, PROTO_UDP, PROTO_ICMP, PROTO_OTHER, PROTO_NON_IP
+)
+
+
+# Link-layer header types (pcap LINKTYPE_* values)
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+VLAN_ETHERTYPES = (0x8100, 0x88A8)
+
+IPPROTO_ICMP = 1
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+
+
+class _FrameView:
+    """Bounds-checked gathers from a byte buffer at per-frame offsets"""
+
+    def __init__(self, data, offsets, caplens):
+        self.data = data
+        self.start = offsets
+        self.end = offsets + caplens
+        self.last = len(data) - 1
+
+    def u8(self, pos):
+        valid = pos < self.end
+        values = self.data[np.minimum(pos, self.last)].astype(np.uint32)
+        values[~valid] = 0
+        return values
+
+    def u16(self, pos):
+        return (self.u8(pos) << 8) | self.u8(pos + 1)
+
+    def u32(self, pos):
+        return (self.u16(pos) << 16) | self.u16(pos + 2)
+
+
+def decode_frames(data, offsets, caplens, linktypes, timestamps, wire_lengths=None):
+    """Decode many frames at once
+
+    data is a uint8 array holding the frames, offsets/caplens locate each
+    frame in it, linktypes is a scalar or per-frame array of LINKTYPE_*
+    values and timestamps are epoch nanoseconds. wire_lengths are the
+    original packet sizes when the capture was truncated to a snaplen
+    (caplens only bound the header reads). Returns a PACKET_DTYPE array.
+    """
+    n = len(offsets)
+    records = np.zeros(n, dtype=PACKET_DTYPE)
+    if n == 0:
+        return records
+
+    offsets = np.asarray(offsets, dtype=np.int64)
+    caplens = np.asarray(caplens, dtype=np.int64)
+    linktypes = np.broadcast_to(np.asarray(linktypes, dtype=np.int64), (n,))
+    view = _FrameView(data, offsets, caplens)
+
+    records['timestamp'] = timestamps
+    lengths = caplens if wire_lengths is None else np.asarray(wire_lengths, dtype=np.int64)
+    records['length'] = np.minimum(lengths, 0xFFFF)
+
+    # Locate the network header and its ethertype for each link type
+    l3 = offsets.copy()
+    ethertype = np.zeros(n, dtype=np.uint32)
+
+    ether = linktypes == LINKTYPE_ETHERNET
+    l3[ether] += 14
+    ethertype[ether] = view.u16(offsets + 12)[ether]
+    for _ in range(2):  # Up to two VLAN tags (802.1Q / QinQ)
+        tagged = ether & np.isin(ethertype, VLAN_ETHERTYPES)
+        ethertype[tagged] = view.u16(l3 + 2)[tagged]
+        l3[tagged] += 4
+
+    sll = linktypes == LINKTYPE_LINUX_SLL
+    l3[sll] += 16
+    ethertype[sll] = view.u16(offsets + 14)[sll]
+
+    sll2 = linktypes == LINKTYPE_LINUX_SLL2
+    l3[sll2] += 20
+    ethertype[sll2] = view.u16(offsets)[sll2]
+
+    raw = (linktypes == LINKTYPE_RAW) | (linktypes == LINKTYPE_IPV4)
+    ethertype[raw & ((view.u8(offsets) >> 4) == 4)] = ETHERTYPE_IPV4
+
+    # IPv4 header
+    is_ip = (ethertype == ETHERTYPE_IPV4) & (l3 + 20 <= view.end)
+    records['protocol'] = PROTO_NON_IP
+    records['protocol'][is_ip] = PROTO_OTHER
+    records['src_ip'][is_ip] = view.u32(l3 + 12)[is_ip]
+    records['dst_ip'][is_ip] = view.u32(l3 + 16)[is_ip]
+
+    ihl = (view.u8(l3) & 0x0F) * 4
+    ip_proto = view.u8(l3 + 9)
+    # Non-first fragments carry no transport header
+    first_fragment = (view.u16(l3 + 6) & 0x1FFF) == 0
+    l4 = l3 + ihl
+
+    tcp = is_ip & first_fragment & (ip_proto == IPPROTO_TCP)
+    udp = is_ip & first_fragment & (ip_proto == IPPROTO_UDP)
+    icmp = is_ip & first_fragment & (ip_proto == IPPROTO_ICMP)
+    records['protocol'][tcp] = PROTO_TCP
+    records['protocol'][udp] = PROTO_UDP
+    records['protocol'][icmp] = PROTO_ICMP
+
+    ported = tcp | udp
+    records['src_port'][ported] = view.u16(l4)[ported]
+    records['dst_port'][ported] = view.u16(l4 + 2)[ported]
+    records['flags'][tcp] = view.u8(l4 + 13)[tcp]
+
+    return records
+
+
+_ETHERTYPE = struct.Struct('!H')
+_IPV4_HEADER = struct.Struct('!B5xHxB2xII')  # ver/ihl, frag, proto, src, dst
+_PORTS = struct.Struct('!HH')
+_NON_IP = (0, 0, 0, 0, PROTO_NON_IP, 0)
+
+
+def decode_frame(frame, length=None):
+    """Decode one Ethernet frame
+
+    Returns (src_ip, dst_ip, src_port, dst_port, protocol, flags) using the
+    same rules as decode_frames, reading only the header fields we need.
+    """
+    n = len(frame) if length is None else length
+    if n < 14:
+        return _NON_IP
+    ethertype, = _ETHERTYPE.unpack_from(frame, 12)
+    l3 = 14
+    for _ in range(2):
+        if ethertype not in VLAN_ETHERTYPES:
+            break
+        if n < l3 + 4:
+            return _NON_IP
+        ethertype, = _ETHERTYPE.unpack_from(frame, l3 + 2)
+        l3 += 4
+    if ethertype != ETHERTYPE_IPV4 or n < l3 + 20:
+        return _NON_IP
+
+    ver_ihl, frag, ip_proto, src_ip, dst_ip = _IPV4_HEADER.unpack_from(frame, l3)
+    if frag & 0x1FFF:
+        return src_ip, dst_ip, 0, 0, PROTO_OTHER, 0
+    l4 = l3 + (ver_ihl & 0x0F) * 4
+
+    if ip_proto == IPPROTO_TCP:
+        src_port, dst_port = _PORTS.unpack_from(frame, l4) if n >= l4 + 4 else (0, 0)
+        flags = frame[l4 + 13] if n >= l4 + 14 else 0
+        return src_ip, dst_ip, src_port, dst_port, PROTO_TCP, flags
+    if ip_proto == IPPROTO_UDP:
+        src_port, dst_port = _PORTS.unpack_from(frame, l4) if n >= l4 + 4 else (0, 0)
+        return src_ip, dst_ip, src_port, dst_port, PROTO_UDP, 0
+    if ip_proto == IPPROTO_ICMP:
+        return src_ip, dst_ip, 0, 0, PROTO_ICMP, 0
+    return src_ip, dst_ip, 0, 0, PROTO_OTHER, 0
@@ -0,0 +1,194 @@
+"""
+Offline Pcap Reader
+Memory-maps pcap/pcapng capture files and decodes packets in bulk
+"""
+
+import mmap
+import struct
+
+import numpy as np
+
+from .packet_decoder import decode_frames
+
+
+PCAP_MAGIC_US = 0xA1B2C3D4
+PCAP_MAGIC_NS = 0xA1B23C4D
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+PCAPNG_IDB = 0x00000001
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+IF_TSRESOL = 9
+
+
+class PcapFormatError(ValueError):
+    """Raised when a capture file cannot be parsed"""
+
+
+class PcapReader:
+    """Reads pcap and pcapng files through a read-only memory map"""
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._file = open(filepath, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            self._file.close()
+            raise PcapFormatError(f"Empty capture file: {filepath}")
+        self._data = np.frombuffer(self._map, dtype=np.uint8)
+        self.format = self._detect_format()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Release the memory map and file handle"""
+        if self._map is not None:
+            self._data = None
+            self._map.close()
+            self._map = None
+            self._file.close()
+
+    def _detect_format(self):
+        if len(self._map) < 24:
+            raise PcapFormatError(f"Truncated capture file: {self.filepath}")
+        magic_le, = struct.unpack_from('<I', self._map, 0)
+        magic_be, = struct.unpack_from('>I', self._map, 0)
+        if magic_le == PCAPNG_SHB:
+            return 'pcapng'
+        if magic_le in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+            self._endian = '<'
+            self._ns = magic_le == PCAP_MAGIC_NS
+        elif magic_be in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+            self._endian = '>'
+            self._ns = magic_be == PCAP_MAGIC_NS
+        else:
+            raise PcapFormatError(f"Not a pcap/pcapng file: {self.filepath}")
+        self._linktype = struct.unpack_from(self._endian + 'I', self._map, 20)[0] & 0x0FFFFFFF
+        return 'pcap'
+
+    def read_batches(self, batch_size=65536):
+        """Yield decoded PACKET_DTYPE arrays of up to batch_size packets"""
+        for offsets, caplens, wire_lens, ts_ns, linktypes in self._index_batches(batch_size):
+            yield decode_frames(self._data, offsets, caplens, linktypes, ts_ns, wire_lens)
+
+    def read_indexed_batches(self, batch_size=65536):
+        """Yield (records, offsets, caplens) so callers can copy out selected frames"""
+        for offsets, caplens, wire_lens, ts_ns, linktypes in self._index_batches(batch_size):
+            records = decode_frames(self._data, offsets, caplens, linktypes, ts_ns, wire_lens)
+            yield records, offsets, caplens
+
+    def frame(self, offset, caplen):
+        """Raw bytes of one frame located by read_indexed_batches"""
+        return self._map[offset:offset + caplen]
+
+    def read_all(self):
+        """Decode the whole file into one PACKET_DTYPE array"""
+        batches = list(self.read_batches())
+        if not batches:
+            return decode_frames(self._data, [], [], 0, [])
+        return np.concatenate(batches)
+
+    def _index_batches(self, batch_size):
+        if self.format == 'pcap':
+            return self._index_pcap(batch_size)
+        return self._index_pcapng(batch_size)
+
+    @staticmethod
+    def _batch(offsets, caplens, wire_lens, ts_ns, linktypes):
+        return (np.array(offsets, dtype=np.int64), np.array(caplens, dtype=np.int64),
+                np.array(wire_lens, dtype=np.int64), np.array(ts_ns, dtype=np.int64),
+                np.array(linktypes, dtype=np.int64))
+
+    def _index_pcap(self, batch_size):
+        """Walk classic pcap record headers"""
+        buf = self._map
+        size = len(buf)
+        header = struct.Struct(self._endian + 'IIII')
+        frac_scale = 1 if self._ns else 1000
+        pos = 24
+        offsets, caplens, wire_lens, ts_ns = [], [], [], []
+        while pos + 16 <= size:
+            ts_sec, ts_frac, caplen, orig_len = header.unpack_from(buf, pos)
+            pos += 16
+            if pos + caplen > size:
+                break  # Truncated final record
+            offsets.append(pos)
+            caplens.append(caplen)
+            wire_lens.append(max(orig_len, caplen))
+            ts_ns.append(ts_sec * 1_000_000_000 + ts_frac * frac_scale)
+            pos += caplen
+            if len(offsets) == batch_size:
+                yield self._batch(offsets, caplens, wire_lens, ts_ns, self._linktype)
+                offsets, caplens, wire_lens, ts_ns = [], [], [], []
+        if offsets:
+            yield self._batch(offsets, caplens, wire_lens, ts_ns, self._linktype)
+
+    def _index_pcapng(self, batch_size):
+        """Walk pcapng blocks, tracking interfaces per section"""
+        buf = self._map
+        size = len(buf)
+        pos = 0
+        endian = '<'
+        interfaces = []  # (linktype, ticks per second)
+        last_ts = 0
+        offsets, caplens, wire_lens, ts_ns, linktypes = [], [], [], [], []
+        while pos + 12 <= size:
+            block_type, = struct.unpack_from(endian + 'I', buf, pos)
+            if block_type == PCAPNG_SHB:
+                bom, = struct.unpack_from('<I', buf, pos + 8)
+                endian = '<' if bom == PCAPNG_BYTE_ORDER_MAGIC else '>'
+                interfaces = []
+            block_len, = struct.unpack_from(endian + 'I', buf, pos + 4)
+            if block_len < 12 or pos + block_len > size:
+                break  # Corrupt or truncated block
+
+            if block_type == PCAPNG_IDB:
+                linktype, = struct.unpack_from(endian + 'H', buf, pos + 8)
+                interfaces.append((linktype, self._tick_divisor(buf, pos + 16, pos + block_len - 4, endian)))
+            elif block_type == PCAPNG_EPB:
+                if_id, ts_high, ts_low, caplen, orig_len = struct.unpack_from(endian + 'IIIII', buf,
+                                                                              pos + 8)
+                if if_id < len(interfaces):
+                    linktype, divisor = interfaces[if_id]
+                    offsets.append(pos + 28)
+                    caplens.append(min(caplen, block_len - 32))
+                    wire_lens.append(max(orig_len, caplens[-1]))
+                    last_ts = ((ts_high << 32) | ts_low) * 1_000_000_000 // divisor
+                    ts_ns.append(last_ts)
+                    linktypes.append(linktype)
+            elif block_type == PCAPNG_SPB and interfaces:
+                orig_len, = struct.unpack_from(endian + 'I', buf, pos + 8)
+                linktype = interfaces[0][0]
+                offsets.append(pos + 12)
+                caplens.append(min(orig_len, block_len - 16))
+                wire_lens.append(orig_len)
+                ts_ns.append(last_ts)  # SPBs carry no timestamp
+                linktypes.append(linktype)
+
+            pos += block_len
+            if len(offsets) == batch_size:
+                yield self._batch(offsets, caplens, wire_lens, ts_ns, linktypes)
+                offsets, caplens, wire_lens, ts_ns, linktypes = [], [], [], [], []
+        if offsets:
+            yield self._batch(offsets, caplens, wire_lens, ts_ns, linktypes)
+
+    @staticmethod
+    def _tick_divisor(buf, pos, end, endian):
+        """Timestamp units per second from an IDB's if_tsresol option"""
+        while pos + 4 <= end:
+            code, length = struct.unpack_from(endian + 'HH', buf, pos)
+            if code == 0:
+                break
+            if code == IF_TSRESOL and length >= 1:
+                resol = buf[pos + 4]
+                if resol & 0x80:
+                    return 2 ** (resol & 0x7F)
+                return 10 ** resol
+            pos += 4 + ((length + 3) & ~3)
+        return 1_000_000  # Default resolution is microseconds
@@ -0,0 +1,252 @@
+"""
+Forensic Pcap Ring
+Keeps recent raw frames in a disk-bounded ring of pcap segments
+"""
+
+import bisect
+import glob
+import itertools
+import json
+import os
+import re
+import struct
+import threading
+
+import numpy as np
+
+from .packet_buffer import PACKET_DTYPE, ip_to_int
+from .packet_decoder import LINKTYPE_ETHERNET
+from .pcap_reader import PcapReader, PcapFormatError, PCAP_MAGIC_NS
+
+
+SNAPLEN = 262144
+_RECORD_HEADER = struct.Struct('<IIII')
+_SEGMENT_RE = re.compile(r'segment-(\d+)\.pcap$')
+
+
+def _file_header(linktype):
+    return struct.pack('<IHHiIII', PCAP_MAGIC_NS, 2, 4, 0, 0, SNAPLEN, linktype)
+
+
+def write_pcap(path, timestamps, frames, linktype=LINKTYPE_ETHERNET):
+    """Write frames with epoch-nanosecond timestamps to a nanosecond pcap file"""
+    with open(path, 'wb') as f:
+        f.write(_file_header(linktype))
+        f.write(_pack_records(timestamps, frames))
+
+
+def _pack_records(timestamps, frames):
+    parts = []
+    for timestamp, frame in zip(timestamps, frames):
+        seconds, nanoseconds = divmod(int(timestamp), 1_000_000_000)
+        parts.append(_RECORD_HEADER.pack(seconds, nanoseconds, len(frame), len(frame)))
+        parts.append(frame)
+    return b''.join(parts)
+
+
+class PcapRingWriter:
+    """Appends raw frames to fixed-size pcap segments within a total disk budget
+
+    The capture thread only queues (timestamp, frame, src_ip, dst_ip) tuples;
+    a writer thread packs them in batches through a buffered file. Each
+    segment has a JSON sidecar with its time range and the addresses seen,
+    rewritten on every flush, so extract_packets can skip segments without
+    opening them. The oldest segments are deleted to stay within max_bytes.
+    """
+
+    def __init__(self, directory, segment_size=64 * 1024 * 1024, max_bytes=1024 * 1024 * 1024,
+                 linktype=LINKTYPE_ETHERNET, flush_interval=0.5, max_pending=200000):
+        self.directory = directory
+        self.segment_size = int(segment_size)
+        self.max_bytes = int(max(max_bytes, segment_size))
+        self.linktype = linktype
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.dropped = 0
+        self.written = 0
+
+        self._pending = []
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = None
+
+        self._file = None
+        self._seq = 0
+        self._segment_bytes = 0
+        self._index = None
+        self._segments = []  # (seq, bytes) of finished segments, oldest first
+
+        os.makedirs(directory, exist_ok=True)
+        for path in sorted(glob.glob(os.path.join(directory, 'segment-*.pcap'))):
+            match = _SEGMENT_RE.search(path)
+            if match:
+                self._segments.append((int(match.group(1)), os.path.getsize(path)))
+        if self._segments:
+            self._seq = self._segments[-1][0] + 1
+        self._enforce_budget()
+
+    def start(self):
+        """Start the background writer thread"""
+        self._closed.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self, timestamp, frame, src_ip=0, dst_ip=0):
+        """Queue one frame (bytes) for writing; never blocks on disk"""
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending.append((timestamp, frame, src_ip, dst_ip))
+
+    def _run(self):
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Pcap ring write error: {e}")
+
+    def flush(self):
+        """Write everything queued so far and refresh the segment index"""
+        with self._io_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if batch:
+                self._write_batch(batch)
+                if self._file is not None:
+                    self._file.flush()
+                    self._save_index()
+
+    def close(self):
+        """Stop the writer thread and finish the current segment"""
+        self._closed.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+        with self._io_lock:
+            self._finish_segment()
+
+    def _write_batch(self, batch):
+        timestamps, frames, src_ips, dst_ips = zip(*batch)
+        ends = list(itertools.accumulate(_RECORD_HEADER.size + len(f) for f in frames))
+        i, written = 0, 0
+        while i < len(batch):
+            if self._file is None:
+                self._open_segment()
+            # Fill the segment up to its size, but always make progress
+            room = self.segment_size - self._segment_bytes
+            j = max(bisect.bisect_right(ends, written + room, lo=i), i + 1)
+            data = _pack_records(timestamps[i:j], frames[i:j])
+            self._file.write(data)
+            self._segment_bytes += len(data)
+            written = ends[j - 1]
+
+            index = self._index
+            index['first_ts'] = min(index['first_ts'] or timestamps[i], min(timestamps[i:j]))
+            index['last_ts'] = max(index['last_ts'], max(timestamps[i:j]))
+            index['packets'] += j - i
+            index['ips'].update(src_ips[i:j])
+            index['ips'].update(dst_ips[i:j])
+            self.written += j - i
+            if self._segment_bytes >= self.segment_size:
+                self._finish_segment()
+            i = j
+
+    def _segment_path(self, seq, extension):
+        return os.path.join(self.directory, f"segment-{seq:08d}.{extension}")
+
+    def _open_segment(self):
+        self._file = open(self._segment_path(self._seq, 'pcap'), 'wb', buffering=1024 * 1024)
+        self._file.write(_file_header(self.linktype))
+        self._segment_bytes = 24
+        self._index = {'first_ts': 0, 'last_ts': 0, 'packets': 0, 'ips': set()}
+
+    def _finish_segment(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._save_index()
+        self._segments.append((self._seq, self._segment_bytes))
+        self._file = None
+        self._seq += 1
+        self._enforce_budget()
+
+    def _save_index(self):
+        index = dict(self._index, ips=sorted(self._index['ips']))
+        path = self._segment_path(self._seq, 'json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(index, f)
+        os.replace(path + '.tmp', path)
+
+    def _enforce_budget(self):
+        # Leave room for the segment being written
+        total = sum(size for _, size in self._segments)
+        while self._segments and total + self.segment_size > self.max_bytes:
+            seq, size = self._segments.pop(0)
+            for extension in ('pcap', 'json'):
+                try:
+                    os.remove(self._segment_path(seq, extension))
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+
+def candidate_segments(directory, start, end, address=None):
+    """Segment files under directory whose index overlaps [start, end] and address"""
+    paths = []
+    for index_path in sorted(glob.glob(os.path.join(directory, '**', 'segment-*.json'),
+                                       recursive=True)):
+        try:
+            with open(index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            continue  # Rotated away or being replaced
+        if index['packets'] == 0 or index['last_ts'] < start or index['first_ts'] > end:
+            continue
+        if address is not None:
+            ips = index['ips']
+            position = bisect.bisect_left(ips, address)
+            if position == len(ips) or ips[position] != address:
+                continue
+        paths.append(index_path[:-len('json')] + 'pcap')
+    return paths
+
+
+def extract_packets(directory, around, window=30.0, entity=None, output=None):
+    """Packets within window seconds of around (epoch ns), optionally for one IP
+
+    Only segments whose index matches are read. Returns the decoded records
+    in time order and, if output is a path, writes the raw frames there as
+    a pcap file.
+    """
+    window_ns = int(window * 1e9)
+    start, end = around - window_ns, around + window_ns
+    address = ip_to_int(entity) if entity else None
+
+    found, frames = [], []
+    for path in candidate_segments(directory, start, end, address):
+        try:
+            reader = PcapReader(path)
+        except (OSError, PcapFormatError):
+            continue
+        with reader:
+            for records, offsets, caplens in reader.read_indexed_batches():
+                mask = (records['timestamp'] >= start) & (records['timestamp'] <= end)
+                if address is not None:
+                    mask &= (records['src_ip'] == address) | (records['dst_ip'] == address)
+                selected = np.flatnonzero(mask)
+                found.append(records[selected])
+                if output:
+                    frames.extend(bytes(reader.frame(offsets[k], caplens[k])) for k in selected)
+
+    if not found:
+        records = np.zeros(0, dtype=PACKET_DTYPE)
+    else:
+        records = np.concatenate(found)
+    order = np.argsort(records['timestamp'], kind='stable')
+    records = records[order]
+    if output:
+        write_pcap(output, records['timestamp'], [frames[k] for k in order])
+    return records
@@ -0,0 +1,431 @@
+"""
+Profile Store
+Columnar storage of entity risk profiles in NumPy arrays
+"""
+
+import heapq
+import time
+from collections.abc import Mapping
+from datetime import datetime
+
+import numpy as np
+
+
+RISK_LEVELS = ('LOW', 'MEDIUM', 'HIGH')
+LEVEL_THRESHOLDS = (30, 70)  # Scores below 30 are LOW, below 70 MEDIUM
+# Distinct behaviours remembered per entity; the score only asks whether there are more than 10
+BEHAVIOR_SLOTS = 16
+DAY_NS = 86400 * 10**9
+
+# Column name -> (dtype, per-row shape)
+PROFILE_COLUMNS = {
+    'total_events': (np.int64, ()),
+    'anomaly_count': (np.int64, ()),
+    # Counters the score is based on; with a half-life they decay, otherwise equal the totals
+    'recent_events': (np.float64, ()),
+    'recent_anomalies': (np.float64, ()),
+    'decayed_at': (np.int64, ()),  # Epoch ns the recent counters were last decayed to
+    'risk_score': (np.float64, ()),
+    'level': (np.int8, ()),
+    'entity_type': (np.uint8, ()),
+    'first_seen': (np.int64, ()),  # Epoch ns
+    'last_seen': (np.int64, ()),
+    'behavior_count': (np.uint8, ()),
+    'behaviors': (np.int32, (BEHAVIOR_SLOTS,)),
+}
+
+
+def risk_levels(scores):
+    """Level index (into RISK_LEVELS) of each score"""
+    return np.digitize(scores, LEVEL_THRESHOLDS).astype(np.int8)
+
+
+def _isoformat(ns):
+    return datetime.fromtimestamp(int(ns) / 1e9).isoformat()
+
+
+class RiskProfile:
+    """View of one entity's row in a ProfileStore"""
+
+    def __init__(self, store, entity_id):
+        self.store = store
+        self.entity_id = entity_id
+
+    @property
+    def _row(self):
+        return self.store.index[self.entity_id]
+
+    def _value(self, column):
+        return self.store.columns[column][self._row]
+
+    @property
+    def entity_type(self):
+        return self.store.entity_types[self._value('entity_type')]
+
+    def _refresh(self):
+        self.store.refresh([self._row])
+
+    @property
+    def risk_score(self):
+        self._refresh()
+        return float(self._value('risk_score'))
+
+    @property
+    def anomaly_count(self):
+        return int(self._value('anomaly_count'))
+
+    @property
+    def total_events(self):
+        return int(self._value('total_events'))
+
+    @property
+    def first_seen(self):
+        return datetime.fromtimestamp(int(self._value('first_seen')) / 1e9)
+
+    @property
+    def last_seen(self):
+        return datetime.fromtimestamp(int(self._value('last_seen')) / 1e9)
+
+    @property
+    def risk_factors(self):
+        self._refresh()
+        return self.store.risk_factors(self._row)
+
+    def update(self, event_data, is_anomaly=False):
+        """Update profile with new event"""
+        behaviors = []
+        if 'protocol' in event_data:
+            behaviors.append(f"protocol_{event_data['protocol']}")
+        if 'dst_port' in event_data:
+            behaviors.append(f"port_{event_data['dst_port']}")
+        rows = np.array([self._row])
+        self.store.add_events(rows, [1], [int(bool(is_anomaly))])
+        self.store.add_behaviors(np.repeat(rows, len(behaviors)), self.store.behavior_codes(behaviors))
+        self.store.rescore(rows)
+
+    def get_risk_level(self):
+        """Get categorical risk level"""
+        self._refresh()
+        return RISK_LEVELS[self._value('level')]
+
+    def to_dict(self):
+        """Convert profile to dictionary"""
+        self._refresh()
+        return self.store.to_dict(self._row)
+
+
+class ScoreIndex:
+    """Tournament trees over the score column for min, max and ranked queries
+
+    high and low are implicit binary trees in level order: leaf capacity +
+    row holds that row's score and every inner node the max (high) or min
+    (low) of its two children, so the root answers max() and min() at
+    once. A batch of score changes updates only the ancestors of the
+    changed rows, one vectorized pass per tree level. Unused leaves hold
+    -inf in high and +inf in low.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.rebuild()
+
+    def rebuild(self):
+        """Recreate both trees from the score column"""
+        capacity = self.store.capacity
+        self.high = np.full(2 * capacity, -np.inf)
+        self.low = np.full(2 * capacity, np.inf)
+        live = len(self.store)
+        self.high[capacity:capacity + live] = self.store.column('risk_score')
+        self.low[capacity:capacity + live] = self.store.column('risk_score')
+        for level_start in (capacity >> shift for shift in range(1, capacity.bit_length())):
+            nodes = np.arange(level_start, 2 * level_start)
+            self.high[nodes] = np.maximum(self.high[2 * nodes], self.high[2 * nodes + 1])
+            self.low[nodes] = np.minimum(self.low[2 * nodes], self.low[2 * nodes + 1])
+
+    def update(self, rows, scores=None):
+        """Refresh the leaves of rows (from the score column, or removed when past the end)"""
+        capacity = len(self.high) // 2
+        rows = np.asarray(rows, dtype=np.intp)
+        if len(rows) == 0:
+            return
+        live = rows < len(self.store)
+        values = self.store.columns['risk_score'][np.where(live, rows, 0)]
+        self.high[capacity + rows] = np.where(live, values, -np.inf)
+        self.low[capacity + rows] = np.where(live, values, np.inf)
+        nodes = np.unique((capacity + rows) >> 1)
+        while True:
+            self.high[nodes] = np.maximum(self.high[2 * nodes], self.high[2 * nodes + 1])
+            self.low[nodes] = np.minimum(self.low[2 * nodes], self.low[2 * nodes + 1])
+            if nodes[0] == 1:
+                break
+            nodes = np.unique(nodes >> 1)
+
+    def ranked(self, threshold=-np.inf, limit=None):
+        """Rows with score >= threshold, highest first, at most limit of them
+
+        Only subtrees whose maximum can still qualify are opened, so m
+        results cost O(m log n). Without a limit the qualifying subtrees are
+        expanded a level at a time; with one, a best-first search stops
+        after limit rows.
+        """
+        capacity = len(self.high) // 2
+        if not len(self.store) or self.high[1] < threshold:
+            return []
+        if limit is None:
+            nodes = np.array([1])
+            while nodes[0] < capacity:
+                nodes = np.stack([2 * nodes, 2 * nodes + 1], axis=1).ravel()
+                nodes = nodes[self.high[nodes] >= threshold]
+            order = np.argsort(-self.high[nodes], kind='stable')
+            return (nodes[order] - capacity).tolist()
+
+        rows = []
+        # Ties go to the deeper node, so equal scores do not widen the search
+        frontier = [(-self.high[1], -1, 1)]
+        while frontier and len(rows) < limit:
+            _, _, node = heapq.heappop(frontier)
+            if node >= capacity:
+                rows.append(node - capacity)
+                continue
+            for child in (2 * node, 2 * node + 1):
+                if self.high[child] >= threshold:
+                    heapq.heappush(frontier, (-self.high[child], -child.bit_length(), child))
+        return rows
+
+    def max(self):
+        """Highest score, or None when empty"""
+        return float(self.high[1]) if len(self.store) else None
+
+    def min(self):
+        """Lowest score, or None when empty"""
+        return float(self.low[1]) if len(self.store) else None
+
+
+class ProfileStore(Mapping):
+    """Risk profiles of many entities as one row each in shared NumPy columns
+
+    index maps an entity id to its row; rows are kept contiguous (removing
+    a profile moves the last row into its place), so whole-store scores
+    and levels are slices of the columns. Behaviours such as "port_443"
+    are interned to integer codes, and each entity remembers up to
+    BEHAVIOR_SLOTS distinct codes rather than a dict of strings.
+
+    Per-level counts, the score sum and the ScoreIndex are updated whenever
+    scores change, so store-wide statistics cost O(changed rows) instead
+    of a pass over every profile.
+
+    With a half_life (seconds) the counters behind the score decay
+    exponentially, so past anomalies fade. Decay is lazy: a row's counters
+    are brought up to date only when it gains events or is read (refresh),
+    so idle profiles cost nothing. Decay never raises a score, so the
+    stored score of an idle profile is an upper bound of its current one,
+    and store-wide statistics count each profile as of its last refresh.
+
+    As a Mapping it yields RiskProfile views: store[entity_id].
+    """
+
+    def __init__(self, capacity=1024, half_life=None):
+        self.half_life = half_life
+        self.index = {}
+        self.ids = []
+        self.entity_types = []
+        self.behavior_index = {}
+        self.capacity = 1 << max(int(capacity) - 1, 1).bit_length()  # A power of two for ScoreIndex
+        self.columns = {name: np.zeros((self.capacity,) + shape, dtype=dtype)
+                        for name, (dtype, shape) in PROFILE_COLUMNS.items()}
+        self.level_counts = np.zeros(len(RISK_LEVELS), dtype=np.int64)
+        self.score_sum = 0.0
+        self.scores = ScoreIndex(self)
+
+    def __getitem__(self, entity_id):
+        if entity_id not in self.index:
+            raise KeyError(entity_id)
+        return RiskProfile(self, entity_id)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, entity_id):
+        return entity_id in self.index
+
+    def column(self, name):
+        """The live rows of a column"""
+        return self.columns[name][:len(self.ids)]
+
+    def _grow(self, size):
+        capacity = self.capacity
+        while capacity < size:
+            capacity *= 2
+        for name, values in self.columns.items():
+            grown = np.zeros((capacity,) + values.shape[1:], dtype=values.dtype)
+            grown[:self.capacity] = values
+            self.columns[name] = grown
+        self.capacity = capacity
+        self.scores.rebuild()
+
+    def _type_code(self, entity_type):
+        if entity_type not in self.entity_types:
+            self.entity_types.append(entity_type)
+        return self.entity_types.index(entity_type)
+
+    def rows(self, entity_ids, entity_type='device'):
+        """Row of each entity, appending rows for entities not seen before"""
+        rows = np.empty(len(entity_ids), dtype=np.intp)
+        start = len(self.ids)
+        for i, entity_id in enumerate(entity_ids):
+            row = self.index.get(entity_id)
+            if row is None:
+                row = self.index[entity_id] = len(self.ids)
+                self.ids.append(entity_id)
+            rows[i] = row
+        if len(self.ids) > start:
+            if len(self.ids) > self.capacity:
+                self._grow(len(self.ids))
+            now = time.time_ns()
+            for name, values in self.columns.items():
+                values[start:len(self.ids)] = -1 if name == 'behaviors' else 0
+            self.columns['entity_type'][start:len(self.ids)] = self._type_code(entity_type)
+            self.columns['first_seen'][start:len(self.ids)] = now
+            self.columns['last_seen'][start:len(self.ids)] = now
+            self.columns['decayed_at'][start:len(self.ids)] = now
+            # New profiles start at score 0, level LOW
+            self.level_counts[0] += len(self.ids) - start
+            self.scores.update(np.arange(start, len(self.ids)))
+        return rows
+
+    def behavior_codes(self, behaviors):
+        """Interned integer code of each behaviour string"""
+        codes = np.empty(len(behaviors), dtype=np.int32)
+        for i, behavior in enumerate(behaviors):
+            codes[i] = self.behavior_index.setdefault(behavior, len(self.behavior_index))
+        return codes
+
+    def decay(self, rows, now=None):
+        """Bring the recent counters of rows forward to now (epoch ns)"""
+        if self.half_life is None or len(rows) == 0:
+            return
+        now = time.time_ns() if now is None else now
+        elapsed = np.maximum(now - self.columns['decayed_at'][rows], 0) / 1e9
+        factor = 0.5 ** (elapsed / self.half_life)
+        self.columns['recent_events'][rows] *= factor
+        self.columns['recent_anomalies'][rows] *= factor
+        self.columns['decayed_at'][rows] = now
+
+    def refresh(self, rows, now=None):
+        """Decay and rescore rows; returns whether any score changed"""
+        if self.half_life is None or len(rows) == 0:
+            return False
+        rows = np.asarray(rows, dtype=np.intp)
+        previous = self.columns['risk_score'][rows]
+        self.decay(rows, now)
+        self.rescore(rows)
+        return bool((self.columns['risk_score'][rows] != previous).any())
+
+    def add_events(self, rows, events, anomalies):
+        """Add event and anomaly counts to distinct rows"""
+        now = time.time_ns()
+        self.decay(rows, now)
+        self.columns['total_events'][rows] += np.asarray(events, dtype=np.int64)
+        self.columns['anomaly_count'][rows] += np.asarray(anomalies, dtype=np.int64)
+        self.columns['recent_events'][rows] += events
+        self.columns['recent_anomalies'][rows] += anomalies
+        self.columns['last_seen'][rows] = now
+
+    def add_behaviors(self, rows, codes):
+        """Remember behaviour codes for rows (pairs may repeat)"""
+        if len(rows) == 0:
+            return
+        # One sortable key per (row, code) pair
+        keys = np.unique(np.asarray(rows, dtype=np.int64) << 32 | np.asarray(codes, dtype=np.int64))
+        rows, codes = keys >> 32, (keys & 0xFFFFFFFF).astype(np.int32)
+        slots = self.columns['behaviors']
+        new = ~(slots[rows] == codes[:, None]).any(axis=1)
+        rows, codes = rows[new], codes[new]
+        if len(rows) == 0:
+            return
+        # Pairs are sorted by row: number the new codes within each row
+        first = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        rank = np.arange(len(rows)) - np.repeat(first, np.diff(np.r_[first, len(rows)]))
+        position = self.columns['behavior_count'][rows].astype(np.int64) + rank
+        fits = position < BEHAVIOR_SLOTS
+        slots[rows[fits], position[fits]] = codes[fits]
+        counts = self.columns['behavior_count']
+        counts[rows[first]] = np.minimum(counts[rows[first]] + np.diff(np.r_[first, len(rows)]),
+                                         BEHAVIOR_SLOTS)
+
+    def rescore(self, rows):
+        """Recalculate risk scores (0-100) and levels of rows"""
+        total = self.columns['recent_events'][rows]
+        anomaly_rate = self.columns['recent_anomalies'][rows] / np.maximum(total, 1)
+        behavior_penalty = np.where(self.columns['behavior_count'][rows] > 10, 10, 0)
+        activity_factor = np.minimum(total / 1000, 1.0) * 10
+        scores = np.minimum(anomaly_rate * 100 + behavior_penalty + activity_factor, 100)
+        levels = risk_levels(scores)
+
+        previous = self.columns['risk_score'][rows]
+        self.level_counts += (np.bincount(levels, minlength=len(RISK_LEVELS))
+                              - np.bincount(self.columns['level'][rows], minlength=len(RISK_LEVELS)))
+        self.score_sum += float(scores.sum() - previous.sum())
+        self.columns['risk_score'][rows] = scores
+        self.columns['level'][rows] = levels
+        self.scores.update(np.asarray(rows)[scores != previous])
+
+    def level_count(self, level):
+        """Number of profiles at a risk level ('LOW', 'MEDIUM' or 'HIGH')"""
+        return int(self.level_counts[RISK_LEVELS.index(level)])
+
+    def mean_score(self):
+        """Average risk score, 0 when empty"""
+        return self.score_sum / len(self.ids) if self.ids else 0.0
+
+    def risk_factors(self, row):
+        recent = float(self.columns['recent_events'][row])
+        factors = {
+            'anomaly_rate': round(float(self.columns['recent_anomalies'][row]) / max(recent, 1) * 100, 2),
+            'behavior_diversity': int(self.columns['behavior_count'][row]),
+            'activity_level': int(self.columns['total_events'][row]),
+            'days_active': int(self.columns['last_seen'][row] - self.columns['first_seen'][row]) // DAY_NS
+        }
+        if self.half_life is not None:
+            factors['recent_activity'] = round(recent, 2)
+        return factors
+
+    def to_dict(self, row):
+        """Profile dictionary of one row"""
+        return {
+            'entity_id': self.ids[row],
+            'entity_type': self.entity_types[self.columns['entity_type'][row]],
+            'risk_score': round(float(self.columns['risk_score'][row]), 2),
+            'risk_level': RISK_LEVELS[self.columns['level'][row]],
+            'anomaly_count': int(self.columns['anomaly_count'][row]),
+            'total_events': int(self.columns['total_events'][row]),
+            'first_seen': _isoformat(self.columns['first_seen'][row]),
+            'last_seen': _isoformat(self.columns['last_seen'][row]),
+            'risk_factors': self.risk_factors(row)
+        }
+
+    def remove(self, entity_id):
+        """Drop an entity; the last row moves into its place"""
+        row = self.index.pop(entity_id)
+        self.level_counts[self.columns['level'][row]] -= 1
+        self.score_sum -= float(self.columns['risk_score'][row])
+        last = len(self.ids) - 1
+        if row != last:
+            moved = self.ids[last]
+            self.ids[row] = moved
+            self.index[moved] = row
+            for values in self.columns.values():
+                values[row] = values[last]
+        self.ids.pop()
+        self.scores.update([row, last] if row != last else [row])
+
+    def clear(self):
+        """Remove every profile"""
+        self.index.clear()
+        self.ids.clear()
+        self.level_counts[:] = 0
+        self.score_sum = 0.0
+        self.scores.rebuild()
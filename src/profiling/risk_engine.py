@@ -3,122 +3,76 @@ Risk Profiling Engine
 Assigns threat scores to devices and users based on behavior
 """
 
+import time
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from collections import defaultdict
 
+from .profile_store import ProfileStore, RiskProfile
 
-class RiskProfile:
-    """Individual risk profile for a device or user"""
-    
-    def __init__(self, entity_id, entity_type='device'):
-        self.entity_id = entity_id
-        self.entity_type = entity_type
-        self.risk_score = 0.0
-        self.anomaly_count = 0
-        self.total_events = 0
-        self.first_seen = datetime.now()
-        self.last_seen = datetime.now()
-        self.behaviors = defaultdict(int)
-        self.risk_factors = {}
-        
-    def update(self, event_data, is_anomaly=False):
-        """Update profile with new event"""
-        self.total_events += 1
-        self.last_seen = datetime.now()
-        
-        if is_anomaly:
-            self.anomaly_count += 1
-        
-        # Track behaviors
-        if 'protocol' in event_data:
-            self.behaviors[f"protocol_{event_data['protocol']}"] += 1
-        if 'dst_port' in event_data:
-            self.behaviors[f"port_{event_data['dst_port']}"] += 1
-        
-        # Calculate risk score
-        self._calculate_risk_score()
-    
-    def _calculate_risk_score(self):
-        """Calculate overall risk score (0-100)"""
-        # Base score from anomaly rate
-        anomaly_rate = self.anomaly_count / max(self.total_events, 1)
-        base_score = anomaly_rate * 100
-        
-        # Adjust for unusual behaviors
-        behavior_penalty = 0
-        if len(self.behaviors) > 10:  # Too many different behaviors
-            behavior_penalty += 10
-        
-        # Adjust for activity level
-        activity_factor = min(self.total_events / 1000, 1.0) * 10
-        
-        # Calculate final score
-        self.risk_score = min(base_score + behavior_penalty + activity_factor, 100)
-        
-        # Update risk factors
-        self.risk_factors = {
-            'anomaly_rate': round(anomaly_rate * 100, 2),
-            'behavior_diversity': len(self.behaviors),
-            'activity_level': self.total_events,
-            'days_active': (self.last_seen - self.first_seen).days
-        }
-    
-    def get_risk_level(self):
-        """Get categorical risk level"""
-        if self.risk_score < 30:
-            return 'LOW'
-        elif self.risk_score < 70:
-            return 'MEDIUM'
-        else:
-            return 'HIGH'
-    
-    def to_dict(self):
-        """Convert profile to dictionary"""
-        return {
-            'entity_id': self.entity_id,
-            'entity_type': self.entity_type,
-            'risk_score': round(self.risk_score, 2),
-            'risk_level': self.get_risk_level(),
-            'anomaly_count': self.anomaly_count,
-            'total_events': self.total_events,
-            'first_seen': self.first_seen.isoformat(),
-            'last_seen': self.last_seen.isoformat(),
-            'risk_factors': self.risk_factors
-        }
+
+# Traffic columns tracked as behaviours, with their behaviour-key prefix
+BEHAVIOR_COLUMNS = (('protocol', 'protocol'), ('dst_port', 'port'))
+# Beyond this many stale top rows, refreshing the whole store at once is cheaper
+REFRESH_BATCH_LIMIT = 4096
 
 
 class RiskEngine:
-    """Manages risk profiles for all entities"""
+    """Manages risk profiles for all entities
+    
+    half_life (seconds) makes scores decay so that an entity that stopped
+    misbehaving drifts back to LOW; None keeps scores cumulative.
+    """
     
-    def __init__(self):
-        self.profiles = {}
+    def __init__(self, half_life=None):
+        self.profiles = ProfileStore(half_life=half_life)
         self.history = []
         
     def get_or_create_profile(self, entity_id, entity_type='device'):
         """Get existing profile or create new one"""
-        if entity_id not in self.profiles:
-            self.profiles[entity_id] = RiskProfile(entity_id, entity_type)
+        self.profiles.rows([entity_id], entity_type)
         return self.profiles[entity_id]
     
     def update_from_traffic(self, df, predictions=None):
-        """Update profiles from traffic data"""
+        """Update profiles from traffic data
+        
+        Every packet is an event for both its source and destination.
+        predictions are matched to rows by position. Counts are aggregated
+        per entity with array operations and each affected profile is
+        rescored once per batch.
+        """
         if df.empty:
             return
         
-        for idx, row in df.iterrows():
-            # Update source IP profile
-            if pd.notna(row.get('src_ip')):
-                profile = self.get_or_create_profile(row['src_ip'], 'device')
-                is_anomaly = predictions[idx] == 1 if predictions is not None and idx < len(predictions) else False
-                profile.update(row.to_dict(), is_anomaly)
-            
-            # Update destination IP profile
-            if pd.notna(row.get('dst_ip')):
-                profile = self.get_or_create_profile(row['dst_ip'], 'device')
-                is_anomaly = predictions[idx] == 1 if predictions is not None and idx < len(predictions) else False
-                profile.update(row.to_dict(), is_anomaly)
+        anomalous = np.zeros(len(df), dtype=bool)
+        if predictions is not None:
+            predictions = np.asarray(predictions)[:len(df)]
+            anomalous[:len(predictions)] = predictions == 1
+        
+        # One event per (entity, packet): the source side and the destination side
+        sides = [column for column in ('src_ip', 'dst_ip') if column in df.columns]
+        if not sides:
+            return
+        entities = np.concatenate([df[column].to_numpy(dtype=object) for column in sides])
+        present = pd.notna(entities)
+        codes, uniques = pd.factorize(entities[present])
+        rows = self.profiles.rows(uniques, 'device')
+        event_rows = rows[codes]
+        
+        events = np.bincount(codes, minlength=len(uniques))
+        anomalies = np.bincount(codes, weights=np.tile(anomalous, len(sides))[present],
+                                minlength=len(uniques))
+        self.profiles.add_events(rows, events, anomalies.astype(np.int64))
+        
+        for column, prefix in BEHAVIOR_COLUMNS:
+            if column in df.columns:
+                values = np.tile(df[column].to_numpy(dtype=object), len(sides))[present]
+                value_codes, value_uniques = pd.factorize(values, use_na_sentinel=False)
+                behavior_codes = self.profiles.behavior_codes(
+                    [f"{prefix}_{value}" for value in value_uniques])
+                self.profiles.add_behaviors(event_rows, behavior_codes[value_codes])
+        
+        self.profiles.rescore(rows)
         
         # Record history snapshot
         self._record_history()
@@ -128,10 +82,10 @@ class RiskEngine:
         snapshot = {
             'timestamp': datetime.now(),
             'total_profiles': len(self.profiles),
-            'high_risk_count': sum(1 for p in self.profiles.values() if p.get_risk_level() == 'HIGH'),
-            'medium_risk_count': sum(1 for p in self.profiles.values() if p.get_risk_level() == 'MEDIUM'),
-            'low_risk_count': sum(1 for p in self.profiles.values() if p.get_risk_level() == 'LOW'),
-            'avg_risk_score': np.mean([p.risk_score for p in self.profiles.values()]) if self.profiles else 0
+            'high_risk_count': self.profiles.level_count('HIGH'),
+            'medium_risk_count': self.profiles.level_count('MEDIUM'),
+            'low_risk_count': self.profiles.level_count('LOW'),
+            'avg_risk_score': self.profiles.mean_score()
         }
         self.history.append(snapshot)
         
@@ -141,15 +95,50 @@ class RiskEngine:
     
     def get_high_risk_entities(self, threshold=70):
         """Get entities with risk score above threshold"""
-        high_risk = []
-        for profile in self.profiles.values():
-            if profile.risk_score >= threshold:
-                high_risk.append(profile.to_dict())
-        return sorted(high_risk, key=lambda x: x['risk_score'], reverse=True)
+        return self.above(threshold)
+    
+    def _ranked(self, threshold=-np.inf, limit=None):
+        """Ranked rows with their decay applied
+        
+        Stored scores of idle profiles can only be too high, so once every
+        row ranked on top has been refreshed to now, nothing else can
+        outrank them and no other profile needs touching. The refreshed
+        batch doubles while stale rows keep dropping out; past
+        REFRESH_BATCH_LIMIT rows, all rows are refreshed at once instead.
+        """
+        scores = self.profiles.scores
+        if self.profiles.half_life is None:
+            return scores.ranked(threshold, limit)
+        now = time.time_ns()
+        decayed_at = self.profiles.columns['decayed_at']
+        batch = limit
+        while True:
+            if batch is not None and batch > min(REFRESH_BATCH_LIMIT, len(self.profiles) // 16):
+                self.profiles.refresh(np.arange(len(self.profiles)), now)
+                return scores.ranked(threshold, limit)
+            self.profiles.refresh(scores.ranked(threshold, batch), now)
+            rows = scores.ranked(threshold, limit)
+            if (decayed_at[rows] == now).all():
+                return rows
+            batch = 2 * batch
+    
+    def top_k(self, k=10):
+        """The k highest-risk entities, highest score first"""
+        return [self.profiles.to_dict(row) for row in self._ranked(limit=k)]
+    
+    def above(self, threshold, limit=None):
+        """Entities with risk score at or above threshold, highest score first
+        
+        Walks the score index, so only the returned profiles are visited and
+        turned into dictionaries.
+        """
+        return [self.profiles.to_dict(row) for row in self._ranked(threshold, limit)]
     
     def get_all_profiles(self):
         """Get all risk profiles"""
-        return [p.to_dict() for p in self.profiles.values()]
+        rows = np.arange(len(self.profiles))
+        self.profiles.refresh(rows)
+        return [self.profiles.to_dict(row) for row in rows]
     
     def get_profile(self, entity_id):
         """Get specific profile"""
@@ -169,16 +158,14 @@ class RiskEngine:
                 'max_risk_score': 0
             }
         
-        risk_scores = [p.risk_score for p in self.profiles.values()]
-        
         return {
             'total_entities': len(self.profiles),
-            'high_risk': sum(1 for p in self.profiles.values() if p.get_risk_level() == 'HIGH'),
-            'medium_risk': sum(1 for p in self.profiles.values() if p.get_risk_level() == 'MEDIUM'),
-            'low_risk': sum(1 for p in self.profiles.values() if p.get_risk_level() == 'LOW'),
-            'avg_risk_score': round(np.mean(risk_scores), 2),
-            'max_risk_score': round(max(risk_scores), 2),
-            'min_risk_score': round(min(risk_scores), 2)
+            'high_risk': self.profiles.level_count('HIGH'),
+            'medium_risk': self.profiles.level_count('MEDIUM'),
+            'low_risk': self.profiles.level_count('LOW'),
+            'avg_risk_score': round(self.profiles.mean_score(), 2),
+            'max_risk_score': round(self.profiles.scores.max(), 2),
+            'min_risk_score': round(self.profiles.scores.min(), 2)
         }
     
     def get_risk_trend(self, hours=24):
@@ -190,7 +177,7 @@ class RiskEngine:
     def reset_profile(self, entity_id):
         """Reset a specific profile"""
         if entity_id in self.profiles:
-            del self.profiles[entity_id]
+            self.profiles.remove(entity_id)
             return True
         return False
     
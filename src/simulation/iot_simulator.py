@@ -6,7 +6,6 @@ Generates realistic IoT device traffic for testing
 import random
 import time
 import threading
-from datetime import datetime
 import json
 
 
@@ -41,7 +40,7 @@ class IoTDevice:
             'dst_port': random.choice(self.config['ports']),
             'protocol': 'TCP' if random.random() > 0.3 else 'UDP',
             'length': random.randint(*self.config['data_size']),
-            'timestamp': datetime.now(),
+            'timestamp': time.time_ns(),  # Epoch nanoseconds, like captured packets
             'malicious': self.malicious
         }
     
@@ -4,11 +4,22 @@ Creates interactive charts and visualizations
 """
 
 import plotly.graph_objects as go
-import plotly.express as px
 import pandas as pd
-import networkx as nx
 from datetime import datetime, timedelta
 
+from detection.features import local_timezone
+
+
+def to_local_time(timestamps):
+    """Convert epoch-nanosecond timestamps to local datetimes for display
+
+    Each timestamp gets the offset in force at that moment, so replayed
+    captures from before a DST change show their wall-clock time.
+    """
+    if pd.api.types.is_datetime64_any_dtype(timestamps):
+        return timestamps
+    return pd.to_datetime(timestamps, unit='ns', utc=True).dt.tz_convert(local_timezone()).dt.tz_localize(None)
+
 
 def create_protocol_pie_chart(stats):
     """Create pie chart for protocol distribution"""
@@ -47,8 +58,8 @@ def create_traffic_timeline(df):
         )
         return fig
     
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df_grouped = df.groupby(pd.Grouper(key='timestamp', freq='1S')).size().reset_index(name='count')
+    times = pd.DatetimeIndex(to_local_time(df['timestamp']), name='timestamp')
+    df_grouped = pd.Series(1, index=times).resample('1s').size().reset_index(name='count')
     
     fig = go.Figure()
     fig.add_trace(go.Scatter(
@@ -85,7 +96,7 @@ def create_anomaly_scatter(df, predictions, scores):
     df_plot = df.copy()
     df_plot['anomaly'] = predictions
     df_plot['score'] = scores
-    df_plot['timestamp'] = pd.to_datetime(df_plot['timestamp'])
+    df_plot['timestamp'] = to_local_time(df_plot['timestamp'])
     
     # Separate normal and anomalous packets
     normal = df_plot[df_plot['anomaly'] == 0]
@@ -181,6 +192,9 @@ def create_network_graph(df, limit=50):
         )
         return fig
     
+    # networkx is only needed for the topology view, so load it on first use
+    import networkx as nx
+    
     # Create network graph
     G = nx.Graph()
     
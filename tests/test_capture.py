@@ -0,0 +1,559 @@
+"""
+GuardELNS Capture Pipeline Tests
+Buffering and decoding of captured packets
+"""
+
+import sys
+import os
+import socket
+import struct
+import time
+import numpy as np
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.monitoring.packet_buffer import (
+    PacketRingBuffer, SharedPacketRing, PACKET_DTYPE, PROTO_TCP, PROTO_UDP, PROTO_ICMP,
+    PROTO_NON_IP, ip_to_int, encode_tcp_flags
+)
+from src.monitoring.pcap_reader import PcapReader
+from src.monitoring.packet_decoder import decode_frames, decode_frame
+from src.monitoring.capture_filter import CaptureFilter, FilterSyntaxError, attach_bpf
+from src.monitoring.flow_table import FlowTable, flows_to_dataframe
+from src.monitoring.pcap_ring import PcapRingWriter, candidate_segments, extract_packets
+from src.monitoring.overload import LoadShedder, OVERLOAD_MODES, flow_hash, flow_hashes
+from src.monitoring import traffic_capture
+from src.monitoring.traffic_capture import TrafficCapture
+
+
+def build_frame(src_ip, dst_ip, proto=6, sport=0, dport=0, flags=0, payload=b'', vlan=None):
+    """Build an Ethernet/IPv4 frame with a minimal transport header"""
+    if proto == 6:
+        l4 = struct.pack('!HHIIBBHHH', sport, dport, 0, 0, 0x50, flags, 8192, 0, 0)
+    elif proto == 17:
+        l4 = struct.pack('!HHHH', sport, dport, 8 + len(payload), 0)
+    elif proto == 1:
+        l4 = struct.pack('!BBHI', 8, 0, 0, 0)
+    else:
+        l4 = b''
+    l4 += payload
+    ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(l4), 1, 0, 64, proto, 0,
+                     bytes(map(int, src_ip.split('.'))), bytes(map(int, dst_ip.split('.'))))
+    ether = b'\xff' * 6 + b'\x02' * 6
+    if vlan is not None:
+        ether += struct.pack('!HH', 0x8100, vlan)
+    return ether + b'\x08\x00' + ip + l4
+
+
+SAMPLE_FRAMES = [
+    build_frame('10.0.0.1', '8.8.8.8', 6, 1234, 443, 0x18, b'x' * 10),
+    build_frame('10.0.0.2', '8.8.4.4', 17, 53, 5353),
+    build_frame('10.0.0.3', '1.1.1.1', 1, vlan=5),
+    b'\xff' * 6 + b'\x02' * 6 + b'\x08\x06' + b'\x00' * 28,  # ARP
+]
+
+
+def write_pcap(path, frames, start=1_700_000_000, snaplen=65535):
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<IHHiIII', 0xA1B2C3D4, 2, 4, 0, 0, snaplen, 1))
+        for i, frame in enumerate(frames):
+            f.write(struct.pack('<IIII', start + i, 500000, len(frame[:snaplen]), len(frame)))
+            f.write(frame[:snaplen])
+
+
+def write_pcapng(path, frames, start=1_700_000_000, snaplen=65535):
+    def block(block_type, body):
+        body += b'\x00' * (-len(body) % 4)
+        length = len(body) + 12
+        return struct.pack('<II', block_type, length) + body + struct.pack('<I', length)
+
+    with open(path, 'wb') as f:
+        f.write(block(0x0A0D0D0A, struct.pack('<IHHq', 0x1A2B3C4D, 1, 0, -1)))
+        f.write(block(1, struct.pack('<HHI', 1, 0, snaplen)))
+        for i, frame in enumerate(frames):
+            ticks = (start + i) * 1_000_000 + 500000
+            f.write(block(6, struct.pack('<IIIII', 0, ticks >> 32, ticks & 0xFFFFFFFF,
+                                         len(frame[:snaplen]), len(frame)) + frame[:snaplen]))
+
+
+def _fill(buffer, count, start=0):
+    for i in range(start, start + count):
+        protocol = [PROTO_TCP, PROTO_UDP, PROTO_ICMP, PROTO_NON_IP][i % 4]
+        buffer.append(1_700_000_000_000_000_000 + i * 1_000_000_000, ip_to_int(f"10.0.0.{i % 250}"),
+                      ip_to_int("192.168.1.1"), 40000 + i, 443, protocol,
+                      encode_tcp_flags('PA'), 60 + i)
+
+
+def test_ring_buffer_wraps_and_keeps_newest():
+    """Buffer keeps only the newest records in arrival order"""
+    buffer = PacketRingBuffer(capacity=8)
+    _fill(buffer, 13)
+
+    assert len(buffer) == 8
+    assert buffer.total_appended == 13
+    lengths = buffer.snapshot()['length'].tolist()
+    assert lengths == list(range(65, 73))
+    assert buffer.snapshot(limit=3)['length'].tolist() == [70, 71, 72]
+
+
+def test_ring_buffer_extend_matches_append():
+    """Bulk extend produces the same contents as single appends"""
+    single = PacketRingBuffer(capacity=10)
+    _fill(single, 25)
+
+    source = PacketRingBuffer(capacity=25)
+    _fill(source, 25)
+    bulk = PacketRingBuffer(capacity=10)
+    bulk.extend(source.snapshot()[:7])
+    bulk.extend(source.snapshot()[7:])
+
+    assert (single.snapshot() == bulk.snapshot()).all()
+
+
+def test_dataframe_view():
+    """DataFrame view renders addresses, protocols and flags"""
+    buffer = PacketRingBuffer(capacity=16)
+    _fill(buffer, 4)
+    df = buffer.to_dataframe()
+
+    assert list(df['protocol']) == ['TCP', 'UDP', 'ICMP', 'OTHER']
+    assert df['src_ip'].iloc[1] == '10.0.0.1'
+    assert df['src_ip'].isna().tolist() == [False, False, False, True]
+    assert df['flags'].iloc[0] == 'PA' and df['flags'].isna().sum() == 3
+    assert df['dst_port'].isna().tolist() == [False, False, True, True]
+    assert PacketRingBuffer(capacity=4).to_dataframe().empty
+
+
+def _check_sample_records(records):
+    assert records['protocol'].tolist() == [PROTO_TCP, PROTO_UDP, PROTO_ICMP, PROTO_NON_IP]
+    assert records['src_ip'][0] == ip_to_int('10.0.0.1')
+    assert records['dst_ip'][2] == ip_to_int('1.1.1.1')
+    assert records['src_port'][:2].tolist() == [1234, 53]
+    assert records['dst_port'][:2].tolist() == [443, 5353]
+    assert records['flags'][0] == encode_tcp_flags('PA')
+    assert records['length'].tolist() == [len(f) for f in SAMPLE_FRAMES]
+    assert records['timestamp'][1] == 1_700_000_001_500_000_000
+
+
+def test_pcap_reader(tmp_path):
+    """Classic pcap files decode into packet records"""
+    path = tmp_path / 'sample.pcap'
+    write_pcap(path, SAMPLE_FRAMES)
+    with PcapReader(str(path)) as reader:
+        assert reader.format == 'pcap'
+        _check_sample_records(reader.read_all())
+
+
+def test_pcapng_reader(tmp_path):
+    """pcapng enhanced packet blocks decode into packet records"""
+    path = tmp_path / 'sample.pcapng'
+    write_pcapng(path, SAMPLE_FRAMES)
+    with PcapReader(str(path)) as reader:
+        assert reader.format == 'pcapng'
+        batches = list(reader.read_batches(batch_size=3))
+    assert [len(b) for b in batches] == [3, 1]
+    _check_sample_records(np.concatenate(batches))
+
+
+def test_snaplen_capture_keeps_wire_lengths(tmp_path):
+    """Packets truncated by a snaplen replay with their original size"""
+    frames = [build_frame('10.0.0.1', '8.8.8.8', 6, 1234, 443, 0x18, payload=b'x' * 960),
+              build_frame('10.0.0.2', '8.8.4.4', 17, 53, 5353, payload=b'y' * 100)]
+    for name, writer in (('snap.pcap', write_pcap), ('snap.pcapng', write_pcapng)):
+        path = tmp_path / name
+        writer(path, frames, snaplen=54)
+        with PcapReader(str(path)) as reader:
+            records = reader.read_all()
+            _, offsets, caplens = next(reader.read_indexed_batches())
+        assert records['length'].tolist() == [len(f) for f in frames]
+        assert caplens.tolist() == [54, 54]
+        assert records['protocol'].tolist() == [PROTO_TCP, PROTO_UDP]
+        assert records['dst_port'].tolist() == [443, 5353]
+
+
+def test_pcap_replay_fills_stats(tmp_path):
+    """Replay mode fills the buffer and protocol counters"""
+    path = tmp_path / 'replay.pcap'
+    write_pcap(path, SAMPLE_FRAMES * 50)
+    capture = TrafficCapture(interface="lo", pcap_file=str(path))
+    capture.start_capture()
+    capture.capture_thread.join(timeout=10)
+
+    stats = capture.get_stats()
+    assert stats['total_packets'] == 200
+    assert stats['tcp_packets'] == stats['udp_packets'] == stats['icmp_packets'] == 50
+    assert len(capture.get_packets_df()) == 200
+
+
+def _replay_through_socketpair(capture, frames, bpf_program=None):
+    """Feed frames to the raw-socket reader through a datagram socketpair"""
+    reader_sock, writer_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    if bpf_program:
+        attach_bpf(reader_sock, bpf_program)
+    for frame in frames:
+        writer_sock.send(frame)
+    # Non-blocking reads end the loop once the queued frames are consumed
+    reader_sock.setblocking(False)
+    capture.is_capturing = True
+    capture.read_socket(reader_sock)
+    capture.is_capturing = False
+    reader_sock.close()
+    writer_sock.close()
+
+
+def _without_timestamps(records):
+    return [tuple(r)[1:] for r in records]
+
+
+def test_raw_socket_backend_matches_bulk_decoder():
+    """AF_PACKET frame parsing produces the same records as the pcap decoder"""
+    frames = SAMPLE_FRAMES + [
+        build_frame('172.16.0.9', '10.1.1.1', 6, 5555, 22, 0x02),
+        build_frame('172.16.0.9', '10.1.1.1', 47),
+    ]
+    capture = TrafficCapture(interface="lo", backend='af_packet')
+    before = time.time_ns()
+    _replay_through_socketpair(capture, frames)
+
+    data = np.frombuffer(b''.join(frames), dtype=np.uint8)
+    offsets = np.cumsum([0] + [len(f) for f in frames[:-1]])
+    expected = decode_frames(data, offsets, [len(f) for f in frames], 1, 0.0)
+
+    received = capture.packets.snapshot()
+    assert _without_timestamps(received) == _without_timestamps(expected)
+    # Kernel receive timestamps, taken when the frames were queued
+    assert (received['timestamp'] >= before).all() and (received['timestamp'] <= time.time_ns()).all()
+    stats = capture.get_stats()
+    assert stats['total_packets'] == 6
+    assert stats['tcp_packets'] == 2 and stats['other_packets'] == 1
+
+
+def test_raw_socket_backend_matches_scapy():
+    """AF_PACKET frame parsing produces the same records as Scapy dissection"""
+    scapy = pytest.importorskip('scapy.all')
+    raw_capture = TrafficCapture(interface="lo", backend='af_packet')
+    _replay_through_socketpair(raw_capture, SAMPLE_FRAMES)
+
+    scapy_capture = TrafficCapture(interface="lo")
+    for frame in SAMPLE_FRAMES:
+        scapy_capture.packet_callback(scapy.Ether(frame))
+
+    assert (_without_timestamps(raw_capture.packets.snapshot())
+            == _without_timestamps(scapy_capture.packets.snapshot()))
+    assert raw_capture.get_stats() == scapy_capture.get_stats()
+
+
+# Untagged frames only: Linux strips VLAN tags before socket filters run
+FILTER_FRAMES = [frame for frame in SAMPLE_FRAMES if frame[12:14] != b'\x81\x00'] + [
+    build_frame('10.0.0.3', '1.1.1.1', 1),
+    build_frame('10.1.2.3', '192.168.1.10', 6, 40000, 80, 0x02),
+    build_frame('192.168.1.10', '10.1.2.3', 6, 80, 40000, 0x12),
+    build_frame('172.16.5.5', '8.8.8.8', 17, 5000, 53),
+]
+
+
+def test_kernel_filter_matches_userspace_filter():
+    """Compiled BPF accepts exactly the records the userspace evaluator accepts"""
+    data = np.frombuffer(b''.join(FILTER_FRAMES), dtype=np.uint8)
+    offsets = np.cumsum([0] + [len(f) for f in FILTER_FRAMES[:-1]])
+    records = decode_frames(data, offsets, [len(f) for f in FILTER_FRAMES], 1, 0.0)
+
+    for expression in ['tcp or udp', 'not icmp', 'ip', 'tcp and dst port 80',
+                       'port 53 or src net 10.0.0.0/8', 'udp src port 5000',
+                       '!(host 8.8.8.8 || host 1.1.1.1)', 'tcp port 80 and dst host 10.1.2.3']:
+        capture_filter = CaptureFilter(expression)
+        capture = TrafficCapture(interface="lo", backend='af_packet')
+        _replay_through_socketpair(capture, FILTER_FRAMES, capture_filter.bpf_program())
+
+        expected = records[capture_filter.match(records)]
+        received = capture.packets.snapshot()
+        assert _without_timestamps(received) == _without_timestamps(expected), expression
+
+
+def test_filter_rejects_unsupported_syntax():
+    """Unsupported expressions raise FilterSyntaxError"""
+    for expression in ['', 'tcp port', 'ether host ff:ff:ff:ff:ff:ff', '(tcp', 'port 70000']:
+        with pytest.raises(FilterSyntaxError):
+            CaptureFilter(expression)
+
+
+def test_replay_filter_counters(tmp_path):
+    """Replay mode applies the filter and reports accept/drop counts"""
+    path = tmp_path / 'filtered.pcap'
+    write_pcap(path, SAMPLE_FRAMES * 10)
+    capture = TrafficCapture(interface="lo", pcap_file=str(path), capture_filter="tcp or udp")
+    capture.start_capture()
+    capture.capture_thread.join(timeout=10)
+
+    stats = capture.get_stats()
+    assert stats['filter_mode'] == 'userspace'
+    assert stats['filter_accepted'] == 20 and stats['filter_dropped'] == 20
+    assert stats['icmp_packets'] == 0 and stats['total_packets'] == 20
+
+
+def _packet_array(rows):
+    records = np.zeros(len(rows), dtype=PACKET_DTYPE)
+    for i, (ts, src, dst, sport, dport, protocol, flags, length) in enumerate(rows):
+        records[i] = (round(ts * 1e9), ip_to_int(src), ip_to_int(dst), sport, dport, protocol, flags, length)
+    return records
+
+
+def test_flow_table_bidirectional_aggregation():
+    """Both directions of a connection fold into one flow record"""
+    table = FlowTable(active_timeout=120, idle_timeout=15)
+    exported = table.update(_packet_array([
+        (0.0, '10.0.0.1', '10.0.0.2', 40000, 80, PROTO_TCP, 0x02, 60),
+        (0.1, '10.0.0.2', '10.0.0.1', 80, 40000, PROTO_TCP, 0x12, 60),
+        (0.3, '10.0.0.1', '10.0.0.2', 40000, 80, PROTO_TCP, 0x10, 1500),
+        (0.2, '10.0.0.5', '8.8.8.8', 5353, 53, PROTO_UDP, 0, 80),
+    ]))
+    assert len(exported) == 0 and len(table) == 2
+
+    flows = flows_to_dataframe(table.flush()).sort_values('timestamp')
+    tcp = flows.iloc[0]
+    assert (tcp['src_ip'], tcp['dst_ip'], tcp['dst_port']) == ('10.0.0.1', '10.0.0.2', 80)
+    assert tcp['packets'] == 3 and tcp['bytes'] == 1620
+    assert tcp['flags'] == 'SA'
+    assert abs(tcp['duration'] - 0.3) < 1e-9
+    assert abs(tcp['iat_mean'] - 0.15) < 1e-6
+    assert abs(tcp['iat_min'] - 0.1) < 1e-6 and abs(tcp['iat_max'] - 0.2) < 1e-6
+
+
+def test_flow_table_timeouts():
+    """Idle gaps split flows and active flows are exported after the active timeout"""
+    table = FlowTable(active_timeout=30, idle_timeout=5)
+    rows = [(t, '10.0.0.1', '10.0.0.2', 1000, 443, PROTO_TCP, 0x10, 100)
+            for t in (0, 1, 2, 20, 21)]
+    exported = table.update(_packet_array(rows))
+    assert exported['packets'].tolist() == [3]
+    assert len(table) == 1
+
+    exported = table.update(_packet_array([(60, '10.0.0.9', '10.0.0.8', 1, 2, PROTO_UDP, 0, 50)]))
+    assert exported['packets'].tolist() == [2]
+
+    long_lived = [(60 + t, '10.0.0.3', '10.0.0.4', 7, 8, PROTO_UDP, 0, 50) for t in range(0, 40, 2)]
+    exported = table.update(_packet_array(long_lived))
+    assert sorted(exported['packets'].tolist()) == [1, 20]
+    assert len(table) == 0
+
+
+def test_capture_flows_from_replay(tmp_path):
+    """TrafficCapture aggregates buffered packets into flows on demand"""
+    path = tmp_path / 'flows.pcap'
+    write_pcap(path, SAMPLE_FRAMES * 25)
+    capture = TrafficCapture(interface="lo", pcap_file=str(path))
+    capture.start_capture()
+    capture.capture_thread.join(timeout=10)
+
+    flows = capture.get_flows_df()
+    assert flows['packets'].sum() == 100
+    assert len(flows) < 100
+    assert {'packets', 'bytes', 'duration', 'iat_mean', 'iat_std'} <= set(flows.columns)
+
+
+def test_read_flows_since_yields_finished_flows_once():
+    """Open flows are held back until they finish, then read exactly once"""
+    capture = TrafficCapture(interface="lo", flow_idle_timeout=5)
+    long_lived = [(t, '10.0.0.1', '10.0.0.2', 1000, 443, PROTO_TCP, 0x10, 100) for t in (0, 3, 6)]
+    capture.packets.extend(_packet_array(long_lived[:2]))
+    flows, position = capture.read_flows_since(0)
+    assert len(flows) == 0 and len(capture.get_flows_df()) == 1
+
+    capture.packets.extend(_packet_array(long_lived[2:] + [
+        (8, '10.0.0.5', '8.8.8.8', 5353, 53, PROTO_UDP, 0, 80),
+        (20, '10.0.0.7', '10.0.0.8', 1, 2, PROTO_UDP, 0, 50),
+    ]))
+    flows, position = capture.read_flows_since(position)
+    flows = flows.sort_values('timestamp')
+    assert flows['packets'].tolist() == [3, 1]
+    assert flows['end_time'].tolist() == [6 * 10**9, 8 * 10**9]
+
+    flows, position = capture.read_flows_since(position)
+    assert len(flows) == 0
+
+
+def test_shared_ring_reports_overruns():
+    """The shared-memory ring reads like PacketRingBuffer and counts every packet"""
+    ring = SharedPacketRing(capacity=8)
+    try:
+        source = PacketRingBuffer(capacity=20)
+        _fill(source, 20)
+        records = source.snapshot()
+        ring.extend(records[:5])
+        batch, position, lost = ring.read_since(0)
+        assert position == 5 and lost == 0
+        assert np.array_equal(batch, records[:5])
+
+        ring.extend(records[5:])
+        batch, position, lost = ring.read_since(position)
+        assert position == 20 and lost == 7
+        assert np.array_equal(batch, records[-8:])
+        assert ring.protocol_counts().sum() == 20
+    finally:
+        ring.close()
+        ring.unlink()
+
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_PACKET') or os.geteuid() != 0,
+                    reason="needs AF_PACKET and root")
+def test_sharded_capture_on_loopback():
+    """Fanout shards split loopback traffic by flow and the parent merges it"""
+    port = 47731
+    capture = TrafficCapture(interface="lo", capture_filter=f"udp port {port}", shards=2)
+    capture.start_capture()
+    deadline = time.time() + 10
+    while capture._sharded is None or not capture._sharded.rings:
+        assert time.time() < deadline and capture.is_capturing
+        time.sleep(0.05)
+    time.sleep(0.5)
+
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(('127.0.0.1', port))
+    senders = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(16)]
+    for sender in senders:
+        for _ in range(5):
+            sender.sendto(b'x' * 32, ('127.0.0.1', port))
+    time.sleep(0.5)
+    capture.stop_capture()
+    for sock in senders + [receiver]:
+        sock.close()
+
+    packets = capture.get_packets_df()
+    stats = capture.get_stats()
+    # Loopback delivers each datagram to packet sockets twice (out and in)
+    assert len(packets) == stats['total_packets'] == 160
+    assert (packets['dst_port'] == port).all()
+    assert len(stats['shard_packets']) == 2 and min(stats['shard_packets']) > 0
+    assert packets['timestamp'].is_monotonic_increasing
+
+
+def _mixed_flows(count=2000):
+    records = np.zeros(count, dtype=PACKET_DTYPE)
+    records['timestamp'] = 1_700_000_000_000_000_000 + np.arange(count) * 1_000_000
+    records['src_ip'] = ip_to_int('10.0.0.1') + np.arange(count) % 50
+    records['dst_ip'] = ip_to_int('10.0.1.1')
+    records['src_port'] = 40000 + np.arange(count) % 7
+    records['dst_port'] = 443
+    records['protocol'] = np.where(np.arange(count) % 4 == 0, PROTO_UDP, PROTO_TCP)
+    records['length'] = 100
+    return records
+
+
+def test_load_shedder_modes():
+    """Each overload mode samples consistently and weights re-scale to the offered count"""
+    records = _mixed_flows()
+    for mode in OVERLOAD_MODES:
+        shedder = LoadShedder(mode, rate=10, reservoir_size=100, interval=0.5, lag_high=-1)
+        shedder.observe_lag(0.0)
+        assert shedder.active
+        kept, weights = shedder.sample(records)
+        assert 0 < len(kept) < len(records)
+        assert abs(weights.sum() - len(records)) < len(records) * 0.35, mode
+
+    # Flow hash sampling keeps both directions of a flow, the same way per packet and per batch
+    reverse = records.copy()
+    reverse['src_ip'], reverse['dst_ip'] = records['dst_ip'], records['src_ip']
+    reverse['src_port'], reverse['dst_port'] = records['dst_port'], records['src_port']
+    assert np.array_equal(flow_hashes(records), flow_hashes(reverse))
+    assert flow_hashes(records[:3]).tolist() == [flow_hash(*map(int, tuple(r)[1:6])) for r in records[:3]]
+
+    # Reservoir keeps at most reservoir_size packets per interval
+    shedder = LoadShedder('reservoir', reservoir_size=100, interval=0.5, lag_high=-1)
+    shedder.observe_lag(0.0)
+    kept, weights = shedder.sample(records)
+    windows = kept['timestamp'] // 500_000_000
+    assert np.bincount(windows - windows.min()).max() == 100
+    assert weights.sum() == len(records)
+
+
+def test_overload_sampling_rescales_stats(tmp_path):
+    """Sampled replay buffers a fraction of packets but reports estimated totals"""
+    path = tmp_path / 'burst.pcap'
+    write_pcap(path, SAMPLE_FRAMES * 50)
+    capture = TrafficCapture(interface="lo", pcap_file=str(path), overload_mode='systematic',
+                             overload_rate=10)
+    capture.shedder.lag_high = -1  # Force shedding on
+    capture.shedder.observe_lag(0.0)
+    capture.start_capture()
+    capture.capture_thread.join(timeout=10)
+
+    stats = capture.get_stats()
+    assert len(capture.get_packets_df()) == 20
+    assert stats['total_packets'] == 200
+    assert stats['sampled_packets'] == 20 and stats['shed_packets'] == 180
+
+    # Per-packet capture path: reservoir samples are released when the interval closes
+    capture = TrafficCapture(interface="lo", overload_mode='reservoir', overload_reservoir=5)
+    capture.shedder.lag_high = -1
+    for i in range(30):
+        assert capture._admit(i * 100_000_000)
+        capture._record_packet(i * 100_000_000, 1, 2, 3, 4, PROTO_TCP, 0, 60)
+    # Three one-second windows of ten packets; the last one is still open
+    assert len(capture.packets) == 10
+    assert capture.get_stats()['total_packets'] == 20
+
+
+def test_systematic_sampling_skips_decoding(monkeypatch):
+    """Frames shed in systematic mode are never decoded, yet still counted"""
+    decoded = []
+
+    def counting_decode(frame, length=None):
+        decoded.append(length)
+        return decode_frame(frame, length)
+
+    monkeypatch.setattr(traffic_capture, 'decode_frame', counting_decode)
+    capture = TrafficCapture(interface="lo", overload_mode='systematic', overload_rate=10)
+    capture.shedder.lag_high = capture.shedder.lag_low = -1  # Keep shedding on
+    frame = build_frame('10.0.0.1', '10.0.0.2', 17, 1000, 53)
+    for _ in range(100):
+        capture.frame_callback(frame, len(frame), time.time_ns())
+
+    assert len(decoded) == 10 and len(capture.packets) == 10
+    stats = capture.get_stats()
+    assert stats['total_packets'] == 100
+    assert stats['sampled_packets'] == 10 and stats['shed_packets'] == 90
+
+
+def test_pcap_ring_rotates_within_budget_and_extracts(tmp_path):
+    """The ring keeps the newest segments within budget and extracts via the index"""
+    writer = PcapRingWriter(str(tmp_path), segment_size=4096, max_bytes=16384)
+    base = 1_700_000_000_000_000_000
+    for i in range(400):
+        src = '10.9.9.9' if i == 390 else f"10.0.0.{i % 5}"
+        frame = build_frame(src, '10.0.1.1', 17, 1000 + i, 53)
+        writer.write(base + i * 10_000_000, frame, ip_to_int(src), ip_to_int('10.0.1.1'))
+        if i % 50 == 0:
+            writer.flush()
+    writer.close()
+
+    segments = sorted(tmp_path.glob('segment-*.pcap'))
+    assert sum(p.stat().st_size for p in segments) <= 16384
+    assert writer.written == 400
+
+    around = base + 390 * 10_000_000
+    assert len(candidate_segments(str(tmp_path), around, around, ip_to_int('10.9.9.9'))) == 1
+    output = tmp_path / 'incident.pcap'
+    records = extract_packets(str(tmp_path), around, window=0.05, entity='10.9.9.9',
+                              output=str(output))
+    assert records['src_port'].tolist() == [1390]
+    with PcapReader(str(output)) as reader:
+        assert np.array_equal(reader.read_all(), records)
+
+    nearby = extract_packets(str(tmp_path), around, window=0.05)
+    assert nearby['src_port'].tolist() == list(range(1385, 1396))
+    # The oldest packets were rotated out
+    assert len(extract_packets(str(tmp_path), base, window=0.1)) == 0
+
+
+def test_capture_writes_raw_frames_to_pcap_ring(tmp_path):
+    """Live frames are kept on disk and can be pulled back by address"""
+    capture = TrafficCapture(interface="lo", backend='af_packet', pcap_ring_dir=str(tmp_path))
+    capture._open_pcap_ring()
+    _replay_through_socketpair(capture, SAMPLE_FRAMES)
+    records = capture.extract_packets(time.time_ns(), window=60, entity='1.1.1.1',
+                                      output=str(tmp_path / 'out.pcap'))
+    capture.stop_capture()
+
+    assert records['protocol'].tolist() == [PROTO_ICMP]
+    with PcapReader(str(tmp_path / 'out.pcap')) as reader:
+        assert _without_timestamps(reader.read_all()) == _without_timestamps(records)
@@ -0,0 +1,522 @@
+"""
+GuardELNS Detection Tests
+Feature extraction and model scoring checks
+"""
+
+import sys
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import IsolationForest
+from sklearn.neighbors import LocalOutlierFactor
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.detection.features import extract_features, local_timezone
+from src.detection.streaming import HalfSpaceTrees
+from src.detection.retrain import RetrainScheduler
+from src.detection.compiled_forest import CompiledIsolationForest
+from src.detection.neighbors import IndexedLOF
+from src.detection.sgd_ocsvm import ApproximateOneClassSVM
+from src.detection.drift import DriftMonitor
+from src.detection.anomaly_detector import AnomalyDetector, SKLEARN_MODELS
+from src.detection.ensemble import EnsembleDetector
+
+
+def _packets_frame():
+    return pd.DataFrame({
+        'timestamp': [1_700_000_000_000_000_000, 1_700_000_061_000_000_000, 1_700_003_600_000_000_000],
+        'src_ip': ['10.0.0.7', None, '192.168.1.254'],
+        'dst_ip': pd.Categorical(['8.8.8.8', '10.0.0.12', '8.8.8.8']),
+        'src_port': pd.array([1234, None, 53], dtype='UInt16'),
+        'dst_port': [443.0, np.nan, 5353.0],
+        'protocol': ['TCP', 'OTHER', 'UDP'],
+        'length': np.array([60, 1500, 90], dtype=np.uint16),
+    })
+
+
+def test_extract_features_values():
+    """Vectorized features match the per-row definitions"""
+    df = _packets_frame()
+    original = df.copy()
+    matrix, names = extract_features(df)
+
+    assert matrix.dtype == np.float32 and matrix.shape == (3, len(names))
+    column = {name: matrix[:, i].tolist() for i, name in enumerate(names)}
+    assert column['length'] == [60, 1500, 90]
+    assert column['src_port'] == [1234, 0, 53]
+    assert column['dst_port'] == [443, 0, 5353]
+    assert column['protocol'] == [0, 3, 1]
+    assert column['src_ip_last_octet'] == [7, 0, 254]
+    assert column['dst_ip_last_octet'] == [8, 12, 8]
+
+    expected = [(ts // 10**9 + time.localtime(ts // 10**9).tm_gmtoff) % 86400
+                for ts in df['timestamp']]
+    assert column['hour'] == [s // 3600 for s in expected]
+    assert column['minute'] == [s // 60 % 60 for s in expected]
+    assert column['second'] == [s % 60 for s in expected]
+    pd.testing.assert_frame_equal(df, original)
+
+
+def test_extract_features_hour_follows_dst(monkeypatch):
+    """Each timestamp uses the UTC offset in force at that moment, not today's"""
+    monkeypatch.setenv('TZ', 'Europe/Berlin')
+    local_timezone.cache_clear()
+    try:
+        # 10:00 UTC in January (CET, +1) and in July (CEST, +2)
+        df = pd.DataFrame({
+            'timestamp': [1_704_103_200_000_000_000, 1_719_828_000_000_000_000],
+            'src_port': [1, 2], 'dst_port': [3, 4], 'protocol': ['TCP', 'UDP'], 'length': [60, 60]
+        })
+        matrix, names = extract_features(df)
+        assert matrix[:, names.index('hour')].tolist() == [11, 12]
+    finally:
+        monkeypatch.undo()
+        local_timezone.cache_clear()
+
+
+def test_extract_features_reuses_buffer():
+    """A large enough preallocated matrix is filled in place"""
+    df = _packets_frame()
+    buffer = np.zeros((10, 9), dtype=np.float32)
+    matrix, names = extract_features(df, out=buffer)
+    assert len(names) == 9 and np.shares_memory(matrix, buffer)
+    assert np.array_equal(matrix, extract_features(df)[0])
+    assert extract_features(df.iloc[:0])[0].shape == (0, 9)
+
+
+def test_half_space_trees_flags_outliers():
+    """Points far from the reference window score below the threshold"""
+    rng = np.random.default_rng(0)
+    model = HalfSpaceTrees(contamination=0.05).fit(rng.normal(size=(2000, 4)))
+    inliers = model.predict(rng.normal(size=(500, 4)))
+    outliers = model.predict(rng.normal(size=(20, 4)) + 8)
+    assert (inliers == -1).mean() < 0.15
+    assert (outliers == -1).all()
+
+
+def test_half_space_trees_partial_fit_follows_drift():
+    """Windows rotate in bounded memory and the profile moves with the traffic"""
+    rng = np.random.default_rng(1)
+    model = HalfSpaceTrees(window_size=200).fit(rng.normal(size=(1000, 4)))
+    shifted = rng.normal(size=(500, 4)) + 6
+    assert (model.predict(shifted) == -1).mean() > 0.9
+
+    nodes = model.reference_.shape
+    for _ in range(10):
+        model.partial_fit(rng.normal(size=(70, 4)) + 6)
+    assert model.reference_.shape == nodes and model.samples_seen_ == 1700
+    assert model.latest_.sum() == 100 * model.n_trees * (model.depth + 1)
+    assert (model.predict(shifted) == -1).mean() < 0.2
+
+
+def test_approximate_ocsvm_flags_shifted_points():
+    """Nystroem + SGD one-class SVM separates shifted points from the training cloud"""
+    rng = np.random.default_rng(14)
+    model = ApproximateOneClassSVM(nu=0.05, gamma=0.25).fit(rng.normal(size=(3000, 4)))
+    assert (model.predict(rng.normal(size=(500, 4))) == -1).mean() < 0.2
+    assert (model.predict(rng.normal(size=(50, 4)) + 6) == -1).all()
+
+
+def test_approximate_ocsvm_small_fit_and_partial_fit():
+    """Fewer rows than components fit in chunks; partial_fit keeps the feature map"""
+    rng = np.random.default_rng(15)
+    model = ApproximateOneClassSVM(n_components=300, chunk_size=32).fit(rng.normal(size=(100, 4)))
+    feature_map = model.feature_map_
+    components = feature_map.components_.copy()
+    assert components.shape == (100, 4)
+    assert model.decision_function(rng.normal(size=(5, 4))).shape == (5,)
+
+    model.partial_fit(rng.normal(size=(70, 4)))
+    assert model.feature_map_ is feature_map
+    assert np.array_equal(model.feature_map_.components_, components)
+
+
+def test_ocsvm_sgd_detector_trains_and_scores():
+    """The ocsvm_sgd model type trains and flags oversized packets through AnomalyDetector"""
+    rng = np.random.default_rng(16)
+    detector = AnomalyDetector('ocsvm_sgd', contamination=0.05)
+    assert detector.train(_traffic_frame(rng, 2000))
+    predictions, _, scores = detector.score_batch(_traffic_frame(rng, 50, length_mean=5000.0))
+    assert len(predictions) == 50 and predictions.mean() > 0.9 and scores.min() > 0.9
+
+
+class _CountingDetector:
+    """Stand-in with the AnomalyDetector interface the scheduler relies on"""
+
+    def __init__(self, model_type='isolation_forest', contamination=0.1, threshold=None):
+        self.model_type = model_type
+        self.contamination = contamination
+        self.threshold = threshold
+        self.is_trained = False
+        self.trained_rows = 0
+
+    def clone(self):
+        return _CountingDetector(self.model_type, self.contamination, self.threshold)
+
+    def train(self, df, threads=None):
+        self.trained_rows = len(df)
+        self.is_trained = True
+        return True
+
+
+def test_retrain_scheduler_swaps_and_skips_unchanged_data():
+    """A fresh detector replaces the old one only when enough rows are new"""
+    frame = {'df': pd.DataFrame({'timestamp': np.arange(200)})}
+    original = _CountingDetector(contamination=0.2)
+    scheduler = RetrainScheduler(original, lambda: frame['df'], min_new_fraction=0.25)
+
+    assert scheduler.retrain_now()
+    swapped = scheduler.detector
+    assert swapped is not original and not original.is_trained
+    assert swapped.trained_rows == 200 and swapped.contamination == 0.2
+
+    frame['df'] = pd.DataFrame({'timestamp': np.arange(20, 220)})
+    assert not scheduler.retrain_now() and scheduler.detector is swapped
+    assert scheduler.retrain_now(force=True) and scheduler.detector is not swapped
+
+    frame['df'] = pd.DataFrame({'timestamp': np.arange(100, 300)})
+    assert scheduler.retrain_now()
+    assert scheduler.stats()['retrains'] == 3 and scheduler.skipped == 1
+
+
+def test_retrain_scheduler_background_trigger():
+    """trigger() retrains on the worker thread without waiting for the interval"""
+    frame = pd.DataFrame({'timestamp': np.arange(500)})
+    scheduler = RetrainScheduler(_CountingDetector(), lambda: frame, interval=3600)
+    scheduler.start()
+    try:
+        scheduler.trigger()
+        deadline = time.time() + 5
+        while scheduler.retrains == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        assert scheduler.detector.is_trained
+    finally:
+        scheduler.stop()
+
+
+def _traffic_features(rng, rows, length_mean=500.0, hour=None):
+    return np.column_stack([
+        rng.normal(length_mean, 100, rows),
+        rng.choice([53, 80, 443], rows, p=[0.2, 0.3, 0.5]),
+        rng.integers(0, 24, rows) if hour is None else np.full(rows, hour),
+    ])
+
+
+def test_drift_monitor_flags_shifted_feature():
+    """Stable traffic and clock changes are not drift; a shifted feature is"""
+    rng = np.random.default_rng(4)
+    monitor = DriftMonitor(min_samples=500, window=2000)
+    monitor.fit(_traffic_features(rng, 5000), ['length', 'dst_port', 'hour'])
+
+    monitor.update(_traffic_features(rng, 300))
+    assert not monitor.ready and not monitor.drifted
+    monitor.update(_traffic_features(rng, 3000, hour=3))
+    assert monitor.ready and not monitor.drifted
+    assert monitor.samples == pytest.approx(2000)
+
+    monitor.update(_traffic_features(rng, 2000, length_mean=800.0))
+    assert monitor.drifted and monitor.stats()['drift_feature'] == 'length'
+
+
+def test_scoring_leaves_drift_to_the_caller():
+    """Rescoring a window does not count its rows again in the live histogram"""
+    rng = np.random.default_rng(17)
+    detector = AnomalyDetector('isolation_forest')
+    assert detector.train(_traffic_frame(rng, 1000))
+    df = _traffic_frame(rng, 600)
+    for _ in range(3):
+        detector.score_batch(df)
+    assert detector.drift.samples == 0
+    detector.drift.update(extract_features(df)[0])
+    assert detector.drift.samples == 600 and detector.drift.ready
+
+
+def test_retrain_scheduler_waits_for_drift():
+    """Scheduled retrains are skipped until the detector's features drift"""
+    rng = np.random.default_rng(5)
+    detector = _CountingDetector()
+    detector.drift = DriftMonitor(min_samples=500).fit(_traffic_features(rng, 5000),
+                                                       ['length', 'dst_port', 'hour'])
+    scheduler = RetrainScheduler(detector, lambda: pd.DataFrame(), interval=0)
+    assert scheduler._due()  # No verdict before enough traffic: fall back to the timer
+
+    detector.drift.update(_traffic_features(rng, 1000))
+    assert not scheduler._due() and scheduler.stable_skips == 1
+    detector.drift.update(_traffic_features(rng, 3000, length_mean=800.0))
+    assert scheduler._due()
+    # Drift does not wait for the interval
+    assert RetrainScheduler(detector, lambda: pd.DataFrame(), interval=3600)._due()
+
+
+def test_compiled_isolation_forest_matches_sklearn():
+    """Flat-array inference reproduces decision_function bit for bit"""
+    rng = np.random.default_rng(2)
+    train = rng.normal(size=(3000, 6))
+    batch = np.vstack([rng.normal(size=(700, 6)) * 2, train[:5]])
+    for options in ({}, {'max_features': 0.5}, {'max_samples': 16, 'contamination': 'auto'}):
+        model = IsolationForest(random_state=42, **options).fit(train)
+        engine = CompiledIsolationForest.from_sklearn(model)
+        assert np.array_equal(engine.decision_function(batch), model.decision_function(batch))
+        assert np.array_equal(engine.decision_function(batch[:1]), model.decision_function(batch[:1]))
+        assert np.array_equal(engine.predict(batch), model.predict(batch))
+
+
+def test_indexed_lof_matches_sklearn():
+    """Exact indexes reproduce LocalOutlierFactor novelty scores"""
+    rng = np.random.default_rng(3)
+    train = rng.normal(size=(2000, 5))
+    batch = np.vstack([rng.normal(size=(300, 5)) * 2, train[:5]])
+    reference = LocalOutlierFactor(n_neighbors=20, contamination=0.1, novelty=True).fit(train)
+    for index in ('kd_tree', 'ball_tree', 'brute'):
+        model = IndexedLOF(n_neighbors=20, contamination=0.1, index=index).fit(train)
+        assert np.allclose(model.score_samples(batch), reference.score_samples(batch))
+        assert np.array_equal(model.predict(batch), reference.predict(batch))
+
+    approximate = IndexedLOF(index='random_projection', n_trees=8, leaf_size=32).fit(train)
+    assert np.mean(approximate.predict(batch) == reference.predict(batch)) > 0.9
+
+
+@pytest.mark.parametrize('rows, params', [
+    (1100, {'n_trees': 1}),
+    (5000, {'n_trees': 4, 'leaf_size': 8}),
+    (5000, {'n_trees': 3, 'leaf_size': 10}),
+])
+def test_random_projection_short_candidate_lists(rows, params):
+    """Queries left with fewer than k candidates fall back to exact search"""
+    rng = np.random.default_rng(5)
+    train = rng.normal(size=(rows, 5))
+    batch = rng.normal(size=(300, 5))
+    model = IndexedLOF(index='random_projection', **params).fit(train)
+    distances, indices = model.index_.query(batch, 21)
+    assert (indices >= 0).all() and np.isfinite(distances).all()
+    assert np.isfinite(model.negative_outlier_factor_).all()
+    assert np.isfinite(model.score_samples(batch)).all()
+
+    with pytest.raises(ValueError):
+        IndexedLOF(index='random_projection', n_trees=2, leaf_size=8).fit(train)
+
+
+def _traffic_frame(rng, rows, length_mean=500.0):
+    return pd.DataFrame({
+        'timestamp': 1_700_000_000_000_000_000 + np.arange(rows, dtype=np.int64) * 10**7,
+        'src_ip': rng.choice(['10.0.0.1', '10.0.0.2', '10.0.0.3'], rows),
+        'dst_ip': rng.choice(['8.8.8.8', '1.1.1.1'], rows),
+        'src_port': rng.integers(1024, 65535, rows),
+        'dst_port': rng.choice([53, 80, 443], rows),
+        'protocol': rng.choice(['TCP', 'UDP'], rows),
+        'length': rng.normal(length_mean, 100, rows).clip(40, 1500),
+    })
+
+
+@pytest.mark.parametrize('model_type', SKLEARN_MODELS)
+def test_score_batch_matches_separate_model_calls(model_type):
+    """One score_batch pass gives the labels and scores of separate predict/score calls"""
+    rng = np.random.default_rng(6)
+    detector = AnomalyDetector(model_type, contamination=0.1)
+    assert detector.train(_traffic_frame(rng, 1000))
+    df = pd.concat([_traffic_frame(rng, 200), _traffic_frame(rng, 20, length_mean=5000.0)])
+
+    predictions, raw_scores, scores = detector.score_batch(df)
+    X_scaled = detector.scaler.transform(extract_features(df)[0])
+    assert np.allclose(raw_scores, detector.model.decision_function(X_scaled))
+    assert np.array_equal(predictions, (detector.model.predict(X_scaled) == -1).astype(int))
+    assert np.array_equal(scores, detector.calibrated_scores(raw_scores))
+    assert np.array_equal(detector.predict(df), predictions)
+    assert np.array_equal(detector.get_anomaly_scores(df), scores)
+
+
+def test_calibrated_scores_do_not_depend_on_the_batch(tmp_path):
+    """A packet scores the same alone or in a batch, and the table survives save/load"""
+    rng = np.random.default_rng(7)
+    detector = AnomalyDetector('isolation_forest', contamination=0.1)
+    assert detector.train(_traffic_frame(rng, 1000))
+    df = pd.concat([_traffic_frame(rng, 200), _traffic_frame(rng, 5, length_mean=5000.0)])
+
+    scores = detector.get_anomaly_scores(df)
+    assert scores.min() >= 0 and scores.max() <= 1
+    alone = [detector.get_anomaly_scores(df.iloc[[i]])[0] for i in (0, 100, 204)]
+    assert alone == [scores[0], scores[100], scores[204]]
+    # Per-batch min-max scaling used to put a lone packet at 0
+    assert alone[-1] > 0.95
+
+    path = str(tmp_path / 'model.pkl')
+    assert detector.save_model(path)
+    loaded = AnomalyDetector('isolation_forest')
+    assert loaded.load_model(path)
+    assert np.array_equal(loaded.calibration, detector.calibration)
+    assert np.array_equal(loaded.get_anomaly_scores(df), scores)
+
+
+def test_threshold_sets_predictions_from_calibrated_scores():
+    """With a threshold, anomalies are the scores at or above it"""
+    rng = np.random.default_rng(8)
+    train, df = _traffic_frame(rng, 1000), _traffic_frame(rng, 500)
+    flagged = []
+    for threshold in (0.5, 0.99):
+        detector = AnomalyDetector('isolation_forest', contamination=0.1, threshold=threshold)
+        assert detector.train(train)
+        predictions, _, scores = detector.score_batch(df)
+        assert np.array_equal(predictions, (scores >= threshold).astype(int))
+        flagged.append(predictions.mean())
+    assert flagged[0] == pytest.approx(0.5, abs=0.1) and flagged[1] < 0.05
+
+
+def test_compile_falls_back_when_sklearn_internals_change(monkeypatch):
+    """Missing private scikit-learn attributes or modules leave sklearn inference in place"""
+    rng = np.random.default_rng(9)
+    train, df = _traffic_frame(rng, 500), _traffic_frame(rng, 100)
+    reference = AnomalyDetector('isolation_forest')
+    assert reference.train(train) and reference.compiled is not None
+
+    def renamed(model):
+        raise AttributeError("'IsolationForest' object has no attribute '_decision_path_lengths'")
+
+    monkeypatch.setattr(CompiledIsolationForest, 'from_sklearn', staticmethod(renamed))
+    detector = AnomalyDetector('isolation_forest')
+    assert detector.train(train) and detector.compiled is None
+    assert np.allclose(detector.score_batch(df)[1], reference.score_batch(df)[1])
+
+    monkeypatch.setitem(sys.modules, 'src.detection.compiled_forest', None)
+    detector = AnomalyDetector('isolation_forest')
+    assert detector.train(train) and detector.compiled is None
+
+
+ENSEMBLE_MEMBERS = ('isolation_forest', 'lof')
+
+
+@pytest.fixture(scope='module')
+def ensemble_pools():
+    """Member worker processes shared by the ensemble tests (spawning is slow)"""
+    pools = {}
+    yield pools
+    # Wait for the workers to exit so they cannot disturb later capture tests
+    for pool in pools.values():
+        pool.shutdown(wait=True)
+
+
+def _ensemble(pools, **options):
+    options.setdefault('latency_budget', 60)
+    return EnsembleDetector(ENSEMBLE_MEMBERS, contamination=0.1, pools=pools, **options)
+
+
+def test_ensemble_fuses_member_calibrated_scores(ensemble_pools):
+    """rank averages and max takes the members' calibrated scores, then recalibrates"""
+    rng = np.random.default_rng(10)
+    train = _traffic_frame(rng, 1000)
+    df = pd.concat([_traffic_frame(rng, 200), _traffic_frame(rng, 10, length_mean=5000.0)])
+    features = extract_features(df)[0]
+    member_scores = []
+    for member in ENSEMBLE_MEMBERS:
+        detector = AnomalyDetector(member, contamination=0.1)
+        assert detector.train(train)
+        member_scores.append(detector.score_features(features)[2])
+    member_scores = np.column_stack(member_scores)
+
+    for fusion, expected in (('rank', member_scores.mean(axis=1)), ('max', member_scores.max(axis=1))):
+        ensemble = _ensemble(ensemble_pools, fusion=fusion)
+        assert ensemble.train(train) and ensemble.active == list(ENSEMBLE_MEMBERS)
+        predictions, raw_scores, scores = ensemble.score_batch(df)
+        assert np.allclose(raw_scores, expected)
+        assert np.array_equal(scores, np.interp(raw_scores, ensemble._calibration(ENSEMBLE_MEMBERS),
+                                                np.linspace(0, 1, 1001)))
+        assert np.array_equal(predictions, (scores >= 0.9).astype(int))
+        assert predictions[-10:].all()
+
+
+def test_ensemble_skips_then_drops_a_slow_member(ensemble_pools):
+    """A member past its budget is left out, then dropped; results keep their length"""
+    rng = np.random.default_rng(11)
+    # LOF needs well over 5 ms for this batch
+    train, df = _traffic_frame(rng, 1000), _traffic_frame(rng, 20000)
+    ensemble = _ensemble(ensemble_pools, latency_budget={'isolation_forest': 60, 'lof': 0.005},
+                         max_overruns=2)
+    assert ensemble.train(train)
+
+    for batch in range(3):
+        predictions, raw_scores, scores = ensemble.score_batch(df)
+        assert len(predictions) == len(raw_scores) == len(scores) == len(df)
+        assert ensemble.overruns['lof'] == min(batch + 1, 2)
+        assert ensemble.active == (list(ENSEMBLE_MEMBERS) if batch == 0 else ['isolation_forest'])
+    alone = AnomalyDetector('isolation_forest', contamination=0.1)
+    assert alone.train(train)
+    assert np.allclose(raw_scores, alone.score_batch(df)[2])
+
+
+def test_ensemble_keeps_one_member_when_all_are_late(ensemble_pools):
+    """With every member over budget the first answer is used and never counted as a miss"""
+    rng = np.random.default_rng(12)
+    train, df = _traffic_frame(rng, 1000), _traffic_frame(rng, 20000)
+    ensemble = _ensemble(ensemble_pools, latency_budget=0.001, max_overruns=1)
+    assert ensemble.train(train)
+
+    for _ in range(3):
+        predictions, raw_scores, scores = ensemble.score_batch(df)
+        assert len(predictions) == len(raw_scores) == len(scores) == len(df)
+        assert len(ensemble.active) == 1 and ensemble.is_trained
+        assert ensemble.overruns[ensemble.active[0]] == 0
+
+
+def test_ensemble_workers_do_not_inherit_retrain_priority():
+    """Member processes start with the creator's priority even if a niced thread trains first"""
+    rng = np.random.default_rng(18)
+    ensemble = EnsembleDetector(('isolation_forest',), latency_budget=60)
+    try:
+        frame = _traffic_frame(rng, 500)
+        scheduler = RetrainScheduler(ensemble, lambda: frame, threads=1, nice=5)
+        result = {}
+
+        def retrain():
+            scheduler._lower_priority()
+            result['swapped'] = scheduler.retrain_now()
+
+        worker = threading.Thread(target=retrain)
+        worker.start()
+        worker.join(60)
+        assert result['swapped'] and scheduler.detector.is_trained
+        pids = list(ensemble.pools['isolation_forest']._processes)
+        assert pids and all(os.getpriority(os.PRIO_PROCESS, pid) == os.getpriority(os.PRIO_PROCESS, 0)
+                            for pid in pids)
+    finally:
+        for pool in ensemble.pools.values():
+            pool.shutdown(wait=True)
+
+
+def test_ensemble_clones_share_pools_across_generations(ensemble_pools):
+    """A clone trains a new generation in the same workers; the previous one keeps scoring"""
+    rng = np.random.default_rng(13)
+    train, df = _traffic_frame(rng, 1000), _traffic_frame(rng, 100)
+    first = _ensemble(ensemble_pools)
+    assert first.train(train)
+    second = first.clone()
+    assert second.pools is first.pools and second.generation > first.generation
+    assert second.train(_traffic_frame(rng, 1000, length_mean=800.0))
+    assert len(ensemble_pools) == len(ENSEMBLE_MEMBERS)
+    assert len(first.score_batch(df)[0]) == len(second.score_batch(df)[0]) == len(df)
+    assert not np.allclose(first.score_batch(df)[1], second.score_batch(df)[1])
+
+    # Two generations on, the first is gone from the workers: nothing answers
+    third = second.clone()
+    assert third.train(train)
+    predictions, _, _ = first.score_batch(df)
+    assert len(predictions) == len(df) and not first.is_trained
+
+
+@pytest.mark.parametrize('model_type', ['ocsvm_sgd', 'hst'])
+def test_partial_fit_keeps_flag_rate_at_threshold(model_type):
+    """Online updates recalibrate, so stationary traffic stays flagged at about 1 - threshold"""
+    rng = np.random.default_rng(19)
+
+    def frame(rows):
+        df = _traffic_frame(rng, rows)
+        df['timestamp'] = 1_700_000_000_000_000_000 + rng.integers(0, 3600 * 10**9, rows)
+        return df
+
+    detector = AnomalyDetector(model_type, contamination=0.1, threshold=0.9)
+    assert detector.train(frame(5000))
+    for _ in range(20):
+        assert detector.partial_fit(frame(500))
+    assert len(detector.calibration_rows) == 10000
+    assert detector.predict(frame(5000)).mean() == pytest.approx(0.1, abs=0.015)
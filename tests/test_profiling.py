@@ -0,0 +1,175 @@
+"""
+GuardELNS Profiling Tests
+Risk engine aggregation checks
+"""
+
+import sys
+import os
+import numpy as np
+import pandas as pd
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.profiling.risk_engine import RiskEngine
+
+
+def _traffic_frame(rows=400, seed=0):
+    rng = np.random.default_rng(seed)
+    hosts = [f'10.0.0.{i}' for i in range(1, 9)]
+    df = pd.DataFrame({
+        'src_ip': rng.choice(hosts, rows).astype(object),
+        'dst_ip': rng.choice(hosts + ['8.8.8.8'], rows).astype(object),
+        'protocol': rng.choice(['TCP', 'UDP', 'ICMP'], rows),
+        'dst_port': rng.choice([22, 53, 80, 443, 8080], rows),
+    })
+    df.loc[::37, 'src_ip'] = None
+    # A non-range index: predictions must still be matched by position
+    df.index = rng.permutation(rows) * 3 + 1000
+    return df, (rng.random(rows) < 0.2).astype(int)
+
+
+def _per_event_profiles(df, predictions):
+    """(events, anomalies, behaviours, score) per entity, one event at a time"""
+    profiles = {}
+    for position, row in enumerate(df.to_dict('records')):
+        for column in ('src_ip', 'dst_ip'):
+            if pd.notna(row[column]):
+                events, anomalies, behaviors, _ = profiles.get(row[column], (0, 0, set(), 0))
+                events += 1
+                anomalies += int(predictions[position] == 1)
+                behaviors |= {f"protocol_{row['protocol']}", f"port_{row['dst_port']}"}
+                score = min(anomalies / events * 100 + (10 if len(behaviors) > 10 else 0)
+                            + min(events / 1000, 1.0) * 10, 100)
+                profiles[row[column]] = (events, anomalies, behaviors, score)
+    return profiles
+
+
+def test_update_from_traffic_matches_per_event_updates():
+    """Batch aggregation gives the same profiles as per-event updates"""
+    df, predictions = _traffic_frame()
+    engine = RiskEngine()
+    engine.update_from_traffic(df.iloc[:250], predictions[:250])
+    engine.update_from_traffic(df.iloc[250:], predictions[250:])
+
+    expected = _per_event_profiles(df, predictions)
+    assert set(engine.profiles) == set(expected)
+    for entity, (events, anomalies, behaviors, score) in expected.items():
+        profile = engine.profiles[entity]
+        assert (profile.total_events, profile.anomaly_count) == (events, anomalies)
+        assert profile.risk_factors['behavior_diversity'] == len(behaviors)
+        assert profile.risk_score == score
+    assert len(engine.history) == 2
+
+
+def test_profile_store_views_and_removal():
+    """Profiles stay addressable by id after rows move and the store grows"""
+    df, predictions = _traffic_frame(rows=3000, seed=2)
+    df['src_ip'] = [f'172.16.{i % 40}.{i % 250}' for i in range(len(df))]
+    engine = RiskEngine()
+    engine.update_from_traffic(df, predictions)
+    before = {entity: engine.get_profile(entity) for entity in engine.profiles}
+    assert len(before) > engine.profiles.capacity // 2
+
+    removed = list(before)[:5]
+    for entity in removed:
+        assert engine.reset_profile(entity)
+    assert not engine.reset_profile(removed[0]) and engine.get_profile(removed[0]) is None
+    for entity in engine.profiles:
+        assert engine.get_profile(entity) == before[entity]
+
+    stats = engine.get_statistics()
+    assert stats['total_entities'] == len(before) - 5
+    assert stats['high_risk'] + stats['medium_risk'] + stats['low_risk'] == stats['total_entities']
+    high = engine.get_high_risk_entities(threshold=20)
+    assert [p['risk_score'] for p in high] == sorted((p['risk_score'] for p in high), reverse=True)
+    assert len(high) == sum(p['risk_score'] >= 20 for p in before.values() if p['entity_id'] not in removed)
+
+    profile = engine.get_or_create_profile('10.9.9.9')
+    profile.update({'protocol': 'TCP', 'dst_port': 22}, is_anomaly=True)
+    assert profile.risk_score == 100.0 and profile.get_risk_level() == 'HIGH'
+
+
+def test_update_from_traffic_short_predictions():
+    """Rows beyond the predictions count as normal events"""
+    df, _ = _traffic_frame(rows=50, seed=1)
+    engine = RiskEngine()
+    engine.update_from_traffic(df, np.ones(10, dtype=int))
+    assert sum(p.anomaly_count for p in engine.profiles.values()) == (
+        df.iloc[:10][['src_ip', 'dst_ip']].notna().to_numpy().sum())
+    assert sum(p.total_events for p in engine.profiles.values()) == (
+        df[['src_ip', 'dst_ip']].notna().to_numpy().sum())
+
+
+def test_statistics_track_incremental_changes():
+    """Running level counts, mean and min/max match a full scan after every change"""
+    rng = np.random.default_rng(3)
+    engine = RiskEngine()
+    for batch in range(12):
+        df, predictions = _traffic_frame(rows=200, seed=10 + batch)
+        df['dst_ip'] = [f'192.168.{batch}.{i % 30}' for i in range(len(df))]
+        engine.update_from_traffic(df, (rng.random(len(df)) < rng.random()).astype(int))
+        scores = np.array([profile.risk_score for profile in engine.profiles.values()])
+        assert engine.history[-1]['avg_risk_score'] == pytest.approx(scores.mean())
+        for entity in rng.choice(list(engine.profiles), 3, replace=False):
+            engine.reset_profile(entity)
+
+        profiles = engine.get_all_profiles()
+        scores = np.array([engine.profiles[p['entity_id']].risk_score for p in profiles])
+        levels = [p['risk_level'] for p in profiles]
+        stats = engine.get_statistics()
+        assert stats['total_entities'] == len(profiles)
+        assert (stats['high_risk'], stats['medium_risk'], stats['low_risk']) == (
+            levels.count('HIGH'), levels.count('MEDIUM'), levels.count('LOW'))
+        assert stats['max_risk_score'] == round(scores.max(), 2)
+        assert stats['min_risk_score'] == round(scores.min(), 2)
+        assert stats['avg_risk_score'] == round(scores.mean(), 2)
+
+
+def test_ranked_queries_match_full_sort():
+    """top_k and above return the same entities as sorting every profile"""
+    rng = np.random.default_rng(4)
+    engine = RiskEngine()
+    assert engine.top_k(5) == [] and engine.above(0) == []
+    for batch in range(6):
+        df, _ = _traffic_frame(rows=300, seed=20 + batch)
+        df['dst_ip'] = [f'172.20.{batch}.{i % 60}' for i in range(len(df))]
+        engine.update_from_traffic(df, (rng.random(len(df)) < 0.3).astype(int))
+        engine.reset_profile(next(iter(engine.profiles)))
+
+        scores = {entity: profile.risk_score for entity, profile in engine.profiles.items()}
+        ranked = sorted(scores.values(), reverse=True)
+        top = engine.top_k(10)
+        assert [scores[p['entity_id']] for p in top] == ranked[:10]
+        for threshold in (0, 20, 35.5, 101):
+            above = engine.above(threshold)
+            assert [scores[p['entity_id']] for p in above] == [s for s in ranked if s >= threshold]
+        assert len(engine.above(20, limit=3)) == min(3, sum(s >= 20 for s in ranked))
+
+
+def test_decayed_scores_fade_lazily():
+    """Past anomalies fade with the half-life; idle rows decay only when read"""
+    engine = RiskEngine(half_life=3600)
+    noisy = pd.DataFrame({'src_ip': ['10.0.0.1'] * 20 + ['10.0.0.2'] * 20,
+                          'dst_ip': [None] * 40, 'protocol': 'TCP', 'dst_port': 443})
+    engine.update_from_traffic(noisy, np.r_[np.ones(20), np.zeros(20)].astype(int))
+    assert engine.top_k(1)[0]['entity_id'] == '10.0.0.1'
+    assert engine.profiles['10.0.0.1'].get_risk_level() == 'HIGH'
+
+    # Four half-lives pass: 20 events decay to 1.25, 20 anomalies to 1.25
+    decayed_at = engine.profiles.columns['decayed_at']
+    decayed_at[engine.profiles.index['10.0.0.1']] -= 4 * 3600 * 10**9
+    assert engine.get_statistics()['high_risk'] == 1  # Not read yet: still the stored score
+    assert engine.top_k(1)[0]['entity_id'] == '10.0.0.1'  # Rate is unchanged while events >= 1
+    stored = engine.profiles.column('risk_score').copy()
+
+    decayed_at[engine.profiles.index['10.0.0.1']] -= 4 * 3600 * 10**9
+    profile = engine.profiles['10.0.0.1']
+    assert profile.risk_score < 10 and profile.get_risk_level() == 'LOW'
+    assert profile.total_events == 20 and profile.risk_factors['recent_activity'] < 0.1
+    assert engine.get_statistics()['high_risk'] == 0
+    assert engine.profiles.column('risk_score')[1] == stored[1]  # Idle and unread: untouched
+    assert engine.profiles['10.0.0.2'].risk_score == pytest.approx(stored[1])
+
+    # New normal traffic dilutes the remaining anomalies
+    engine.update_from_traffic(noisy.iloc[:20], np.zeros(20, dtype=int))
+    assert engine.profiles['10.0.0.1'].risk_factors['anomaly_rate'] < 1
@@ -0,0 +1,51 @@
+"""
+GuardELNS Startup Tests
+Import-time budget for the modules the dashboard loads at startup
+"""
+
+import sys
+import os
+import subprocess
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+# Generous for slow CI machines: the detector imports in well under a second
+# once no deep-learning or plotting framework is pulled in eagerly
+IMPORT_BUDGET = 3.0
+HEAVY_MODULES = ('pyod', 'torch', 'tensorflow', 'keras', 'plotly.express', 'networkx')
+
+
+def _import_profile(module):
+    """Cumulative import seconds per module for a fresh `import module`"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=SRC, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    modules = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():
+                modules[name.strip()] = int(cumulative) / 1e6
+    return modules
+
+
+def _heavy(modules):
+    return [name for name in modules
+            if any(name == heavy or name.startswith(heavy + '.') for heavy in HEAVY_MODULES)]
+
+
+def test_detector_import_is_lazy_and_within_budget():
+    """Importing the detector loads no model backend beyond scikit-learn's base"""
+    modules = _import_profile('detection.anomaly_detector')
+    assert _heavy(modules) == []
+    assert 'sklearn.ensemble' not in modules
+    assert modules['detection.anomaly_detector'] < IMPORT_BUDGET
+
+
+def test_dashboard_import_is_lazy():
+    """Chart helpers load networkx only when the topology graph is drawn"""
+    pytest.importorskip('plotly')
+    modules = _import_profile('visualization.dashboard')
+    assert _heavy(modules) == []
+    assert modules['visualization.dashboard'] < IMPORT_BUDGET